@@ -0,0 +1,80 @@
+# benchDatetimeRfc3339.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+"""Micro-benchmark comparing the RFC3339 parsers against plain strptime."""
+
+from sys      import path
+from os.path  import abspath, dirname, join
+
+path.insert(0, join(dirname(abspath(__file__)), '..', 'fxBot'))
+
+from datetimeRfc3339 import parseDate, parseDateMicros, formatDate, _format
+from datetime        import datetime, timedelta
+from random          import Random
+from timeit          import repeat
+
+
+def tickMix(count):
+  """Create a list of time strings as received during a trading day.
+
+    Parameters:
+      count  Number of strings to create.
+
+    Returns:
+      A list of strings, mostly tick times with arbitrary fractional seconds and, interspersed,
+      aligned candle times (every tenth string).
+  """
+  random = Random(1405203905)
+  time = datetime(2014, 7, 14, 8, 0, 0)
+  times = []
+
+  for i in range(count):
+    time += timedelta(microseconds=random.randint(1, 2000000))
+
+    if i % 10 == 0:
+      times.append(formatDate(time.replace(second=time.second // 5 * 5, microsecond=0)))
+    else:
+      times.append(formatDate(time))
+
+  return times
+
+
+def measure(function, times):
+  """Measure the time per invocation of a parsing function in microseconds (best of five runs)."""
+  def run():
+    for time in times:
+      function(time)
+
+  return min(repeat(run, number=1, repeat=5)) / len(times) * 1e6
+
+
+def main():
+  times = tickMix(100000)
+  baseline = measure(lambda string: datetime.strptime(string, _format), times)
+
+  print("%-16s %10s %8s" % ('parser', 'us/call', 'speedup'))
+  print("%-16s %10.3f %8.1f" % ('strptime', baseline, 1.0))
+
+  for name, function in (('parseDate', parseDate), ('parseDateMicros', parseDateMicros)):
+    result = measure(function, times)
+    print("%-16s %10.3f %8.1f" % (name, result, baseline / result))
+
+
+if __name__ == '__main__':
+  main()
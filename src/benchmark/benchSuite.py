@@ -0,0 +1,304 @@
+# benchSuite.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+"""Micro-benchmark suite for the hot paths of the bot.
+
+  Every benchmark is run a number of times and the best time per operation is compared against a
+  baseline stored in a JSON file. Baselines are only meaningful on the machine they were recorded
+  on, which is why none is shipped. The first step thus is to record one (--save) before changing
+  any code, afterwards runs without --save compare against it.
+"""
+
+from sys      import path, exit
+from os.path  import abspath, dirname, join, exists
+
+path.insert(0, join(dirname(abspath(__file__)), '..', 'fxBot'))
+path.insert(0, join(dirname(abspath(__file__)), '..', 'test'))
+
+from currency             import Currency, parsePrice
+from price                import Price
+from statistics           import calculateEMA, calculateAvg
+from proxy                import createProxyInstance
+from cacheProxy           import CacheProxy
+from timeProxy            import TimeProxy
+from limitProxy           import LimitProxy
+from worker               import Worker
+from datetimeRfc3339      import parseDate, formatDate
+from benchDatetimeRfc3339 import tickMix
+from fixtures             import CountingStrategy
+from optparse             import OptionParser
+from datetime             import datetime, timedelta
+from decimal              import Decimal
+from random               import Random
+from timeit               import repeat
+from json                 import dump, load
+from re                   import search
+
+
+_BASELINE = join(dirname(abspath(__file__)), 'baseline.json')
+
+"""List of (name, setup function) tuples of all benchmarks, in the order they are run."""
+_benchmarks = []
+
+
+def benchmark(name):
+  """Decorator registering a benchmark.
+
+    Parameters:
+      name  The name of the benchmark.
+
+    Notes:
+      The decorated function prepares the benchmark. It returns a tuple of a function running the
+      benchmark once and the number of operations performed by a run.
+  """
+  def register(setup):
+    _benchmarks.append((name, setup))
+    return setup
+
+  return register
+
+
+def _candles(count):
+  """Create a list of candles as returned by Server.history, the oldest first."""
+  random = Random(4711)
+  time = datetime(2014, 7, 14, 8, 0, 0)
+  close = 1.36
+  candles = []
+
+  for i in range(count):
+    first = close
+    close = round(first + random.uniform(-0.0005, 0.0005), 5)
+    candles.append({'time': formatDate(time + timedelta(seconds=5 * i)),
+                    'openMid': first,
+                    'highMid': max(first, close) + 0.00005,
+                    'lowMid': min(first, close) - 0.00005,
+                    'closeMid': close,
+                    'volume': random.randint(1, 100),
+                    'complete': i < count - 1})
+
+  return candles
+
+
+def _ticks(count):
+  """Create a list of ticks as received from the rate stream."""
+  random = Random(1405203905)
+  return [{'instrument': 'EUR_USD', 'time': time,
+           'ask': round(1.36 + random.uniform(0.0, 0.001), 5),
+           'bid': round(1.36 + random.uniform(-0.001, 0.0), 5)} for time in tickMix(count)]
+
+
+class MockServer:
+  def __init__(self, candles):
+    self.__candles = candles
+
+
+  def token(self):
+    return 'XXXXXXXXXX'
+
+
+  def history(self, currency, granularity, count, start=None, includeFirst=True):
+    return self.__candles[len(self.__candles) - count:]
+
+
+@benchmark('parsePrice')
+def _parsePrice():
+  currency = Currency(None, 'EUR_USD')
+  ticks = _ticks(10000)
+
+  def run():
+    for tick in ticks:
+      parsePrice(currency, tick)
+
+  return run, len(ticks)
+
+
+@benchmark('parseDate')
+def _parseDate():
+  times = tickMix(10000)
+
+  def run():
+    for time in times:
+      parseDate(time)
+
+  return run, len(times)
+
+
+@benchmark('Price arithmetic')
+def _priceArithmetic():
+  scale = Currency(None, 'EUR_USD').scale()
+  prices = [Price(tick['ask'], scale) for tick in _ticks(1000)]
+  factor = Decimal('0.5')
+
+  def run():
+    previous = prices[0]
+    for price in prices:
+      (price + previous) * factor - previous
+      previous = price
+
+  return run, len(prices)
+
+
+@benchmark('Price.__str__')
+def _priceStr():
+  scale = Currency(None, 'EUR_USD').scale()
+  prices = [Price(tick['ask'], scale) for tick in _ticks(10000)]
+
+  def run():
+    for price in prices:
+      str(price)
+
+  return run, len(prices)
+
+
+@benchmark('Currency.history')
+def _currencyHistory():
+  currency = Currency(MockServer(_candles(500)), 'EUR_USD')
+
+  def run():
+    # create the series and convert all of its candles
+    for candle in currency.history('5s', 500):
+      pass
+
+  return run, 500
+
+
+@benchmark('calculateAvg/EMA')
+def _statistics():
+  currency = Currency(MockServer(_candles(500)), 'EUR_USD')
+
+  def run():
+    candles = currency.history('5s', 500)
+    calculateAvg(candles, 'open', 'close', 'avg')
+    calculateEMA(candles, 500, 'avg', 'ema')
+
+  return run, 500
+
+
+@benchmark('CacheProxy hit')
+def _cacheHit():
+  proxy = createProxyInstance(MockServer(_candles(500)), CacheProxy)
+  # daily candles stay current for the whole run
+  proxy.history('EUR_USD', 'D', 500)
+
+  def run():
+    for _ in range(1000):
+      proxy.history('EUR_USD', 'D', 100)
+
+  return run, 1000
+
+
+@benchmark('proxy call')
+def _proxyCall():
+  proxy = createProxyInstance(MockServer([]), CacheProxy, TimeProxy, LimitProxy)
+
+  def run():
+    for _ in range(10000):
+      proxy.token()
+
+  return run, 10000
+
+
+@benchmark('Worker throughput')
+def _workerThroughput():
+  ticks = _ticks(10000)
+
+  def run():
+    strategy = CountingStrategy(len(ticks))
+    worker = Worker({'EUR_USD': {'currency': Currency(None, 'EUR_USD'), 'strategy': strategy}})
+    worker.start()
+
+    queue = worker.queue()
+    for tick in ticks:
+      queue.put(tick)
+
+    strategy.done.wait()
+    worker.destroy()
+    worker.join()
+
+  return run, len(ticks)
+
+
+def measure(run, count, repetitions):
+  """Measure the time per operation of a benchmark in nanoseconds (best of all repetitions)."""
+  return min(repeat(run, number=1, repeat=repetitions)) / count * 1e9
+
+
+def main():
+  parser = OptionParser()
+  parser.add_option("-s", "--save", dest="save", default=False, action="store_true",
+                    help="store the results as the new baseline")
+  parser.add_option("-b", "--baseline", dest="baseline", default=_BASELINE,
+                    help="path of the JSON file containing the baseline")
+  parser.add_option("-t", "--threshold", dest="threshold", default=1.25, type="float",
+                    help="ratio to the baseline above which a result is reported as regression")
+  parser.add_option("-r", "--repeat", dest="repeat", default=7, type="int",
+                    help="number of repetitions of every benchmark")
+  parser.add_option("-f", "--filter", dest="filter", default=None,
+                    help="only run the benchmarks whose names match the given regular expression")
+
+  (options, arguments) = parser.parse_args()
+
+  baseline = {}
+  if exists(options.baseline):
+    with open(options.baseline, 'r') as file:
+      baseline = load(file)
+  elif not options.save:
+    print("no baseline in %s, record one with --save first" % options.baseline)
+
+  results = {}
+  regressions = []
+
+  print("%-20s %12s %12s %8s" % ('benchmark', 'ns/op', 'baseline', 'ratio'))
+
+  for name, setup in _benchmarks:
+    if options.filter and not search(options.filter, name):
+      continue
+
+    run, count = setup()
+    result = measure(run, count, options.repeat)
+    results[name] = result
+
+    if name in baseline:
+      ratio = result / baseline[name]
+      status = ''
+
+      if ratio > options.threshold:
+        status = 'REGRESSION'
+        regressions.append(name)
+
+      print("%-20s %12.1f %12.1f %8.2f %s" % (name, result, baseline[name], ratio, status))
+    else:
+      print("%-20s %12.1f %12s %8s" % (name, result, '-', '-'))
+
+  if options.save:
+    baseline.update(results)
+
+    with open(options.baseline, 'w') as file:
+      dump(baseline, file, indent=2, sort_keys=True)
+      file.write('\n')
+
+    print("baseline stored in %s" % options.baseline)
+
+  if regressions and not options.save:
+    print("%d regression(s): %s" % (len(regressions), ', '.join(regressions)))
+    exit(1)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,426 @@
+# asyncStreamer.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+from backoff         import Backoff
+from asyncio         import CancelledError, TimeoutError, new_event_loop, gather, open_connection
+from asyncio         import sleep, wait_for
+from threading       import Thread
+from urllib.parse    import urlsplit, urlencode
+from collections     import deque
+from queue           import Full
+from datetime        import datetime
+from logging         import error, warning
+from os              import kill, getpid
+from signal          import SIGTERM
+from time            import monotonic, monotonic_ns
+from json            import loads
+
+
+"""The URL of the streaming server of OANDA's practice environment."""
+PRACTICE_URL = 'https://stream-fxpractice.oanda.com'
+
+# Time (in seconds) after which putting a message into a full queue is attempted again.
+_PUT_RETRY_DELAY = 0.005
+
+# The server sends a heartbeat every five seconds on both streams. A connection that did not
+# deliver any data for a couple of heartbeats is considered dead, even if TCP does not notice.
+_READ_TIMEOUT = 3 * 5.0
+
+
+class StreamError(Exception):
+  def __init__(self, status, data):
+    """Create a new StreamError object.
+
+      Parameters:
+        status  The HTTP status code received or None if the connection failed.
+        data    The body of the response or another description of the error.
+    """
+    self.status = status
+    self.__data = data
+
+
+  def __str__(self):
+    """Get a textual representation of the error.
+
+      Returns:
+        A textual representation of the error.
+    """
+    return "%s: %s" % (self.status, self.__data)
+
+
+async def _readHeaders(reader, timeout=None):
+  """Read the status line and the headers of an HTTP response.
+
+    Parameters:
+      reader   The StreamReader to read from.
+      timeout  (optional) Maximum time (in seconds) to wait for each line.
+
+    Returns:
+      A tuple of the status code and a dict object of the headers with lower case names.
+
+    Raises:
+      asyncio.TimeoutError if a line did not arrive in time.
+  """
+  line = await wait_for(reader.readline(), timeout)
+  parts = line.decode('latin-1').split(None, 2)
+
+  if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+    raise StreamError(None, "invalid response: %r" % line)
+
+  headers = {}
+  while True:
+    line = (await wait_for(reader.readline(), timeout)).decode('latin-1').strip()
+    if not line:
+      break
+
+    name, _, value = line.partition(':')
+    headers[name.strip().lower()] = value.strip()
+
+  return int(parts[1]), headers
+
+
+async def _readChunks(reader, headers, timeout=None):
+  """Iterate over the data of an HTTP response's body as it arrives.
+
+    Parameters:
+      reader   The StreamReader to read from.
+      headers  The headers of the response as returned by _readHeaders.
+      timeout  (optional) Maximum time (in seconds) to wait for each piece of data.
+
+    Raises:
+      asyncio.TimeoutError if data did not arrive in time.
+  """
+  if headers.get('transfer-encoding', '').lower() == 'chunked':
+    while True:
+      size = int((await wait_for(reader.readline(), timeout)).split(b';')[0], 16)
+      if size == 0:
+        break
+
+      data = await wait_for(reader.readexactly(size), timeout)
+      # the CRLF terminating the chunk
+      await wait_for(reader.readline(), timeout)
+      yield data
+  elif 'content-length' in headers:
+    yield await wait_for(reader.readexactly(int(headers['content-length'])), timeout)
+  else:
+    while True:
+      data = await wait_for(reader.read(65536), timeout)
+      if not data:
+        break
+
+      yield data
+
+
+async def _readLines(reader, headers, timeout=None):
+  """Iterate over the (non-empty) lines of an HTTP response's body.
+
+    Parameters:
+      reader   The StreamReader to read from.
+      headers  The headers of the response as returned by _readHeaders.
+      timeout  (optional) Maximum time (in seconds) to wait for each piece of data.
+
+    Raises:
+      asyncio.TimeoutError if data did not arrive in time.
+  """
+  pending = b''
+
+  async for data in _readChunks(reader, headers, timeout):
+    lines = (pending + data).split(b'\n')
+    pending = lines.pop()
+
+    for line in lines:
+      if line.strip():
+        yield line
+
+  if pending.strip():
+    yield pending
+
+
+class AsyncStreamer:
+  def __init__(self, token, queue, url=PRACTICE_URL, onReconnect=None, backoffFactory=Backoff,
+               tracer=None, readTimeout=_READ_TIMEOUT):
+    """Create a new AsyncStreamer object.
+
+      An AsyncStreamer receives the rates as well as the events of an account from the streaming
+      server and puts them into a queue, just like the RateStreamer and the EventStreamer used to.
+      Both streams are handled by an asyncio event loop running in a single thread. In contrast to
+      threads blocked in a system call, the streams can be cancelled at any time.
+
+      A stream that fails, ends, or stays silent for longer than the read timeout is reconnected
+      after a delay growing with every failed attempt. Only responses indicating a problem with the
+      request itself (e.g., an invalid access token) are considered fatal.
+
+      Parameters:
+        token           The access token to authenticate with.
+        queue           The queue to put received messages into. Its put() method has to support
+                        the block argument of queue.Queue's.
+        url             (optional) The URL of the streaming server (scheme, host, and port).
+        onReconnect     (optional) Function invoked with the name of the stream ('rates' or
+                        'events') and the start and end (both datetime) of the outage once a stream
+                        is connected again. It is invoked in a thread of its own.
+        backoffFactory  (optional) Callable creating the Backoff object of a stream.
+        tracer          (optional) A LatencyTracer object to stamp all messages with.
+        readTimeout     (optional) Maximum time (in seconds) to wait for any data of a stream,
+                        including connecting.
+    """
+    self.__token = token
+    self.__queue = queue
+    self.__url = url.rstrip('/')
+    self.__onReconnect = onReconnect
+    self.__backoffFactory = backoffFactory
+    self.__tracer = tracer
+    self.__timeout = readTimeout
+    # the most recent outages of the streams
+    self.__outages = deque(maxlen=64)
+    # dicts indexed by stream names containing the number of reconnects and the (monotonic) time
+    # the last heartbeat was received, respectively
+    self.__reconnects = {'rates': 0, 'events': 0}
+    self.__heartbeats = {}
+    self.__loop = None
+    self.__task = None
+    self.__thread = None
+
+
+  async def __receive(self, name, path, params, heartbeats, onConnect):
+    """Receive the messages of one stream and put them into the queue.
+
+      Parameters:
+        name        The name of the stream ('rates' or 'events').
+        path        The path of the stream on the server.
+        params      A dict object of the parameters of the stream.
+        heartbeats  Whether to put heartbeat messages into the queue as well.
+        onConnect   Function invoked once the server accepted the request.
+    """
+    url = urlsplit(self.__url)
+    secure = url.scheme == 'https'
+    port = url.port or (443 if secure else 80)
+    timeout = self.__timeout
+    reader, writer = await wait_for(open_connection(url.hostname, port, ssl=secure or None),
+                                    timeout)
+
+    try:
+      request = ("GET %s%s?%s HTTP/1.1\r\n"
+                 "Host: %s\r\n"
+                 "Authorization: Bearer %s\r\n"
+                 "Accept-Encoding: identity\r\n"
+                 "Connection: close\r\n"
+                 "\r\n" % (url.path, path, urlencode(params), url.netloc, self.__token))
+      writer.write(request.encode('latin-1'))
+      await writer.drain()
+
+      status, headers = await _readHeaders(reader, timeout)
+
+      if status != 200:
+        body = b''.join([data async for data in _readChunks(reader, headers, timeout)])
+        raise StreamError(status, body.decode('utf-8', 'replace'))
+
+      onConnect()
+      tracer = self.__tracer
+      queue = self.__queue
+
+      async for line in _readLines(reader, headers, timeout):
+        received = monotonic_ns() if tracer is not None else None
+        data = loads(line.decode('utf-8'))
+
+        if 'heartbeat' in data:
+          self.__heartbeats[name] = monotonic()
+          if not heartbeats:
+            continue
+
+        if received is not None:
+          tracer.stamp(data, received)
+
+        try:
+          queue.put(data, block=False)
+        except Full:
+          await self.__put(data)
+    finally:
+      writer.close()
+
+
+  async def __put(self, data):
+    """Put a message into the queue once there is room for it.
+
+      Parameters:
+        data  The message to enqueue.
+
+      Notes:
+        Waiting in the queue's put() would block the event loop and with it the other stream as
+        well as disconnect(). Instead, only the stream of the message is suspended until the
+        consumer made room.
+    """
+    while True:
+      await sleep(_PUT_RETRY_DELAY)
+
+      try:
+        self.__queue.put(data, block=False)
+        return
+      except Full:
+        pass
+
+
+  def __reconnected(self, name, start, end):
+    """Report the end of an outage (invoked in a thread of the event loop's default executor)."""
+    try:
+      self.__onReconnect(name, start, end)
+    except Exception as exception:
+      error("Handling reconnect of %s stream failed: %s" % (name, exception))
+
+
+  async def __stream(self, name, path, params, heartbeats):
+    """Receive the messages of one stream, reconnecting whenever it fails.
+
+      Parameters:
+        name        The name of the stream ('rates' or 'events').
+        path        The path of the stream on the server.
+        params      A dict object of the parameters of the stream.
+        heartbeats  Whether to put heartbeat messages into the queue as well.
+    """
+    backoff = self.__backoffFactory()
+    # the time the current outage started, if any
+    outage = None
+
+    def onConnect():
+      nonlocal outage
+      backoff.reset()
+
+      if outage is not None:
+        end = datetime.now()
+        self.__outages.append({'stream': name, 'start': outage, 'end': end})
+        self.__reconnects[name] += 1
+        warning("%s stream reconnected after %.1fs" % (name, (end - outage).total_seconds()))
+
+        if self.__onReconnect is not None:
+          self.__loop.run_in_executor(None, self.__reconnected, name, outage, end)
+
+        outage = None
+
+    while True:
+      try:
+        await self.__receive(name, path, params, heartbeats, onConnect)
+        reason = "stream ended"
+      except StreamError as exception:
+        # anything but server side problems and rate limiting is not going to go away by retrying
+        if exception.status is not None and exception.status < 500 and exception.status != 429:
+          raise
+
+        reason = str(exception)
+      except TimeoutError:
+        # the connection may be half-open, we would never learn about it otherwise
+        reason = "no data received for %.1fs" % self.__timeout
+      except (OSError, EOFError, ValueError) as exception:
+        reason = str(exception) or type(exception).__name__
+
+      if outage is None:
+        outage = datetime.now()
+
+      delay = backoff.delay()
+      warning("%s stream interrupted (%s), reconnecting in %.1fs" % (name, reason, delay))
+      await sleep(delay)
+
+
+  async def __streams(self, accountId, instruments):
+    """Receive the rate stream and the event stream concurrently."""
+    await gather(self.__stream('rates', '/v1/prices', {'accountId': accountId,
+                                                       'instruments': instruments}, False),
+                 self.__stream('events', '/v1/events', {'accountId': accountId}, True))
+
+
+  def __run(self, accountId, instruments):
+    """Run the event loop until the streams end or are cancelled."""
+    loop = self.__loop
+
+    try:
+      self.__task = loop.create_task(self.__streams(accountId, instruments))
+      loop.run_until_complete(self.__task)
+    except CancelledError:
+      pass
+    except BaseException as exception:
+      # just like tryRun does, signal the main thread to terminate gracefully
+      error("Streaming failed: %s" % exception)
+      kill(getpid(), SIGTERM)
+    finally:
+      loop.close()
+
+
+  def __cancel(self):
+    """Cancel the streams (invoked in the context of the event loop)."""
+    if self.__task is not None:
+      self.__task.cancel()
+
+
+  def start(self, accountId, instruments):
+    """Start receiving the streams.
+
+      Parameters:
+        accountId    The ID of the account to receive the events of.
+        instruments  Comma separated list of instruments to receive the rates of.
+    """
+    self.__loop = new_event_loop()
+    # the thread must not keep the program alive if it cannot be stopped in time
+    self.__thread = Thread(target=self.__run, args=(accountId, instruments), daemon=True)
+    self.__thread.start()
+
+
+  def outages(self):
+    """Retrieve the most recent outages of the streams.
+
+      Returns:
+        A list of dict objects containing the name of the stream ('stream') and the start ('start')
+        and end ('end') of the outage as datetime objects, the oldest outage first.
+    """
+    return list(self.__outages)
+
+
+  def reconnects(self):
+    """Retrieve the number of times the streams were reconnected after an outage.
+
+      Returns:
+        A dict object indexed by stream names ('rates' and 'events') containing the counts.
+    """
+    return dict(self.__reconnects)
+
+
+  def heartbeats(self):
+    """Retrieve the times the last heartbeats of the streams were received.
+
+      Returns:
+        A dict object indexed by stream names containing the value of time.monotonic() at the time
+        the stream's last heartbeat was received. Streams without heartbeats yet are missing.
+    """
+    return dict(self.__heartbeats)
+
+
+  def disconnect(self, timeout=None):
+    """Stop receiving the streams and wait for the streaming thread to terminate.
+
+      Parameters:
+        timeout  (optional) Maximum time (in seconds) to wait for the thread.
+    """
+    if self.__thread is None:
+      return
+
+    try:
+      self.__loop.call_soon_threadsafe(self.__cancel)
+    except RuntimeError:
+      # the event loop is closed already
+      pass
+
+    self.__thread.join(timeout)
+
@@ -0,0 +1,58 @@
+# backoff.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+from random import random
+
+
+class Backoff:
+  def __init__(self, initial=0.5, maximum=30.0, factor=2.0, jitter=0.5):
+    """Create a new Backoff object.
+
+      A Backoff object calculates the delays between consecutive attempts of an operation that
+      keeps failing, e.g., connecting to a server. The delays grow exponentially up to a maximum
+      and are randomized so that many clients do not retry in lockstep.
+
+      Parameters:
+        initial  (optional) The delay (in seconds) before the first retry.
+        maximum  (optional) The maximum delay (in seconds).
+        factor   (optional) The factor by which the delay grows with every failed attempt.
+        jitter   (optional) The fraction (0 to 1) of a delay that is randomized.
+    """
+    self.__initial = initial
+    self.__maximum = maximum
+    self.__factor = factor
+    self.__jitter = jitter
+    self.__current = initial
+
+
+  def delay(self):
+    """Retrieve the delay before the next attempt.
+
+      Returns:
+        The time (in seconds) to wait. Every invocation increases the delay returned by the next
+        one until reset() is invoked.
+    """
+    delay = self.__current * (1.0 - self.__jitter * random())
+    self.__current = min(self.__current * self.__factor, self.__maximum)
+    return delay
+
+
+  def reset(self):
+    """Reset the delay after an attempt succeeded."""
+    self.__current = self.__initial
@@ -0,0 +1,67 @@
+# backtest.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+from worker  import Worker
+from time    import perf_counter
+from logging import info
+
+
+class Backtest:
+  def __init__(self, server, currencies):
+    """Create a new Backtest object.
+
+      Parameters:
+        server      A BacktestServer object providing the data to replay. The currency objects
+                    must use this server (or a proxy wrapping it) as well.
+        currencies  Dictionary indexed by currency names containing dictionaries containing currency
+                    objects and associated strategies (see Worker).
+    """
+    self.__server = server
+    self.__currencies = currencies
+    # We use the worker's tick handling but never start its thread. Ticks are dispatched
+    # synchronously instead, so that the replay is only bound by the CPU and not by any queueing.
+    self.__worker = Worker(currencies)
+
+
+  def run(self, granularity=None):
+    """Replay all recorded data through the strategies.
+
+      Parameters:
+        granularity  (optional) Granularity of the candles to derive ticks from in case no ticks
+                     were recorded (see BacktestServer.ticks).
+
+      Returns:
+        A dict object containing the number of ticks replayed ('ticks'), the time it took in
+        seconds ('seconds'), and the resulting rate in ticks per second ('rate').
+    """
+    server = self.__server
+    handleTick = self.__worker.handleTick
+    scales = {name: pair['currency'].scale() for name, pair in self.__currencies.items()}
+    count = 0
+
+    start = perf_counter()
+    for tick in server.ticks(scales, granularity):
+      server.advance(tick)
+      handleTick(tick)
+      count += 1
+    seconds = perf_counter() - start
+
+    rate = count / seconds if seconds > 0 else 0.0
+    info("backtest: replayed %d ticks in %.3fs (%.1f ticks/s)" % (count, seconds, rate))
+    return {'ticks': count, 'seconds': seconds, 'rate': rate}
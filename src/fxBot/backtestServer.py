@@ -0,0 +1,325 @@
+# backtestServer.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+from cacheProxy      import _deltas
+from datetimeRfc3339 import parseDate, formatDate
+from price           import Price
+from bisect          import bisect_left, bisect_right
+from heapq           import merge
+from tickJournal     import JournalReader
+from os.path         import isdir
+from json            import load
+
+
+def _tickTime(tick):
+  """Retrieve the time (datetime) of a tick."""
+  return tick['time']
+
+
+def loadRecording(path):
+  """Load recorded data from a file and create a BacktestServer object serving it.
+
+    Parameters:
+      path  Path to a JSON file containing an object with a 'candles' key, a 'ticks' key, or both.
+            The value of 'candles' has the format described for the 'candles' parameter of
+            BacktestServer, the one of 'ticks' is a list of objects as received from the rate
+            stream. Alternatively, the path of a directory containing a TickJournal.
+
+    Returns:
+      A BacktestServer object serving the recorded data.
+  """
+  if isdir(path):
+    return BacktestServer(journal=JournalReader(path))
+
+  with open(path, 'r') as file:
+    recording = load(file)
+
+  return BacktestServer(recording.get('candles'), recording.get('ticks'))
+
+
+class BacktestServer:
+  def __init__(self, candles=None, ticks=None, journal=None):
+    """Create new BacktestServer object serving recorded data.
+
+      A BacktestServer stands in for a Server object during a backtest. Instead of talking to one of
+      OANDA's servers it answers all requests from previously recorded data. Answers are relative to
+      the replay clock, i.e., the server never reveals data that lies in the future of the tick
+      currently being replayed.
+
+      Parameters:
+        candles  (optional) Dict indexed by currency names containing dicts indexed by granularities
+                 containing lists of candles as returned by Server.history (oldest first).
+        ticks    (optional) List of ticks as received from the rate stream, i.e., dicts containing
+                 an 'instrument', a 'time', an 'ask', and a 'bid' value.
+        journal  (optional) A JournalReader object providing the recorded ticks. It takes
+                 precedence over the 'ticks' argument.
+    """
+    # dict indexed by currency names
+    # {
+    #   currency: {
+    #     granularity: {
+    #       'starts': [datetime],
+    #       'ends': [datetime],
+    #       'data': [{'time': string, 'openMid': float, ..., 'complete': bool}]
+    #     }
+    #   }
+    # }
+    self.__candles = {}
+    # the recorded ticks as tuples (time, instrument, ask, bid), sorted by time
+    self.__ticks = []
+    self.__journal = journal
+    # the time (datetime) of the tick currently being replayed, None if the replay did not start
+    self.__now = None
+    # dict indexed by currency names containing the last tick replayed for the respective currency
+    self.__last = {}
+
+    for currency, granularities in (candles or {}).items():
+      self.__candles[currency] = {}
+
+      for granularity, data in granularities.items():
+        delta = _deltas[granularity]
+        # A candle's data is final only at the end of the interval it describes. We index candles
+        # by their end time to ensure we do not hand out any data before it was available.
+        starts = [parseDate(candle['time']) for candle in data]
+        ends = [start + delta for start in starts]
+        self.__candles[currency][granularity] = {'starts': starts, 'ends': ends, 'data': data}
+
+    if journal is None:
+      for tick in ticks or []:
+        # ticks may be recorded in either of the two formats the rate stream uses (see Worker.run)
+        tick = tick['tick'] if 'tick' in tick else tick
+        if 'instrument' in tick:
+          self.__ticks.append((parseDate(tick['time']), tick['instrument'], tick['ask'],
+                               tick['bid']))
+
+      self.__ticks.sort(key=lambda tick: tick[0])
+
+
+  def currencies(self):
+    """Retrieve the names of all currencies for which data was recorded.
+
+      Returns:
+        A sorted list of currency names.
+    """
+    names = set(self.__candles.keys())
+
+    if self.__journal is not None:
+      names.update(self.__journal.instruments())
+    else:
+      names.update(tick[1] for tick in self.__ticks)
+
+    return sorted(names)
+
+
+  def ticks(self, scales, granularity=None):
+    """Retrieve the ticks to replay for a set of currencies.
+
+      Parameters:
+        scales       Dict indexed by the names of the currencies of interest containing the
+                     PriceScale objects of their prices (see Currency.scale).
+        granularity  (optional) Granularity of the candles to derive ticks from in case no ticks
+                     were recorded. Defaults to the finest granularity recorded for a currency.
+
+      Returns:
+        An iterator over ticks in the parsed format a worker handles (see Worker.handleTick),
+        ordered by time. Ticks are created as the iterator advances.
+
+      Notes:
+        A tick derived from a candle carries the candle's closing price as both ask and bid price
+        and the time at which the candle ended.
+    """
+    if self.__journal is not None:
+      return self.__journal.ticks(scales)
+
+    if self.__ticks:
+      return self.__recordedTicks(scales)
+
+    streams = []
+    for currency, scale in scales.items():
+      granularities = self.__candles.get(currency, {})
+      if not granularities:
+        continue
+
+      g = granularity or min(granularities, key=lambda g: _deltas[g])
+      candles = granularities[g]
+      streams.append(self.__candleTicks(currency, scale, candles['ends'], candles['data']))
+
+    return merge(*streams, key=_tickTime)
+
+
+  def __recordedTicks(self, scales):
+    """Create ticks out of the recorded ones.
+
+      Parameters:
+        scales  Dict indexed by the names of the currencies of interest containing the PriceScale
+                objects of their prices.
+
+      Returns:
+        A generator yielding the parsed ticks of the currencies of interest.
+    """
+    for time, currency, ask, bid in self.__ticks:
+      scale = scales.get(currency)
+
+      if scale is not None:
+        yield {'instrument': currency,
+               'time': time,
+               'ask': Price(ask, scale),
+               'bid': Price(bid, scale),
+               'parsed': True}
+
+
+  def __candleTicks(self, currency, scale, ends, data):
+    """Create ticks out of a list of candles.
+
+      Parameters:
+        currency  Name of the currency the candles belong to.
+        scale     The PriceScale object of the currency's prices.
+        ends      List of the candles' end times.
+        data      List of candles.
+
+      Returns:
+        A generator yielding one parsed tick per candle.
+    """
+    for end, candle in zip(ends, data):
+      price = Price(candle['closeMid'], scale)
+      yield {'instrument': currency,
+             'time': end,
+             'ask': price,
+             'bid': price,
+             'parsed': True}
+
+
+  def advance(self, tick):
+    """Advance the replay clock to the given tick.
+
+      Parameters:
+        tick  The tick about to be replayed, as returned by ticks().
+    """
+    self.__now = tick['time']
+    self.__last[tick['instrument']] = tick
+
+
+  def token(self):
+    """Retrieve the access token used by this server object.
+
+      Returns:
+        An empty string, no access token is required for replaying recorded data.
+    """
+    return ''
+
+
+  def accounts(self):
+    """Retrieve a list of all the user's accounts.
+
+      Returns:
+        A list containing a single dict object describing the account used for the backtest.
+    """
+    return [{
+      'accountId': 0,
+      'accountName': 'Backtest',
+      'accountCurrency': 'USD',
+      'marginRate': 0.05,
+    }]
+
+
+  def instruments(self, account_id, currencies=None):
+    """Retrieve a list of available instruments.
+
+      Parameters:
+        account_id  Unused.
+        currencies  (optional) Comma separated list of currencies to include in reply.
+
+      Returns:
+        A list of dict objects representing all instruments with recorded data or the ones listed,
+        respectively. See Server.instruments for the format.
+    """
+    names = self.currencies()
+
+    if currencies:
+      wanted = set(c.strip() for c in currencies.split(','))
+      names = [name for name in names if name in wanted]
+
+    return [{'instrument': name, 'displayName': name, 'pip': None, 'maxTradeUnits': 0}
+            for name in names]
+
+
+  def currentPrices(self, currency):
+    """Retrieve the current bid and ask prices for a currency.
+
+      Parameters:
+        currency  String representing the currency for which to query the current prices or a list
+                  of such strings.
+
+      Returns:
+        A dict object representing the prices of the tick for the given currency that was replayed
+        last (or a list of such objects). See Server.currentPrices for the format.
+    """
+    if isinstance(currency, list):
+      return [self.currentPrices(c) for c in currency]
+
+    tick = self.__last[currency]
+    return {'instrument': currency, 'time': formatDate(tick['time']),
+            'ask': float(str(tick['ask'])), 'bid': float(str(tick['bid']))}
+
+
+  def history(self, currency, granularity, count, start=None, includeFirst=True):
+    """Query the recorded data for a currency's historic data.
+
+      Parameters:
+        currency      Name of the currency for which to query the history.
+        granularity   Granularity of the historic data to retrieve.
+        count         Number of data points to retrieve.
+        start         (optional) Time (RFC3339 string) of the first data point to retrieve.
+        includeFirst  (optional) Whether to include the data point starting exactly at 'start'.
+
+      Returns:
+        A list of at most 'count' dicts representing the data points that were complete at the time
+        of the tick being replayed. See Server.history for the format.
+    """
+    candles = self.__candles[currency][granularity]
+    data = candles['data']
+
+    if self.__now is None:
+      end = len(data)
+    else:
+      end = bisect_right(candles['ends'], self.__now)
+
+    if start is None:
+      return data[max(0, end - count):end]
+
+    start = parseDate(start)
+
+    if includeFirst:
+      first = bisect_left(candles['starts'], start, 0, end)
+    else:
+      first = bisect_right(candles['starts'], start, 0, end)
+
+    return data[first:min(end, first + count)]
+
+
+  def trades(self, account_id):
+    """Query the currently active trades.
+
+      Parameters:
+        account_id  Unused.
+
+      Returns:
+        An empty list, trading is not simulated.
+    """
+    return []
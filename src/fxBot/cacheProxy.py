@@ -18,9 +18,12 @@
 # ***************************************************************************/
 
 from datetimeRfc3339 import parseDate
+from resample        import canResample, resample
 from datetime        import datetime, timedelta
-from threading       import Lock
+from collections     import OrderedDict
+from threading       import Event, Lock
 from logging         import debug, warning
+from sys             import getsizeof
 
 
 """Dictionary for mapping granularities to timedeltas describing their length."""
@@ -57,6 +60,36 @@ _deltas = {
 }
 
 
+def _tail(history, count):
+  """Retrieve the 'count' most recent candles of a history.
+
+    Parameters:
+      history  A list of candles, the oldest first.
+      count    Number of candles to retrieve.
+
+    Returns:
+      A list containing the last 'count' candles (or all of them if there are fewer).
+  """
+  return history[max(0, len(history) - count):]
+
+
+def _sizeOf(history):
+  """Estimate the memory occupied by a list of candles.
+
+    Parameters:
+      history  A list of dicts as returned by Server.history.
+
+    Returns:
+      The approximate number of bytes held by the list, its dicts, and their values.
+  """
+  size = getsizeof(history)
+
+  for candle in history:
+    size += getsizeof(candle) + sum(getsizeof(value) for value in candle.values())
+
+  return size
+
+
 class CacheProxy:
   def __init__(self, server):
     """Create new CacheProxy object.
@@ -69,17 +102,101 @@ class CacheProxy:
     super().__init__(server)
     # lock to protect our cached data
     self.__lock = Lock()
-    # dict indexed by the granularity we are looking for
+    # dict indexed by (currency, granularity) tuples, ordered from the least to the most recently
+    # used entry
     # {
-    #   currency: {
-    #     granularity:
-    #     {
-    #       'lastUpdate': datetime,
-    #       'data': [{'time': datetime, 'open': Decimal, 'close': Decimal }]
-    #     }
+    #   (currency, granularity): {
+    #     'lastUpdate': datetime,
+    #     'data': [{'time': string, 'openMid': float, ..., 'complete': bool}],
+    #     'bytes': int
     #   }
     # }
-    self.__history_data = {}
+    self.__history_data = OrderedDict()
+    # the CandleStore object backing the cache, if any
+    self.__store = None
+    # the limits of the cache, None meaning unlimited
+    self.__maxEntries = None
+    self.__maxBytes = None
+    self.__bytes = 0
+    self.__stats = {'hits': 0, 'misses': 0, 'updates': 0, 'resampled': 0, 'coalesced': 0,
+                    'evictions': 0, 'savedCandles': 0, 'backfilled': 0}
+    # requests currently sent to the server, indexed by (currency, granularity) tuples
+    # {
+    #   (currency, granularity): {
+    #     'count': int,
+    #     'event': Event,
+    #     'result': [{'time': string, 'openMid': float, ..., 'complete': bool}]
+    #   }
+    # }
+    self.__flights = {}
+
+
+  def attachStore(self, store):
+    """Back the cache by a persistent store of candles.
+
+      Parameters:
+        store  A CandleStore object. Candles not yet cached are looked up in the store before they
+               are requested from the server, and all complete candles received from the server are
+               written to the store.
+    """
+    with self.__lock:
+      self.__store = store
+
+
+  def setBudget(self, maxEntries=None, maxBytes=None):
+    """Limit the amount of data held by the cache.
+
+      Parameters:
+        maxEntries  (optional) Maximum number of (currency, granularity) combinations to cache.
+        maxBytes    (optional) Maximum (approximate) number of bytes to be occupied by cached data.
+
+      Notes:
+        Whenever a limit is exceeded the least recently used entries are evicted. The most recently
+        used entry is always retained, even if it exceeds the limit on its own.
+    """
+    with self.__lock:
+      self.__maxEntries = maxEntries
+      self.__maxBytes = maxBytes
+      self.__evict()
+
+
+  def stats(self):
+    """Retrieve statistics about the usage of the cache.
+
+      Returns:
+        A dict object containing the number of requests answered from the cache ('hits'), the ones
+        requiring a complete request to the server ('misses') and the ones requiring only the most
+        recent candles to be requested ('updates'), as well as the number of histories built from
+        ones of a finer granularity ('resampled') and the ones answered by waiting for a concurrent
+        request of the same data ('coalesced'). In addition, it contains the number of entries
+        evicted ('evictions'), the number of entries ('entries') and bytes ('bytes') currently held,
+        the number of server calls saved ('savedCalls'), the number of candles not requested again
+        due to incremental updates ('savedCandles'), and the number of entries refreshed after an
+        outage ('backfilled').
+    """
+    with self.__lock:
+      stats = dict(self.__stats)
+      stats['entries'] = len(self.__history_data)
+      stats['bytes'] = self.__bytes
+      stats['savedCalls'] = stats['hits'] + stats['resampled'] + stats['coalesced']
+      return stats
+
+
+  def __evict(self):
+    """Evict the least recently used entries until the cache is within its limits.
+
+      Notes:
+        The object lock must be held during this call.
+    """
+    data = self.__history_data
+
+    while len(data) > 1 and ((self.__maxEntries is not None and len(data) > self.__maxEntries) or
+                             (self.__maxBytes is not None and self.__bytes > self.__maxBytes)):
+      key, entry = data.popitem(last=False)
+      self.__bytes -= entry['bytes']
+      self.__stats['evictions'] += 1
+
+      debug("cacheProxy: evicted (currency=%s, granularity=%s)" % key)
 
 
   def history(self, currency, granularity, count):
@@ -107,48 +224,284 @@ class CacheProxy:
             problem that we do not reliably know the server's time (since that data is already
             aligned and we do not necessarily receive data for the "current" non-aligned time). One
             possible solution is to inspect all data from the server and update our view of the
-            server's current time from that timestamp. Especially the eventStreamer's heartbeat
+            server's current time from that timestamp. Especially the event stream's heartbeat
             might provide a reliable source even over the weekend or when markets are closed.
     """
+    delta = _deltas[granularity]
+    cached = None
+    elapsed = None
+    load = False
+    key = (currency, granularity)
+
     # check if there is any data for the given granularity
     with self.__lock:
-      if currency in self.__history_data:
-        currency_data = self.__history_data[currency]
-
-        if granularity in currency_data:
-          data = currency_data[granularity]
-          delta = _deltas[granularity]
-
-          # check if we got data from a last query that should still be current
-          if datetime.now() - data['lastUpdate'] < delta:
-            # check if that data contains enough timestamps
-            if len(data['data']) >= count:
-              debug("cacheProxy: cache-hit (currency=%s, granularity=%s, count=%s)"
-                      % (currency, granularity, count))
-              return data['data'][0:count]
+      data = self.__history_data.get(key)
+
+      if data is not None:
+        self.__history_data.move_to_end(key)
+        elapsed = datetime.now() - data['lastUpdate']
+
+        # check if we got data from a last query that should still be current
+        if elapsed < delta:
+          # check if that data contains enough timestamps
+          if len(data['data']) >= count:
+            self.__stats['hits'] += 1
+            debug("cacheProxy: cache-hit (currency=%s, granularity=%s, count=%s)"
+                    % (currency, granularity, count))
+            return _tail(data['data'], count)
+
+        # the data is outdated (or too short) but might still be used as the base of an update
+        cached = data['data']
       else:
-        self.__history_data[currency] = {}
+        load = True
+
+      # Concurrent requests for the same data are coalesced: the first one is sent to the server,
+      # the others wait for its result. A request for more data than already in flight is sent on
+      # its own.
+      flight = self.__flights.get(key)
+      owned = None
+
+      if flight is None:
+        owned = {'count': count, 'event': Event(), 'result': None}
+        self.__flights[key] = owned
+      elif flight['count'] < count:
+        flight = None
+
+    if flight is not None:
+      # another thread is already requesting (at least) the data we need, so wait for it
+      flight['event'].wait()
+
+      if flight['result'] is not None:
+        with self.__lock:
+          self.__stats['coalesced'] += 1
+
+        debug("cacheProxy: coalesced (currency=%s, granularity=%s, count=%s)"
+                % (currency, granularity, count))
+        return _tail(flight['result'], count)
+
+      # the other thread's request failed, try again on our own
+
+    try:
+      history = self.__fetch(currency, granularity, count, cached, elapsed, load)
+
+      if owned is not None:
+        owned['result'] = history
+    finally:
+      if owned is not None:
+        with self.__lock:
+          del self.__flights[key]
+
+        # in case of an exception the result remains None
+        owned['event'].set()
+
+    return _tail(history, count)
+
+
+  def __fetch(self, currency, granularity, count, cached, elapsed, load):
+    """Retrieve the history of a currency not (sufficiently) present in the cache.
+
+      Parameters:
+        currency     Name of the currency for which to query the history.
+        granularity  The granularity of the historic data to query.
+        count        Number of data points to retrieve.
+        cached       The outdated list of candles in the cache or None.
+        elapsed      A timedelta representing the time passed since the cached data was retrieved.
+        load         True if there is no cache entry yet and the store is to be consulted.
+
+      Returns:
+        The list of candles now cached, the oldest first. It contains at least 'count' candles
+        unless the server does not provide as many.
+    """
+    delta = _deltas[granularity]
+    key = (currency, granularity)
+    store = self.__store
+    update = []
+    # the time of the candle preceding the first of 'update', if that is an incremental update
+    previous = None
+    history = self.__resampleFiner(currency, granularity, count)
+
+    if history is None and load and store is not None:
+      # We do not know how old the stored data is (it is complete but the candles following it
+      # might be, too), so we treat it as outdated and update it.
+      cached = store.load(currency, granularity, count) or None
+
+    if history is None and cached is not None:
+      first = self.__lastComplete(cached, count, elapsed, delta)
+    else:
+      first = None
+
+    if first is not None:
+      # Only ask for the candles following the last complete one we know about. That includes the
+      # replacement for any incomplete candle trailing the cached data. The server might not know
+      # about any newer candle (it omits candles for periods without any ticks), in which case we
+      # stick to what we have.
+      time = cached[first]['time']
+      update = super().history(currency, granularity, len(cached), start=time, includeFirst=False)
+      update = [candle for candle in update if candle['time'] > time]
+
+      # If the server returned as many candles as we asked for there might be even more recent
+      # ones. In that case all the cached candles are replaced anyway.
+      if len(update) < len(cached):
+        if update:
+          history = cached[:first + 1] + update
+          history = history[len(history) - len(cached):]
+          previous = time
+        else:
+          history = cached
 
-    # there is no or to few history data in our cache, get the history from the server
-    history = super().history(currency, granularity, count)
-    cache_line = {'lastUpdate': datetime.now(), 'data': history}
+        with self.__lock:
+          self.__stats['updates'] += 1
+          self.__stats['savedCandles'] += len(cached) - len(update)
+
+        debug("cacheProxy: cache-update (currency=%s, granularity=%s, count=%s, new=%s)"
+                % (currency, granularity, count, len(update)))
+
+    if history is None:
+      # there is no or to few history data in our cache, get the history from the server
+      history = update = super().history(currency, granularity, count)
+
+      with self.__lock:
+        self.__stats['misses'] += 1
+
+      debug("cacheProxy: cache-miss (currency=%s, granularity=%s, count=%s)"
+              % (currency, granularity, count))
+
+    cache_line = {'lastUpdate': datetime.now(), 'data': history, 'bytes': _sizeOf(history)}
 
     # We released the lock in between so we might actually overwrite data written when the lock was
     # released. We do not care because any entry that we put in is valid -- we have no preference.
     with self.__lock:
-      # note that we could do much more effort to build the history incrementally by comparing
-      # timestamps etc., but in the end this simple case just replacing all the stale data with all
-      # the new data probably covers all relevant cases we are interested in
-      self.__history_data[currency][granularity] = cache_line
+      old = self.__history_data.pop(key, None)
+      if old is not None:
+        self.__bytes -= old['bytes']
+
+      self.__history_data[key] = cache_line
+      self.__bytes += cache_line['bytes']
+      self.__evict()
+
+    if store is not None:
+      store.store(currency, granularity, update, previous)
+
+    return history
+
+
+  def __resampleFiner(self, currency, granularity, count):
+    """Try to build a history from cached data of a finer granularity.
+
+      Parameters:
+        currency     Name of the currency for which to build the history.
+        granularity  The granularity of the history to build.
+        count        Number of data points required.
+
+      Returns:
+        A list of at least 'count' dicts in the format returned by Server.history or None if there
+        is not enough cached data of a suitable granularity.
+
+      Notes:
+        The finer history is requested through the cache again, i.e., it might be updated before it
+        is resampled.
+    """
+    target = _deltas[granularity]
+
+    with self.__lock:
+      # we require one additional candle because the first one built might be incomplete
+      candidates = [(g, len(e['data'])) for (c, g), e in self.__history_data.items()
+                    if c == currency and canResample(_deltas[g], target) and
+                       _deltas[g] * len(e['data']) >= target * (count + 1)]
+
+    if not candidates:
+      return None
+
+    # the coarsest of the finer granularities requires the least effort
+    finer, length = max(candidates, key=lambda candidate: _deltas[candidate[0]])
+    history = resample(self.history(currency, finer, length), _deltas[finer], target)
+
+    if len(history) < count:
+      return None
+
+    with self.__lock:
+      self.__stats['resampled'] += 1
 
-    debug("cacheProxy: cache-miss (currency=%s, granularity=%s, count=%s)"
-            % (currency, granularity, count))
+    debug("cacheProxy: resampled (currency=%s, granularity=%s, count=%s, from=%s)"
+            % (currency, granularity, count, finer))
     return history
 
 
+  def __lastComplete(self, cached, count, elapsed, delta):
+    """Find the last complete candle of cached history data an incremental update can be based on.
+
+      Parameters:
+        cached   The list of cached candles, the oldest first.
+        count    Number of data points requested.
+        elapsed  A timedelta representing the time passed since the cached data was retrieved or
+                 None if that is unknown.
+        delta    A timedelta representing the length of a single candle.
+
+      Returns:
+        The index of the last complete candle in 'cached' or None if the data has to be retrieved
+        completely, i.e., if it contains too few candles or so much time passed that an update
+        would replace all of them anyway.
+    """
+    if len(cached) < count:
+      return None
+    if elapsed is not None and elapsed >= delta * len(cached):
+      return None
+
+    for index in range(len(cached) - 1, -1, -1):
+      if cached[index]['complete']:
+        return index
+
+    return None
+
+
+  def backfill(self, start, end):
+    """Refresh all cached histories affected by an outage.
+
+      This method is meant to be invoked after an outage of the connection to the server: the
+      candles created in the meantime are requested right away (incrementally, if possible) instead
+      of when the history is requested the next time.
+
+      Parameters:
+        start  A datetime object, the start of the outage.
+        end    A datetime object, the end of the outage.
+
+      Returns:
+        The number of histories refreshed.
+
+      Notes:
+        Only histories that were still current at some point of the outage are refreshed, i.e.,
+        those last updated before its end and less than the duration of a candle before its start.
+        Older ones were outdated already and are updated when they are requested the next time.
+    """
+    with self.__lock:
+      stale = []
+
+      for (currency, granularity), entry in self.__history_data.items():
+        if start - _deltas[granularity] < entry['lastUpdate'] < end:
+          # make sure the entry is not considered current while keeping the time passed since its
+          # last update (which decides whether it can be updated incrementally)
+          entry['lastUpdate'] = min(entry['lastUpdate'], datetime.now() - _deltas[granularity])
+          stale.append((currency, granularity, len(entry['data'])))
+
+    for currency, granularity, count in stale:
+      self.history(currency, granularity, count)
+
+    with self.__lock:
+      self.__stats['backfilled'] += len(stale)
+
+    debug("cacheProxy: backfilled %d histories" % len(stale))
+    return len(stale)
+
+
   def invalidate(self):
-    """Invalidate all cache contents."""
+    """Invalidate all cache contents.
+
+      Notes:
+        An attached CandleStore is left untouched. It only contains complete candles which do not
+        change anymore, so it is used for rebuilding the cache instead of the server.
+    """
     with self.__lock:
-      self.__history_data = {}
+      self.__history_data = OrderedDict()
+      self.__bytes = 0
 
     warning("cacheProxy: cache invalidated")
@@ -0,0 +1,171 @@
+# candleSeries.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+from price           import Price, priceScale
+from datetimeRfc3339 import parseDateMicros
+from datetime        import datetime, timedelta
+from array           import array
+
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+"""Type codes of the arrays backing the individual columns of a CandleSeries."""
+_columns = {
+  # epoch microseconds
+  'time':     'q',
+  'open':     'd',
+  'high':     'd',
+  'low':      'd',
+  'close':    'd',
+  'volume':   'q',
+  'complete': 'b',
+}
+
+
+class CandleSeries:
+  def __init__(self, history, pip):
+    """Create a new CandleSeries object from a server's history response.
+
+      A CandleSeries stores candles in a columnar way: every value of a candle is kept in an array
+      of its own. The candles are indexed with the most recent one at the lowest index (just like
+      the lists of dicts returned by Currency.history used to be), but no copy of the data in
+      reversed order is ever made.
+
+      Parameters:
+        history  A list of dicts as returned by Server.history, i.e., with the oldest data point
+                 first.
+        pip      Quantity of a pip (Decimal) of the currency the candles belong to.
+    """
+    columns = {name: array(code) for name, code in _columns.items()}
+    times = columns['time']
+    opens = columns['open']
+    highs = columns['high']
+    lows = columns['low']
+    closes = columns['close']
+    volumes = columns['volume']
+    completes = columns['complete']
+
+    for value in history:
+      times.append(parseDateMicros(value['time']))
+      opens.append(value['openMid'])
+      highs.append(value['highMid'])
+      lows.append(value['lowMid'])
+      closes.append(value['closeMid'])
+      volumes.append(value['volume'])
+      completes.append(value['complete'])
+
+    self.__pip = pip
+    self.__scale = priceScale(pip)
+    self.__columns = columns
+    # The dicts handed out by __getitem__ are created lazily. We keep them around because clients
+    # (e.g., calculateAvg and calculateEMA) store their results in them.
+    self.__rows = [None] * len(times)
+    # the range of candles this object represents in the arrays, in chronological order
+    self.__start = 0
+    self.__stop = len(times)
+
+
+  def __view(self, start, stop):
+    """Create a new CandleSeries object sharing this object's data.
+
+      Parameters:
+        start  Chronological index of the first candle of the view.
+        stop   Chronological index one past the last candle of the view.
+
+      Returns:
+        A CandleSeries object representing the given range of candles.
+    """
+    view = CandleSeries([], self.__pip)
+    view.__columns = self.__columns
+    view.__rows = self.__rows
+    view.__start = start
+    view.__stop = stop
+    return view
+
+
+  def __len__(self):
+    """Retrieve the number of candles in the series."""
+    return self.__stop - self.__start
+
+
+  def __getitem__(self, key):
+    """Retrieve a candle or a range of candles.
+
+      Parameters:
+        key  An integer index or a slice. The most recent candle has index 0.
+
+      Returns:
+        A dict object containing the keys 'time' (datetime), 'open', 'high', 'low', 'close' (all
+        Price objects), 'volume', and 'complete' in case of an integer index. A CandleSeries object
+        sharing the data of this object in case of a slice with a step of one, a list of dict
+        objects in case of any other slice.
+    """
+    if isinstance(key, slice):
+      first, last, step = key.indices(len(self))
+
+      if step != 1:
+        return [self[i] for i in range(first, last, step)]
+
+      # indices are counted from the most recent candle on, so we have to mirror them
+      last = max(first, last)
+      return self.__view(self.__stop - last, self.__stop - first)
+
+    if key < 0:
+      key += len(self)
+    if key < 0 or key >= len(self):
+      raise IndexError('CandleSeries index out of range')
+
+    index = self.__stop - 1 - key
+    row = self.__rows[index]
+
+    if row is None:
+      columns = self.__columns
+      scale = self.__scale
+      row = {'time':     _EPOCH + timedelta(microseconds=columns['time'][index]),
+             'open':     Price(columns['open'][index], scale),
+             'high':     Price(columns['high'][index], scale),
+             'low':      Price(columns['low'][index], scale),
+             'close':    Price(columns['close'][index], scale),
+             'volume':   columns['volume'][index],
+             'complete': bool(columns['complete'][index])}
+      self.__rows[index] = row
+
+    return row
+
+
+  def __iter__(self):
+    """Iterate over all candles, starting with the most recent one."""
+    for i in range(len(self)):
+      yield self[i]
+
+
+  def column(self, name):
+    """Retrieve the raw values of one of the candles' properties.
+
+      Parameters:
+        name  One of 'time' (epoch microseconds), 'open', 'high', 'low', 'close' (all floats),
+              'volume', or 'complete'.
+
+      Returns:
+        A memoryview of the values in chronological order, i.e., with the oldest value first. No
+        data is copied. The view can directly be used for creating arrays of the numpy module, for
+        instance.
+    """
+    return memoryview(self.__columns[name])[self.__start:self.__stop]
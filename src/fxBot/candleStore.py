@@ -0,0 +1,135 @@
+# candleStore.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+from threading import Lock
+from sqlite3   import connect
+
+
+_SCHEMA = """
+  CREATE TABLE IF NOT EXISTS candles (
+    instrument  TEXT    NOT NULL,
+    granularity TEXT    NOT NULL,
+    time        TEXT    NOT NULL,
+    openMid     REAL    NOT NULL,
+    highMid     REAL    NOT NULL,
+    lowMid      REAL    NOT NULL,
+    closeMid    REAL    NOT NULL,
+    volume      INTEGER NOT NULL,
+    previous    TEXT,
+    PRIMARY KEY (instrument, granularity, time)
+  ) WITHOUT ROWID
+"""
+
+
+class CandleStore:
+  def __init__(self, path):
+    """Create a new CandleStore object persisting candles in an SQLite database.
+
+      A CandleStore keeps complete candles (i.e., candles whose data is final) on disk, indexed by
+      instrument and granularity, so that a cache can be warmed up without querying the server.
+
+      The candles stored may have holes: those of different runs are not necessarily adjacent.
+      Because the server omits candles of periods without any ticks, the times of the candles do
+      not tell whether any are missing in between. Instead, every candle records the time of the
+      candle that preceded it when it was retrieved from the server ('previous'), which is what
+      load() relies on.
+
+      Parameters:
+        path  Path of the database file. It is created if it does not exist. Use ':memory:' for a
+              store that is not persisted.
+    """
+    # the connection is shared among all the threads using the store, access is serialized by our
+    # lock
+    self.__lock = Lock()
+    self.__connection = connect(path, check_same_thread=False)
+
+    with self.__lock, self.__connection:
+      self.__connection.execute(_SCHEMA)
+
+      columns = [row[1] for row in self.__connection.execute("PRAGMA table_info(candles)")]
+      if 'previous' not in columns:
+        # a store created before candles recorded their predecessors, none of its candles is known
+        # to follow another one
+        self.__connection.execute("ALTER TABLE candles ADD COLUMN previous TEXT")
+
+
+  def close(self):
+    """Close the store."""
+    with self.__lock:
+      self.__connection.close()
+
+
+  def load(self, currency, granularity, count):
+    """Load the most recent contiguous candles stored for a currency.
+
+      Parameters:
+        currency     Name of the currency for which to load the candles.
+        granularity  The granularity of the candles.
+        count        Maximum number of candles to load.
+
+      Returns:
+        A list of at most 'count' dicts in the format returned by Server.history, the oldest candle
+        first. All of them are complete and each of them followed the previous one when it was
+        retrieved from the server, i.e., the list ends at the first hole (if any) in the store.
+    """
+    with self.__lock:
+      rows = self.__connection.execute(
+        "SELECT time, openMid, highMid, lowMid, closeMid, volume, previous FROM candles "
+        "WHERE instrument = ? AND granularity = ? ORDER BY time DESC LIMIT ?",
+        (currency, granularity, count)).fetchall()
+
+    # rows are ordered newest first, cut them off at the first one not following its predecessor
+    for index in range(1, len(rows)):
+      if rows[index - 1][6] != rows[index][0]:
+        rows = rows[:index]
+        break
+
+    rows.reverse()
+    return [{'time': time, 'openMid': openMid, 'highMid': highMid, 'lowMid': lowMid,
+             'closeMid': closeMid, 'volume': volume, 'complete': True}
+            for time, openMid, highMid, lowMid, closeMid, volume, _ in rows]
+
+
+  def store(self, currency, granularity, candles, previous=None):
+    """Store candles of a currency.
+
+      Parameters:
+        currency     Name of the currency the candles belong to.
+        granularity  The granularity of the candles.
+        candles      A list of contiguous dicts in the format returned by Server.history, the
+                     oldest first. Incomplete candles are ignored, already stored ones are
+                     updated.
+        previous     (optional) The time (string) of the candle the server returned the first of
+                     the given candles after, if known (for instance, in case of an incremental
+                     update).
+    """
+    times = [previous] + [c['time'] for c in candles]
+    rows = [(currency, granularity, c['time'], c['openMid'], c['highMid'], c['lowMid'],
+             c['closeMid'], c['volume'], time) for c, time in zip(candles, times) if c['complete']]
+
+    if rows:
+      with self.__lock, self.__connection:
+        # a candle known to follow another one keeps doing so if it is retrieved again as the
+        # first of a response
+        self.__connection.executemany(
+          "INSERT INTO candles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+          "ON CONFLICT (instrument, granularity, time) DO UPDATE SET "
+          "openMid = excluded.openMid, highMid = excluded.highMid, lowMid = excluded.lowMid, "
+          "closeMid = excluded.closeMid, volume = excluded.volume, "
+          "previous = coalesce(excluded.previous, previous)", rows)
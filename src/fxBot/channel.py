@@ -0,0 +1,285 @@
+# channel.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+from worker    import messageInstrument
+from threading import Lock, Condition
+from queue     import Empty, Full
+from time      import monotonic
+
+
+"""The policies a Channel can apply when a message is put into it while it is full."""
+BLOCK = 'block'
+DROP_OLDEST = 'drop'
+CONFLATE = 'conflate'
+
+POLICIES = (BLOCK, DROP_OLDEST, CONFLATE)
+
+
+class Channel:
+  def __init__(self, capacity, policy=BLOCK):
+    '''Create a new Channel object.
+
+      A Channel is a bounded FIFO queue backed by a preallocated ring buffer. It supports the put()
+      and get() methods of queue.Queue and can be used instead of it. What happens when a message
+      is put into a full channel depends on the policy:
+        BLOCK        The producer waits until the consumer made room.
+        DROP_OLDEST  The oldest tick in the channel is dropped. Other messages (transactions and
+                     heartbeats) are never dropped, if there is no tick the producer waits.
+        CONFLATE     A tick replaces a tick for the same instrument still waiting in the channel
+                     (keeping its position) even if the channel is not full, just like it happens
+                     in a ConflatingQueue. If the message cannot be conflated the producer waits.
+                     A tick never overtakes a transaction for its instrument.
+
+      Parameters:
+        capacity  The maximum number of messages in the channel.
+        policy    (optional) One of BLOCK, DROP_OLDEST, and CONFLATE.
+    '''
+    if capacity < 1:
+      raise ValueError("Invalid channel capacity: %s" % capacity)
+    if policy not in POLICIES:
+      raise ValueError("Invalid overflow policy: %s" % policy)
+
+    lock = Lock()
+    self.__notEmpty = Condition(lock)
+    self.__notFull = Condition(lock)
+    self.__lock = lock
+    self.__policy = policy
+    self.__capacity = capacity
+    # the messages and, for ticks, the names of their instruments
+    self.__buffer = [None] * capacity
+    self.__names = [None] * capacity
+    # index of the oldest message in the buffer and number of messages
+    self.__head = 0
+    self.__size = 0
+    # number of threads waiting in get() and put(), respectively
+    self.__getters = 0
+    self.__putters = 0
+    # dict indexed by instrument names containing the index of the tick waiting in the buffer
+    # (CONFLATE policy only)
+    self.__pending = {}
+    # dict indexed by instrument names containing the number of ticks dropped
+    self.__conflated = {}
+    self.__highWater = 0
+    self.__puts = 0
+    self.__blocked = 0
+    self.__dropped = 0
+    self.__replaced = 0
+
+
+  def __wait(self, condition, block, deadline, error):
+    '''Wait for a condition to be signaled.
+
+      Parameters:
+        condition  The condition to wait for.
+        block      Whether waiting is allowed at all.
+        deadline   Time (as returned by time.monotonic) after which to give up or None.
+        error      The exception type to raise if the time is up.
+
+      Notes:
+        The lock must be held. The caller has to check its predicate in a loop.
+    '''
+    if not block:
+      raise error()
+
+    if deadline is None:
+      condition.wait()
+    elif not condition.wait(deadline - monotonic()):
+      raise error()
+
+
+  def __dropOldest(self):
+    '''Remove the oldest tick from the buffer.
+
+      Returns:
+        True if a tick was removed, False if the buffer contains no ticks.
+    '''
+    buffer = self.__buffer
+    names = self.__names
+    capacity = self.__capacity
+    head = self.__head
+
+    for i in range(self.__size):
+      name = names[(head + i) % capacity]
+
+      if name is not None:
+        # move the messages preceding the dropped tick by one slot
+        for j in range(i, 0, -1):
+          to = (head + j) % capacity
+          fro = (head + j - 1) % capacity
+          buffer[to] = buffer[fro]
+          names[to] = names[fro]
+
+        buffer[head] = None
+        names[head] = None
+        self.__head = (head + 1) % capacity
+        self.__size -= 1
+        self.__dropped += 1
+        self.__conflated[name] = self.__conflated.get(name, 0) + 1
+        return True
+
+    return False
+
+
+  def put(self, data, block=True, timeout=None):
+    '''Put a message into the channel.
+
+      Parameters:
+        data     The message to enqueue.
+        block    (optional) Whether to wait if the message can only be stored after the consumer
+                 made room.
+        timeout  (optional) Maximum time (in seconds) to wait.
+
+      Raises:
+        queue.Full if the message could not be stored in time.
+    '''
+    name = messageInstrument(data)
+    # only ticks are conflated or dropped, transactions may refer to an instrument as well
+    transaction = 'transaction' in data
+
+    with self.__lock:
+      self.__puts += 1
+      waiting = False
+
+      # another producer may have queued a tick for the instrument while we waited, so we look for
+      # one again after every wakeup
+      while True:
+        if self.__policy == CONFLATE and name is not None and not transaction:
+          index = self.__pending.get(name)
+
+          if index is not None:
+            self.__buffer[index] = data
+            self.__conflated[name] = self.__conflated.get(name, 0) + 1
+            self.__replaced += 1
+            return
+
+        if self.__size < self.__capacity:
+          break
+        if self.__policy == DROP_OLDEST and self.__dropOldest():
+          break
+
+        if not waiting:
+          waiting = True
+          self.__blocked += 1
+          deadline = monotonic() + timeout if timeout is not None else None
+
+        self.__putters += 1
+        try:
+          self.__wait(self.__notFull, block, deadline, Full)
+        finally:
+          self.__putters -= 1
+
+      index = self.__head + self.__size
+      if index >= self.__capacity:
+        index -= self.__capacity
+
+      self.__buffer[index] = data
+      self.__names[index] = name if not transaction else None
+      self.__size += 1
+
+      if self.__policy == CONFLATE and name is not None:
+        if transaction:
+          # the waiting tick must be retrieved before the transaction, later ones after it
+          self.__pending.pop(name, None)
+        else:
+          self.__pending[name] = index
+
+      if self.__size > self.__highWater:
+        self.__highWater = self.__size
+
+      if self.__getters:
+        self.__notEmpty.notify()
+
+
+  def get(self, block=True, timeout=None):
+    '''Remove and retrieve the oldest message from the channel.
+
+      Parameters:
+        block    (optional) Whether to wait for a message if the channel is empty.
+        timeout  (optional) Maximum time (in seconds) to wait.
+
+      Returns:
+        The oldest message in the channel.
+
+      Raises:
+        queue.Empty if no message arrived in time.
+    '''
+    with self.__lock:
+      if not self.__size:
+        self.__getters += 1
+        deadline = monotonic() + timeout if timeout is not None else None
+
+        try:
+          while not self.__size:
+            self.__wait(self.__notEmpty, block, deadline, Empty)
+        finally:
+          self.__getters -= 1
+
+      head = self.__head
+      buffer = self.__buffer
+      names = self.__names
+      data = buffer[head]
+      name = names[head]
+      buffer[head] = None
+      names[head] = None
+      self.__head = head + 1 if head + 1 < self.__capacity else 0
+      self.__size -= 1
+
+      if name is not None and self.__pending.get(name) == head:
+        del self.__pending[name]
+
+      if self.__putters:
+        self.__notFull.notify()
+
+      return data
+
+
+  def qsize(self):
+    '''Retrieve the number of messages waiting in the channel.'''
+    with self.__lock:
+      return self.__size
+
+
+  def conflated(self):
+    '''Retrieve the number of ticks dropped per instrument.
+
+      Returns:
+        A dict object indexed by instrument names containing the number of ticks that were dropped
+        or replaced by a more recent one before being retrieved.
+    '''
+    with self.__lock:
+      return dict(self.__conflated)
+
+
+  def stats(self):
+    '''Retrieve statistics about the usage of the channel.
+
+      Returns:
+        A dict object containing the capacity of the channel ('capacity'), the current number of
+        messages ('size'), the maximum number of messages ever stored at once ('highWater'), the
+        number of put() invocations ('puts'), of those that had to wait ('blocked'), and the number
+        of ticks dropped ('dropped') and conflated ('conflated').
+    '''
+    with self.__lock:
+      return {'capacity': self.__capacity,
+              'size': self.__size,
+              'highWater': self.__highWater,
+              'puts': self.__puts,
+              'blocked': self.__blocked,
+              'dropped': self.__dropped,
+              'conflated': self.__replaced}
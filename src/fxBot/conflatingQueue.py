@@ -0,0 +1,119 @@
+# conflatingQueue.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+from worker      import messageInstrument
+from threading   import Condition
+from collections import deque
+
+
+class ConflatingQueue:
+  def __init__(self):
+    '''Create a new ConflatingQueue object.
+
+      A ConflatingQueue is a FIFO queue that keeps at most one tick per instrument: if a tick is
+      put into the queue while a tick for the same instrument is still waiting to be retrieved, the
+      waiting one is replaced by the new one (keeping its position). Hence, while the consumer is
+      not keeping up, it only ever sees the most recent price of every instrument. All other
+      messages (transactions and heartbeats) are never dropped. A tick never overtakes a transaction
+      for its instrument, a tick put after one starts a new position behind it.
+
+      Notes:
+        Only the put() and get() methods of queue.Queue are supported.
+    '''
+    self.__lock = Condition()
+    # FIFO of two element lists: the message and the name of the instrument for ticks
+    self.__items = deque()
+    # dict indexed by instrument names containing the entry of the tick waiting in the queue
+    self.__pending = {}
+    # dict indexed by instrument names containing the number of ticks dropped
+    self.__conflated = {}
+
+
+  def put(self, data, block=True, timeout=None):
+    '''Put a message into the queue.
+
+      Parameters:
+        data     The message to enqueue.
+        block    Ignored, the queue is unbounded.
+        timeout  Ignored, the queue is unbounded.
+    '''
+    name = messageInstrument(data)
+    # transactions refer to an instrument as well but are never conflated
+    transaction = 'transaction' in data
+
+    with self.__lock:
+      if transaction:
+        # the waiting tick must be retrieved before the transaction, later ones after it
+        self.__pending.pop(name, None)
+        name = None
+
+      entry = self.__pending.get(name) if name is not None else None
+
+      if entry is not None:
+        entry[0] = data
+        self.__conflated[name] = self.__conflated.get(name, 0) + 1
+        return
+
+      entry = [data, name]
+      if name is not None:
+        self.__pending[name] = entry
+
+      self.__items.append(entry)
+      self.__lock.notify()
+
+
+  def get(self, block=True, timeout=None):
+    '''Remove and retrieve the oldest message from the queue, waiting for one if necessary.
+
+      Parameters:
+        block    Ignored, the call always blocks.
+        timeout  Ignored, the call always blocks.
+
+      Returns:
+        The oldest message in the queue.
+    '''
+    with self.__lock:
+      while not self.__items:
+        self.__lock.wait()
+
+      entry = self.__items.popleft()
+      data, name = entry
+
+      # a transaction may have detached the entry already
+      if name is not None and self.__pending.get(name) is entry:
+        del self.__pending[name]
+
+      return data
+
+
+  def qsize(self):
+    '''Retrieve the number of messages waiting in the queue.'''
+    with self.__lock:
+      return len(self.__items)
+
+
+  def conflated(self):
+    '''Retrieve the number of ticks dropped per instrument.
+
+      Returns:
+        A dict object indexed by instrument names containing the number of ticks that were replaced
+        by a more recent one before being retrieved.
+    '''
+    with self.__lock:
+      return dict(self.__conflated)
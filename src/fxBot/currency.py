@@ -17,11 +17,12 @@
 # *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
 # ***************************************************************************/
 
-from price           import Price
+from price           import Price, priceScale
 from decimal         import Decimal
 from logging         import debug
 from datetime        import datetime, timedelta
 from datetimeRfc3339 import parseDate
+from candleSeries    import CandleSeries
 
 
 """Dictionary for mapping granularities from user-friendly ones to OANDA specific ones."""
@@ -55,14 +56,14 @@ def parsePrice(currency, price):
 
     Parameters:
       price  A dict object containing a 'time' value (string) and two prices, 'ask' and 'bid' (both
-             strings).
+             strings or floats).
 
     Returns:
       A dict object containing 'time' (datetime) and 'ask' and 'bid' (both Price objects).
   """
   return {'time': parseDate(price['time']),
-          'ask':  Price(Decimal(price['ask']), currency.pip()),
-          'bid':  Price(Decimal(price['bid']), currency.pip())}
+          'ask':  Price(price['ask'], currency.scale()),
+          'bid':  Price(price['bid'], currency.scale())}
 
 
 class Currency:
@@ -83,6 +84,7 @@ class Currency:
     self.__currency = currency
     # TODO: query actual value from server
     self.__pip = Decimal('0.001')
+    self.__scale = priceScale(self.__pip)
 
 
   def name(self):
@@ -103,6 +105,15 @@ class Currency:
     return self.__pip
 
 
+  def scale(self):
+    """Retrieve the scale of all Price objects of this currency.
+
+      Returns:
+        A PriceScale object shared by all prices of this currency.
+    """
+    return self.__scale
+
+
   def currentPrices(self):
     """Retrieve the current bid and ask prices for this currency.
 
@@ -114,6 +125,39 @@ class Currency:
     return parsePrice(self, prices)
 
 
+  @staticmethod
+  def batchCurrentPrices(currencies):
+    """Retrieve the current bid and ask prices for a number of currencies.
+
+      Parameters:
+        currencies  A list of Currency objects.
+
+      Returns:
+        A dict object indexed by the currencies' names containing the current prices of the
+        respective currency in the format returned by currentPrices. Currencies for which the
+        server did not return any prices are missing.
+
+      Notes:
+        The prices of all currencies sharing the same server object are retrieved using a single
+        request.
+    """
+    servers = {}
+    for currency in currencies:
+      servers.setdefault(id(currency.__server), []).append(currency)
+
+    result = {}
+    for batch in servers.values():
+      currencies = {c.__currency: c for c in batch}
+      prices = batch[0].__server.currentPrices(list(currencies))
+
+      # the server may omit currencies, so prices are matched by instrument and not by position
+      for price in prices:
+        name = price['instrument']
+        result[name] = parsePrice(currencies[name], price)
+
+    return result
+
+
   def history(self, granularity, count):
     """Retrieve past values of a currency.
 
@@ -124,20 +168,13 @@ class Currency:
         count        Amount of historic datapoints to retrieve.
 
       Returns:
-        A list of dicts of the form {time: string, open: Decimal, close: Decimal} representing
-        values at specific instances in time.
+        A CandleSeries object with the most recent data point at index 0. Indexing it yields dicts
+        of the form {time: datetime, open: Price, high: Price, low: Price, close: Price, volume:
+        int, complete: bool} representing values at specific instances in time.
 
       Notes:
         All valid granularities can be found as the keys of the '_granularities' dict object.
     """
     granularity = _granularities[granularity]
     history = self.__server.history(self.__currency, granularity, count)
-
-    # create our own list of dicts with our own set of indices and a reverse ordering where the newest
-    # entries are at the lower indices
-    values = []
-    for value in history:
-      values = [{'time': parseDate(value['time']),
-                 'open': Price(Decimal(value['openMid']), self.__pip),
-                 'close': Price(Decimal(value['closeMid']), self.__pip)}] + values
-    return values
+    return CandleSeries(history, self.__pip)
@@ -19,21 +19,29 @@
 
 """A trading bot for the Forex market using OANDA's REST API."""
 
-from signal     import signal, pause, SIGINT, SIGTERM, SIGHUP
-from logging    import basicConfig, addLevelName, WARNING
-from optparse   import OptionParser
-from oandapy    import API
-from program    import Program
-from server     import Server
-from proxy      import createProxyInstance
-from cacheProxy import CacheProxy
-from timeProxy  import TimeProxy
-from limitProxy import LimitProxy
+from signal         import signal, pause, SIGINT, SIGTERM, SIGHUP, SIGUSR1
+from logging        import basicConfig, addLevelName, WARNING
+from optparse       import OptionParser
+from oandapy        import API
+from program        import Program
+from server         import Server
+from proxy          import createProxyInstance
+from cacheProxy     import CacheProxy
+from timeProxy      import TimeProxy
+from limitProxy     import LimitProxy
+from candleStore    import CandleStore
+from backtestServer import loadRecording
+from channel        import BLOCK, POLICIES
+from asyncStreamer  import PRACTICE_URL
+from tickJournal    import TickJournal
+from latencyTracer  import LatencyTracer
+from metrics        import Registry
 
 
 _proxy = None
 _program = None
 _terminate = False
+_report = False
 
 
 def _onTerminate(signum, frame):
@@ -71,11 +79,26 @@ def _onReload(signum, frame):
   _proxy.invalidate()
 
 
+def _onReport(signum, frame):
+  """Handle the SIGUSR1 signal.
+
+    Parameters:
+      signum  Unused.
+      frame   Unused.
+  """
+  global _report
+
+  # printing a report takes a while, we leave it to the main loop which wakes up from pause() as
+  # soon as we return
+  _report = True
+
+
 def main():
   """The main function parses the program arguments and reacts on them."""
   global _proxy
   global _program
   global _terminate
+  global _report
 
   usage = "Usage: %prog [options] <access token>"
   version = "%prog 0.1"
@@ -91,15 +114,53 @@ def main():
                     help="specify an account ID to use")
   parser.add_option("-c", "--currencies", dest="currencies", default=None,
                     help="comma separated list of currencies to work with")
+  parser.add_option("-b", "--backtest", dest="backtest", default=None,
+                    help="replay the data recorded in the given file (or journal directory) "
+                         "instead of trading")
+  parser.add_option("-g", "--granularity", dest="granularity", default=None,
+                    help="granularity of the recorded candles to replay in a backtest")
+  parser.add_option("--cache-file", dest="cache_file", default=None,
+                    help="persist complete candles in the given file to speed up restarts")
+  parser.add_option("--cache-entries", dest="cache_entries", default=None, type="int",
+                    help="maximum number of histories to cache")
+  parser.add_option("--cache-bytes", dest="cache_bytes", default=None, type="int",
+                    help="maximum number of bytes occupied by cached histories")
+  parser.add_option("-t", "--timeout", dest="timeout", default=10000, type="int",
+                    help="query prices of currencies without ticks for the given number of ms")
+  parser.add_option("-w", "--workers", dest="workers", default=1, type="int",
+                    help="number of threads to distribute the currencies' strategies among")
+  parser.add_option("-p", "--processes", dest="processes", default=0, type="int",
+                    help="run the currencies' strategies in the given number of processes")
+  parser.add_option("--conflate", dest="conflate", default=False, action="store_true",
+                    help="skip outdated ticks of a currency while its worker is falling behind")
+  parser.add_option("--queue-size", dest="queue_size", default=0, type="int",
+                    help="maximum number of messages waiting for a worker (default: unlimited)")
+  parser.add_option("--overflow", dest="overflow", default=BLOCK, choices=POLICIES,
+                    help="what to do if a worker's queue is full: %s" % ", ".join(POLICIES))
+  parser.add_option("--api-url", dest="api_url", default=None,
+                    help="URL of the server providing the REST API (e.g., a standInServer)")
+  parser.add_option("--stream-url", dest="stream_url", default=PRACTICE_URL,
+                    help="URL of the server providing the rate and event streams")
+  parser.add_option("--record", dest="record", default=None,
+                    help="record all ticks received in a journal in the given directory")
+  parser.add_option("--trace", dest="trace", default=False, action="store_true",
+                    help="trace the latencies of ticks, send SIGUSR1 to print them")
+  parser.add_option("--metrics-port", dest="metrics_port", default=None, type="int",
+                    help="serve metrics in Prometheus' text format on the given local port")
   parser.add_option("-v", "--verbose", dest="verbosity", default=0,
                     action="count",
                     help="increase verbosity of output")
 
   (options, arguments) = parser.parse_args()
 
-  if len(arguments) != 1:
+  if len(arguments) != 1 and not options.backtest:
     parser.error("invalid number of arguments")
 
+  # the queues of worker processes are pipes, they can be neither bounded nor conflated
+  if options.processes > 0 and (options.conflate or options.queue_size or
+                                options.overflow != BLOCK):
+    parser.error("--conflate, --queue-size, and --overflow cannot be used with --processes")
+
   # numeric values of the logging levels:
   # CRITICAL  50
   # ERROR     40
@@ -121,15 +182,29 @@ def main():
   signal(SIGINT,  _onTerminate)
   signal(SIGTERM, _onTerminate)
   signal(SIGHUP,  _onReload)
+  signal(SIGUSR1, _onReport)
+
+  if options.backtest:
+    # a backtest replays recorded data as fast as possible, there is neither a need nor a use for
+    # any of the proxies (they all relate their data to the wallclock time)
+    _program = Program(loadRecording(options.backtest))
+    _program.backtest(options.currencies, options.granularity)
+    exit(0)
 
   api = API(environment="practice", access_token=arguments[0])
+  if options.api_url:
+    api.api_url = options.api_url
   server = Server(api)
-  # timeout in milliseconds
-  # XXX: fixed for now -- make configurable
-  timeout = 10000
 
   _proxy = createProxyInstance(server, CacheProxy, TimeProxy, LimitProxy)
-  _program = Program(_proxy)
+  _proxy.setBudget(options.cache_entries, options.cache_bytes)
+  if options.cache_file:
+    _proxy.attachStore(CandleStore(options.cache_file))
+
+  journal = TickJournal(options.record) if options.record else None
+  tracer = LatencyTracer() if options.trace else None
+  registry = Registry() if options.metrics_port is not None else None
+  _program = Program(_proxy, options.stream_url, journal, tracer, registry)
 
   if options.list_accounts:
     _program.listAccounts();
@@ -152,7 +227,16 @@ def main():
   if not options.currencies:
     parser.error("no currencies specified, use --currencies=<C1,C2,...,Cn>")
 
-  _program.start(options.account_id, options.currencies, timeout)
+  # Serve the metrics before starting the program. The program's threads keep running if we exit
+  # here, so a port already in use must be detected up front.
+  if registry is not None:
+    try:
+      registry.start(port=options.metrics_port)
+    except OSError as error:
+      parser.error("cannot serve metrics on port %d: %s" % (options.metrics_port, error.strerror))
+
+  _program.start(options.account_id, options.currencies, options.timeout, options.workers,
+                 options.processes, options.conflate, options.queue_size, options.overflow)
 
   # We must not exit here until we know that all threads are either torn down or are daemons anyway
   # (in which case they are forcefully shutdown when the program terminates). If we exit, nobody is
@@ -162,6 +246,10 @@ def main():
   while not _terminate:
     pause()
 
+    if _report:
+      _report = False
+      print(tracer.report() if tracer else "latency tracing is disabled, use --trace", flush=True)
+
 
 if __name__ == '__main__':
   main()
@@ -0,0 +1,280 @@
+# indicators.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+"""Vectorized indicators operating on arrays of prices.
+
+  In contrast to the functions in the statistics module, which work on lists of dicts containing
+  Decimal or Price objects, the functions in here work on contiguous arrays of float64 values and
+  are meant for research and backtesting over large histories. All arrays are ordered
+  chronologically, i.e., the oldest value comes first. This is the order in which the server
+  returns candles and the reverse of the order used by Currency.history.
+
+  All indicators apart from the RSI are linear in the prices they are calculated from and the RSI
+  is invariant to scaling. Hence, prices represented as scaled integers can be passed in directly
+  and the results are in the same scale.
+
+  Entries for which an indicator is not yet defined (because not enough values precede them) are
+  set to NaN.
+"""
+
+from math  import log
+from numpy import arange, ascontiguousarray, convolve, cumsum, diff, empty, errstate, full, \
+                  maximum, nan, float64, abs as absolute, where
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+# Exponential smoothing is a recursive operation. We evaluate it in closed form on blocks of values
+# which requires scaling the values by powers of the smoothing factor. The size of a block is chosen
+# such that these powers stay within this range and the float64 arithmetic stays exact enough.
+_BLOCK_RANGE = log(1e100)
+
+
+def _array(values):
+  """Convert a sequence of values into a contiguous float64 array (without copying if possible)."""
+  return ascontiguousarray(values, dtype=float64)
+
+
+def _smooth(values, alpha, seed):
+  """Apply exponential smoothing to an array of values.
+
+    Parameters:
+      values  A float64 array of values.
+      alpha   The smoothing factor in (0, 1].
+      seed    The smoothed value preceding the first value.
+
+    Returns:
+      An array with result[i] = alpha * values[i] + (1 - alpha) * result[i - 1] where
+      result[-1] = seed.
+  """
+  n = len(values)
+  result = empty(n)
+
+  if alpha == 1.0:
+    result[:] = values
+    return result
+
+  b = 1.0 - alpha
+  size = max(1, min(n, int(_BLOCK_RANGE / -log(b))))
+  # powers[k] = b^k, inverse[k] = b^-k
+  powers = b ** arange(size + 1, dtype=float64)
+  inverse = 1.0 / powers[:size]
+
+  previous = seed
+  for start in range(0, n, size):
+    block = values[start:start + size]
+    m = len(block)
+    # within a block the recursion unrolls to
+    #   result[k] = b^(k+1) * previous + alpha * b^k * sum(values[j] * b^-j for j in 0..k)
+    sums = cumsum(block * inverse[:m])
+    result[start:start + m] = powers[1:m + 1] * previous + alpha * powers[:m] * sums
+    previous = result[start + m - 1]
+
+  return result
+
+
+def _wilder(values, count):
+  """Apply Wilder's smoothing to an array of values.
+
+    Parameters:
+      values  A float64 array of values.
+      count   Number of periods to smooth over.
+
+    Returns:
+      An array whose first 'count' - 1 entries are NaN, whose entry at index 'count' - 1 is the mean
+      of the first 'count' values, and whose remaining entries are exponentially smoothed with a
+      factor of 1 / 'count'.
+  """
+  result = full(len(values), nan)
+
+  if len(values) >= count:
+    seed = values[:count].mean()
+    result[count - 1] = seed
+    result[count:] = _smooth(values[count:], 1.0 / count, seed)
+
+  return result
+
+
+def average(opens, closes):
+  """Calculate the average price based on opening and closing prices.
+
+    Parameters:
+      opens   Array of opening prices.
+      closes  Array of closing prices.
+
+    Returns:
+      An array of the averages of the two prices (see statistics.calculateAvg).
+  """
+  return (_array(opens) + _array(closes)) / 2.0
+
+
+def ema(values, count):
+  """Calculate the Exponential Moving Average.
+
+    Parameters:
+      values  Array of prices.
+      count   Number of periods for which to calculate the EMA.
+
+    Returns:
+      An array of EMA values. The first value is used as the seed, i.e., the result for an array of
+      'count' values equals the one of statistics.calculateEMA for the same values.
+  """
+  values = _array(values)
+  result = empty(len(values))
+
+  if len(values) > 0:
+    result[0] = values[0]
+    result[1:] = _smooth(values[1:], 2.0 / (count + 1), values[0])
+
+  return result
+
+
+def sma(values, count):
+  """Calculate the Simple Moving Average.
+
+    Parameters:
+      values  Array of prices.
+      count   Number of periods to average over.
+
+    Returns:
+      An array of SMA values.
+  """
+  values = _array(values)
+  result = full(len(values), nan)
+
+  if len(values) >= count:
+    sums = cumsum(values)
+    result[count - 1] = sums[count - 1]
+    result[count:] = sums[count:] - sums[:-count]
+    result[count - 1:] /= count
+
+  return result
+
+
+def wma(values, count):
+  """Calculate the (linearly) Weighted Moving Average.
+
+    Parameters:
+      values  Array of prices.
+      count   Number of periods to average over. The most recent value is weighted with 'count',
+              the oldest with 1.
+
+    Returns:
+      An array of WMA values.
+  """
+  values = _array(values)
+  result = full(len(values), nan)
+
+  if len(values) >= count:
+    weights = arange(count, 0, -1, dtype=float64)
+    result[count - 1:] = convolve(values, weights, 'valid') / weights.sum()
+
+  return result
+
+
+def rsi(values, count=14):
+  """Calculate the Relative Strength Index.
+
+    Parameters:
+      values  Array of (closing) prices.
+      count   Number of periods to calculate the index for.
+
+    Returns:
+      An array of RSI values in the range [0, 100]. Gains and losses are smoothed as proposed by
+      Wilder.
+  """
+  values = _array(values)
+  result = full(len(values), nan)
+
+  if len(values) > count:
+    changes = diff(values)
+    gains = _wilder(maximum(changes, 0.0), count)[count - 1:]
+    losses = _wilder(maximum(-changes, 0.0), count)[count - 1:]
+
+    with errstate(divide='ignore', invalid='ignore'):
+      index = 100.0 - 100.0 / (1.0 + gains / losses)
+
+    # without any losses the RSI is 100 (and undefined if there was no change at all)
+    result[count:] = where(losses == 0.0, where(gains == 0.0, nan, 100.0), index)
+
+  return result
+
+
+def bollingerBands(values, count=20, width=2.0):
+  """Calculate the Bollinger Bands.
+
+    Parameters:
+      values  Array of prices.
+      count   Number of periods to calculate the moving average and standard deviation for.
+      width   Distance of the bands from the moving average in multiples of the standard deviation.
+
+    Returns:
+      A tuple of three arrays: the middle band (the SMA), the upper, and the lower band.
+  """
+  values = _array(values)
+  middle = sma(values, count)
+  deviation = full(len(values), nan)
+
+  if len(values) >= count:
+    deviation[count - 1:] = sliding_window_view(values, count).std(axis=1)
+
+  return middle, middle + width * deviation, middle - width * deviation
+
+
+def atr(high, low, close, count=14):
+  """Calculate the Average True Range.
+
+    Parameters:
+      high   Array of highest prices.
+      low    Array of lowest prices.
+      close  Array of closing prices.
+      count  Number of periods to average over.
+
+    Returns:
+      An array of ATR values, smoothed as proposed by Wilder.
+  """
+  high = _array(high)
+  low = _array(low)
+  close = _array(close)
+
+  ranges = high - low
+  if len(ranges) > 1:
+    previous = close[:-1]
+    ranges[1:] = maximum(ranges[1:], maximum(absolute(high[1:] - previous),
+                                             absolute(low[1:] - previous)))
+
+  return _wilder(ranges, count)
+
+
+def macd(values, fast=12, slow=26, signal=9):
+  """Calculate the Moving Average Convergence/Divergence.
+
+    Parameters:
+      values  Array of prices.
+      fast    Number of periods of the fast EMA.
+      slow    Number of periods of the slow EMA.
+      signal  Number of periods of the EMA of the MACD line.
+
+    Returns:
+      A tuple of three arrays: the MACD line, the signal line, and the histogram (their
+      difference).
+  """
+  values = _array(values)
+  line = ema(values, fast) - ema(values, slow)
+  signalLine = ema(line, signal)
+  return line, signalLine, line - signalLine
@@ -0,0 +1,217 @@
+# latencyTracer.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+from time import monotonic_ns
+
+
+"""The stages of the pipeline a tick passes, in order, and the whole way through it ('total')."""
+STAGES = ('decode', 'queue', 'parse', 'strategy', 'total')
+
+# Values are sorted into buckets of 2^_SUB_BITS sub-buckets each, every bucket covering twice the
+# range of the previous one. Values below 2^_SUB_BITS are counted exactly, all others with a
+# relative error of at most 2^-(_SUB_BITS - 1), i.e., about 6%.
+_SUB_BITS = 5
+_SUB_COUNT = 1 << _SUB_BITS
+_HALF_COUNT = _SUB_COUNT >> 1
+# enough buckets for values up to 2^48 ns (more than three days)
+_BUCKETS = 48 * _HALF_COUNT + _SUB_COUNT
+
+
+def _bucketIndex(value):
+  """Determine the index of the bucket counting a value."""
+  if value < _SUB_COUNT:
+    return max(value, 0)
+
+  shift = value.bit_length() - _SUB_BITS
+  return min(shift * _HALF_COUNT + (value >> shift), _BUCKETS - 1)
+
+
+def _bucketValue(index):
+  """Determine the smallest value counted by the bucket with the given index."""
+  if index < _SUB_COUNT:
+    return index
+
+  shift = index // _HALF_COUNT - 1
+  return (index % _HALF_COUNT + _HALF_COUNT) << shift
+
+
+class Histogram:
+  def __init__(self):
+    """Create a new Histogram object.
+
+      A Histogram counts values (non-negative integers) in logarithmically growing buckets in the
+      manner of an HDR histogram. Recording a value takes constant time and the memory used does
+      not depend on the number of values recorded, while percentiles can still be reported with a
+      bounded relative error.
+    """
+    self.__counts = [0] * _BUCKETS
+    self.__total = 0
+    self.__max = 0
+
+
+  def record(self, value):
+    """Record a value.
+
+      Parameters:
+        value  The value to record (an integer).
+    """
+    # this is _bucketIndex inlined, recording happens for every tick
+    if value >= _SUB_COUNT:
+      shift = value.bit_length() - _SUB_BITS
+      index = shift * _HALF_COUNT + (value >> shift)
+      self.__counts[index if index < _BUCKETS else _BUCKETS - 1] += 1
+    else:
+      self.__counts[value if value > 0 else 0] += 1
+
+    self.__total += value
+
+    if value > self.__max:
+      self.__max = value
+
+
+  def count(self):
+    """Retrieve the number of values recorded."""
+    return sum(self.__counts)
+
+
+  def mean(self):
+    """Retrieve the mean of all values recorded or 0 if there are none."""
+    count = self.count()
+    return self.__total / count if count else 0
+
+
+  def max(self):
+    """Retrieve the largest value recorded or 0 if there is none."""
+    return self.__max
+
+
+  def percentile(self, percent):
+    """Retrieve a percentile of the values recorded.
+
+      Parameters:
+        percent  The percentage of values (0 to 100) that are less than or equal to the result.
+
+      Returns:
+        The lower bound of the bucket containing the percentile (the largest value recorded for the
+        100th percentile) or 0 if no value was recorded.
+    """
+    count = self.count()
+    rank = max(1, -(-count * percent // 100))
+    if rank >= count:
+      return self.__max
+
+    seen = 0
+
+    for index, count in enumerate(self.__counts):
+      seen += count
+      if seen >= rank:
+        return min(_bucketValue(index), self.__max)
+
+    return 0
+
+
+class LatencyTracer:
+  def __init__(self):
+    """Create a new LatencyTracer object.
+
+      A LatencyTracer collects the time ticks spend in the stages of the pipeline in a Histogram
+      per stage and instrument:
+        decode    From the receipt of the tick's line from the socket until it is put into a queue.
+        queue     Waiting in the queue until a worker took it out.
+        parse     Parsing the tick's time and prices (see parsePrice).
+        strategy  Handling the tick in Strategy.onChange.
+        total     From the receipt of the tick until the strategy is done with it.
+
+      The streamer attaches the times (see time.monotonic_ns) of receipt and enqueueing to a
+      message in the 'trace' key and the worker records all stages once the strategy returned.
+
+      Notes:
+        The histograms of an instrument are only ever modified by the thread of the worker the
+        instrument is assigned to, so no locking is required. Reports read them without
+        synchronization and may be off by a tick being recorded concurrently.
+    """
+    # dict indexed by instrument names containing dicts indexed by stages containing Histograms
+    self.__histograms = {}
+
+
+  def stamp(self, data, received):
+    """Attach the times of receipt and enqueueing to a message about to be put into a queue.
+
+      Parameters:
+        data      A message as put into a worker's queue (see Worker.run).
+        received  The time (as returned by time.monotonic_ns) the message was received.
+    """
+    data['trace'] = (received, monotonic_ns())
+
+
+  def record(self, instrument, trace, dequeued, parsed, done):
+    """Record the times a tick passed the stages of the pipeline.
+
+      Parameters:
+        instrument  The name of the instrument the tick belongs to.
+        trace       The times of receipt and enqueueing as attached by stamp().
+        dequeued    The time the worker took the tick out of its queue.
+        parsed      The time the tick was parsed.
+        done        The time the strategy returned.
+    """
+    histograms = self.__histograms.get(instrument)
+    if histograms is None:
+      histograms = {stage: Histogram() for stage in STAGES}
+      self.__histograms[instrument] = histograms
+
+    received, enqueued = trace
+    histograms['decode'].record(enqueued - received)
+    histograms['queue'].record(dequeued - enqueued)
+    histograms['parse'].record(parsed - dequeued)
+    histograms['strategy'].record(done - parsed)
+    histograms['total'].record(done - received)
+
+
+  def histograms(self):
+    """Retrieve all histograms.
+
+      Returns:
+        A dict object indexed by instrument names containing dict objects indexed by the stages
+        (see STAGES) containing Histogram objects with values in nanoseconds.
+    """
+    return {instrument: dict(histograms) for instrument, histograms in
+            list(self.__histograms.items())}
+
+
+  def report(self):
+    """Create a textual report of the latencies of all instruments and stages.
+
+      Returns:
+        A string containing a table with one line per instrument and stage listing the number of
+        ticks and the median, 90th, 99th, and 99.9th percentile as well as the maximum latency in
+        microseconds.
+    """
+    lines = ["%-12s %-8s %10s %10s %10s %10s %10s %10s"
+             % ('instrument', 'stage', 'count', 'p50', 'p90', 'p99', 'p99.9', 'max')]
+
+    for instrument, histograms in sorted(self.histograms().items()):
+      for stage in STAGES:
+        histogram = histograms[stage]
+        lines.append("%-12s %-8s %10d %10.1f %10.1f %10.1f %10.1f %10.1f"
+                     % (instrument, stage, histogram.count(),
+                        histogram.percentile(50) / 1000, histogram.percentile(90) / 1000,
+                        histogram.percentile(99) / 1000, histogram.percentile(99.9) / 1000,
+                        histogram.max() / 1000))
+
+    return "\n".join(lines)
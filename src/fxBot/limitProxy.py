@@ -17,15 +17,21 @@
 # *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
 # ***************************************************************************/
 
-from time      import sleep, time
-from threading import Lock
-from logging   import debug
+from time        import sleep, monotonic
+from threading   import Lock, local
+from logging     import debug
+from collections import deque
+from metrics     import Histogram
 
 
 # According to OANDA documents we are allowed to have 4 conncetions to the server per second (with
 # peaks of 5). We assume that the rate and events streams do not count here.
 # TODO: need to verify this assumption
-_REQUEST_COUNT = 4
+_REQUEST_RATE = 4
+_REQUEST_BURST = 5
+
+# upper bounds (in seconds) of the buckets of the histogram of the time requests were postponed
+_WAIT_BUCKETS = [0.0, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
 
 
 class LimitProxy:
@@ -37,36 +43,128 @@ class LimitProxy:
       Parameters:
         server  A Server object.
 
+      Notes:
+        The limit is enforced by a token bucket: a request consumes a token, tokens are refilled at
+        the allowed rate and up to the allowed peak. A request finding the bucket empty reserves the
+        next token nonetheless (driving the bucket into debt) and waits until it becomes available.
+        Reserving happens under the object lock, waiting outside of it, so threads waiting for
+        different tokens do not serialize each other.
+
+        A full bucket plus the tokens refilled within the following second would allow for more
+        than the peak within one second. Hence we also remember the times the last requests were
+        scheduled for and postpone a request until the one the peak number of requests earlier is
+        at least a second ago.
+
       TODO: This class has the problem that it is not safe against extensions of the Server class:
             everytime a new method is added it has to be declared here too. We need to find a better
             way to work around that.
     """
     super().__init__(server)
 
-    # lock to protect the last request related data
+    # lock to protect the token bucket
     self.__lock = Lock()
-    # a list of datetimes when the last requests occurred
-    self.__last_requests = [0.0] * _REQUEST_COUNT
-    # index to the datetime of the request that was performed last
-    self.__last_request = 0
+    # number of tokens available, negative if tokens are reserved for waiting requests
+    self.__tokens = float(_REQUEST_BURST)
+    # the (monotonic) time the number of tokens was last updated
+    self.__updated = monotonic()
+    # the (monotonic) times the last _REQUEST_BURST requests were scheduled for, the oldest first
+    self.__starts = deque(maxlen=_REQUEST_BURST)
+    # tokens acquired explicitly by a thread but not yet used for a request
+    self.__credit = local()
+    self.__waitTimes = Histogram('fxbot_limit_wait_seconds',
+                                 "Time requests were postponed to obey the request rate limit.",
+                                 _WAIT_BUCKETS)
+
+
+  def __reserve(self, timeout):
+    """Reserve a token.
+
+      Parameters:
+        timeout  Maximum time (in seconds) to wait for the token or None to wait as long as
+                 necessary.
+
+      Returns:
+        The time to wait (in seconds) until the token may be used or None if it would take longer
+        than 'timeout' (in which case no token is reserved).
+
+      Notes:
+        The object lock must be held during this call.
+    """
+    now = monotonic()
+    tokens = min(float(_REQUEST_BURST), self.__tokens + (now - self.__updated) * _REQUEST_RATE)
+    wait = max(0.0, (1.0 - tokens) / _REQUEST_RATE)
+
+    # no second may see more than _REQUEST_BURST requests
+    if len(self.__starts) == _REQUEST_BURST:
+      wait = max(wait, self.__starts[0] + 1.0 - now)
+
+    self.__updated = now
+
+    if timeout is not None and wait > timeout:
+      self.__tokens = tokens
+      return None
+
+    self.__tokens = tokens - 1.0
+    self.__starts.append(now + wait)
+    return wait
+
+
+  def acquire(self, timeout=None):
+    """Acquire the permission to send a request to the server.
+
+      Parameters:
+        timeout  (optional) Maximum time (in seconds) to wait for the permission. By default there
+                 is no limit.
+
+      Returns:
+        True if the permission was acquired, False if it could not be acquired in time. In the
+        latter case the method returns immediately.
+
+      Notes:
+        A permission acquired is used by the next request issued through this object by the same
+        thread, i.e., that request will not be postponed any further.
+    """
+    with self.__lock:
+      wait = self.__reserve(timeout)
+
+    if wait is None:
+      return False
+
+    self.__waitTimes.observe(wait)
+
+    if wait > 0.0:
+      debug("limitProxy: too many requests, postponing for %.3fs" % wait)
+      sleep(wait)
+
+    self.__credit.count = getattr(self.__credit, 'count', 0) + 1
+    return True
+
+
+  def waitTimes(self):
+    """Retrieve the histogram of the times requests were postponed.
+
+      Returns:
+        A metrics.Histogram object with values in seconds.
+    """
+    return self.__waitTimes
+
+
+  def tryAcquire(self):
+    """Acquire the permission to send a request to the server if it is available immediately.
+
+      Returns:
+        True if the permission was acquired, False otherwise.
+    """
+    return self.acquire(0.0)
 
 
   def limit(function):
     def postpone(self, *args, **kwargs):
-      with self.__lock:
-        self.__last_request = (self.__last_request + 1) % len(self.__last_requests)
-        last = self.__last_requests[self.__last_request]
-        # time.clock() would likely be the preferred function (presumably less overhead) but it won't
-        # work as intended in conjunction with a blocking call such as sleep
-        delta = time() - last
-
-        # we want to wait until the most distant request happened at least one second ago
-        while delta < 1.0:
-          debug("limitProxy: too many request, postponing")
-          sleep(1.0 - delta)
-          delta = time() - last
-
-        self.__last_requests[self.__last_request] = time()
+      # use a permission acquired beforehand or wait for a new one
+      if getattr(self.__credit, 'count', 0) == 0:
+        self.acquire()
+
+      self.__credit.count -= 1
 
       # default to None, if this case hits we get an exception which is as intended
       super_function = getattr(super(), function.__name__, None)
@@ -0,0 +1,370 @@
+# metrics.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+"""A registry of metrics exposed over HTTP in Prometheus' text exposition format."""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading   import Thread, Lock
+from logging     import warning
+from math        import inf
+
+
+"""The content type of the text exposition format."""
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _formatValue(value):
+  """Format a sample value."""
+  if value == inf:
+    return '+Inf'
+  if value == -inf:
+    return '-Inf'
+  if isinstance(value, float) and value != value:
+    return 'NaN'
+  if isinstance(value, int) or value == int(value):
+    return str(int(value))
+
+  return repr(float(value))
+
+
+def _formatLabels(names, values):
+  """Format the labels of a sample."""
+  if not names:
+    return ''
+
+  escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in values)
+  return '{%s}' % ','.join('%s="%s"' % pair for pair in zip(names, escaped))
+
+
+def _labelValues(labels, values):
+  """Normalize the label values passed to a metric into a tuple."""
+  if not isinstance(values, tuple):
+    values = (values,)
+
+  if len(values) != len(labels):
+    raise ValueError("Expected values for labels %s, got %s" % (labels, values))
+
+  return values
+
+
+class _Metric:
+  def __init__(self, name, help, kind, labels=(), collect=None):
+    """Create a new _Metric object.
+
+      Parameters:
+        name     The name of the metric.
+        help     A description of the metric.
+        kind     The type of the metric ('counter', 'gauge', or 'histogram').
+        labels   (optional) A tuple of the names of the metric's labels.
+        collect  (optional) A function retrieving the values of the metric when it is exposed (see
+                 Counter and Gauge).
+    """
+    self.name = name
+    self.help = help
+    self.kind = kind
+    self.labels = tuple(labels)
+    self._collect = collect
+    self._lock = Lock()
+    # dict indexed by tuples of label values containing the values
+    self._values = {}
+
+
+  def values(self):
+    """Retrieve the current values of the metric.
+
+      Returns:
+        A dict object indexed by tuples of label values (empty for a metric without labels)
+        containing the values.
+    """
+    if self._collect is None:
+      with self._lock:
+        return dict(self._values)
+
+    values = self._collect()
+    if not isinstance(values, dict):
+      return {(): values}
+
+    return {_labelValues(self.labels, key): value for key, value in values.items()}
+
+
+  def samples(self):
+    """Retrieve the samples of the metric.
+
+      Returns:
+        A list of (name, label names, label values, value) tuples.
+    """
+    return [(self.name, self.labels, key, value) for key, value in sorted(self.values().items())]
+
+
+class Counter(_Metric):
+  def __init__(self, name, help, labels=(), collect=None):
+    """Create a new Counter object, a metric whose values only ever increase.
+
+      Parameters:
+        name     The name of the counter, ending in '_total' by convention.
+        help     A description of the counter.
+        labels   (optional) A tuple of the names of the counter's labels.
+        collect  (optional) A function retrieving the values of the counter when it is exposed:
+                 either a number or a dict indexed by label values (tuples or, if there is just a
+                 single label, strings) containing numbers. A counter with a collect function is
+                 not incremented by means of inc().
+
+      Notes:
+        Collecting values is preferable for anything updated on a hot path: the component keeps
+        plain counts as it does anyway and nothing is paid for the metric unless it is exposed.
+    """
+    super().__init__(name, help, 'counter', labels, collect)
+
+
+  def inc(self, amount=1, labels=()):
+    """Increment the counter.
+
+      Parameters:
+        amount  (optional) The non-negative amount to increment the counter by.
+        labels  (optional) The values of the labels (a tuple or, for a single label, a string).
+    """
+    if amount < 0:
+      raise ValueError("Counters cannot decrease: %s" % amount)
+
+    key = _labelValues(self.labels, labels)
+    with self._lock:
+      self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+  def __init__(self, name, help, labels=(), collect=None):
+    """Create a new Gauge object, a metric whose values may go up and down.
+
+      Parameters:
+        name     The name of the gauge.
+        help     A description of the gauge.
+        labels   (optional) A tuple of the names of the gauge's labels.
+        collect  (optional) A function retrieving the values of the gauge when it is exposed (see
+                 Counter).
+    """
+    super().__init__(name, help, 'gauge', labels, collect)
+
+
+  def set(self, value, labels=()):
+    """Set the gauge.
+
+      Parameters:
+        value   The new value.
+        labels  (optional) The values of the labels (a tuple or, for a single label, a string).
+    """
+    key = _labelValues(self.labels, labels)
+    with self._lock:
+      self._values[key] = value
+
+
+class Histogram(_Metric):
+  def __init__(self, name, help, buckets, labels=()):
+    """Create a new Histogram object counting observations in buckets.
+
+      Parameters:
+        name     The name of the histogram.
+        help     A description of the histogram.
+        buckets  A sorted list of the upper bounds of the buckets. A bucket for all observations
+                 (+Inf) is always added.
+        labels   (optional) A tuple of the names of the histogram's labels.
+    """
+    super().__init__(name, help, 'histogram', labels)
+    self.__bounds = [b for b in buckets if b != inf] + [inf]
+
+
+  def observe(self, value, labels=()):
+    """Record an observation.
+
+      Parameters:
+        value   The value observed.
+        labels  (optional) The values of the labels (a tuple or, for a single label, a string).
+    """
+    key = _labelValues(self.labels, labels)
+
+    with self._lock:
+      values = self._values.get(key)
+      if values is None:
+        # the count of each bucket (not cumulative) followed by the sum of all observations
+        values = [0] * len(self.__bounds) + [0]
+        self._values[key] = values
+
+      for index, bound in enumerate(self.__bounds):
+        if value <= bound:
+          values[index] += 1
+          break
+
+      values[-1] += value
+
+
+  def values(self):
+    """Retrieve the current values of the histogram.
+
+      Returns:
+        A dict object indexed by tuples of label values containing dict objects containing the
+        cumulative counts of the buckets ('buckets', a list of (upper bound, count) tuples), the
+        number of observations ('count'), and their sum ('sum').
+    """
+    with self._lock:
+      values = {key: list(counts) for key, counts in self._values.items()}
+
+    result = {}
+    for key, counts in values.items():
+      buckets = []
+      total = 0
+
+      for bound, count in zip(self.__bounds, counts):
+        total += count
+        buckets.append((bound, total))
+
+      result[key] = {'buckets': buckets, 'count': total, 'sum': counts[-1]}
+
+    return result
+
+
+  def samples(self):
+    """Retrieve the samples of the histogram (see _Metric.samples)."""
+    samples = []
+    names = self.labels + ('le',)
+
+    for key, value in sorted(self.values().items()):
+      for bound, count in value['buckets']:
+        samples.append((self.name + '_bucket', names, key + (_formatValue(bound),), count))
+
+      samples.append((self.name + '_sum', self.labels, key, value['sum']))
+      samples.append((self.name + '_count', self.labels, key, value['count']))
+
+    return samples
+
+
+class _Handler(BaseHTTPRequestHandler):
+  def log_message(self, *args):
+    """Suppress the logging of requests."""
+    pass
+
+
+  def do_GET(self):
+    if self.path.split('?')[0] not in ('/', '/metrics'):
+      self.send_error(404)
+      return
+
+    body = self.server.registry.exposition().encode('utf-8')
+    self.send_response(200)
+    self.send_header('Content-Type', CONTENT_TYPE)
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+
+class Registry:
+  def __init__(self):
+    """Create a new Registry object.
+
+      A Registry holds a set of metrics and exposes them, either as text (see exposition()) or over
+      HTTP (see start()).
+    """
+    self.__lock = Lock()
+    self.__metrics = {}
+    self.__server = None
+    self.__thread = None
+
+
+  def register(self, metric):
+    """Register a metric.
+
+      Parameters:
+        metric  A Counter, Gauge, or Histogram object.
+
+      Returns:
+        The metric registered.
+    """
+    with self.__lock:
+      if metric.name in self.__metrics:
+        raise ValueError("Metric already registered: %s" % metric.name)
+
+      self.__metrics[metric.name] = metric
+
+    return metric
+
+
+  def metrics(self):
+    """Retrieve all metrics registered, sorted by name."""
+    with self.__lock:
+      return [self.__metrics[name] for name in sorted(self.__metrics)]
+
+
+  def exposition(self):
+    """Create the text exposition of all metrics.
+
+      Returns:
+        A string in Prometheus' text exposition format.
+
+      Notes:
+        A metric whose values cannot be collected is left out (with a warning) instead of failing
+        the whole exposition.
+    """
+    lines = []
+
+    for metric in self.metrics():
+      try:
+        samples = metric.samples()
+      except Exception as exception:
+        warning("Collecting metric %s failed: %s" % (metric.name, exception))
+        continue
+
+      lines.append("# HELP %s %s" % (metric.name, metric.help.replace('\n', ' ')))
+      lines.append("# TYPE %s %s" % (metric.name, metric.kind))
+
+      for name, labels, values, value in samples:
+        lines.append("%s%s %s" % (name, _formatLabels(labels, values), _formatValue(value)))
+
+    return "\n".join(lines) + "\n"
+
+
+  def start(self, host='127.0.0.1', port=0):
+    """Start serving the metrics over HTTP.
+
+      Parameters:
+        host  (optional) The address to listen on.
+        port  (optional) The port to listen on, 0 for any free one.
+
+      Returns:
+        The URL the metrics are served at.
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.registry = self
+
+    # a scrape never needs to be waited for, so the thread must not keep the program alive
+    self.__thread = Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    self.__thread.start()
+    self.__server = server
+
+    return 'http://%s:%d/metrics' % server.server_address[:2]
+
+
+  def stop(self):
+    """Stop serving the metrics."""
+    if self.__server is None:
+      return
+
+    self.__server.shutdown()
+    self.__server.server_close()
+    self.__thread.join()
+    self.__server = None
+    self.__thread = None
@@ -17,26 +17,357 @@
 # *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
 # ***************************************************************************/
 
-from decimal import Decimal, ROUND_HALF_EVEN
+from decimal import Decimal
+
+
+# Decimal rounds the result of every arithmetic operation to the precision of its context, 28
+# significant digits by default, ties to the even neighbor. We round results in the very same way,
+# so strings of prices (and of results of chains of operations) are identical to the ones of the
+# Decimal based representation we used before.
+_PRECISION = 28
+_LIMIT = 10 ** _PRECISION
+
+# Number of decimal digits we keep beyond 1/10th of a pip. A value of at most _PRECISION significant
+# digits whose magnitude is at least 1/10th of a pip has no digits beyond those, so results of
+# arithmetic are represented exactly. Values with more digits than that (tiny results, the exact
+# values of floats) are rounded to odd (see _roundOdd) at this precision instead. Such a value thus
+# never looks like a tie to the final rounding in __str__, which keeps its string identical to the
+# one Decimal.quantize yields for it.
+_GUARD_DIGITS = _PRECISION - 1
+_GUARD = 10 ** _GUARD_DIGITS
+_HALF = _GUARD // 2
+
+# Price objects resulting from arithmetic are allocated directly, bypassing __init__.
+_new = object.__new__
+
+
+class _Powers(dict):
+  """Dict of the powers of ten indexed by their exponents, computed on demand."""
+  def __missing__(self, exponent):
+    power = self[exponent] = 10 ** exponent
+    return power
+
+
+_POW10 = _Powers((exponent, 10 ** exponent) for exponent in range(128))
+
+
+def _roundOdd(numerator, denominator):
+  """Divide two integers and round the result to odd, i.e., to the neighbor with an odd last digit.
+
+    Parameters:
+      numerator    The dividend (int).
+      denominator  The divisor (int, may be negative).
+
+    Returns:
+      The quotient (int) if the division is exact, the odd one of the two integers next to it
+      otherwise.
+
+    Notes:
+      Rounding to odd first and to the final precision later yields the same result as rounding to
+      the final precision right away, given at least one more digit is kept in between. A tie at the
+      final precision is even at the intermediate one, so an inexact value can never be mistaken for
+      a tie.
+  """
+  if denominator < 0:
+    numerator, denominator = -numerator, -denominator
+
+  quotient, remainder = divmod(numerator, denominator)
+  # for negative quotients, too, this selects the odd one of the floor and the ceiling
+  return quotient | 1 if remainder else quotient
+
+
+def _scaled(coefficient, shift):
+  """Convert coefficient * 10^shift into an integer, rounding to odd."""
+  if shift >= 0:
+    return coefficient * _POW10[shift]
+
+  return _roundOdd(coefficient, _POW10[-shift])
+
+
+def _fit(value, shift):
+  """Round an exact result like Decimal and convert it into units.
+
+    Parameters:
+      value  The result (int), in multiples of 10^shift units.
+      shift  The exponent (int) of the multiples.
+
+    Returns:
+      The count of units (int) of the result rounded to _PRECISION significant digits, ties to the
+      even neighbor.
+  """
+  if value >= _LIMIT or value <= -_LIMIT:
+    magnitude = -value if value < 0 else value
+    # the bit length yields the count of digits or one less
+    digits = ((magnitude.bit_length() + 1) * 1233 >> 12) - _PRECISION
+    if magnitude >= _POW10[digits + _PRECISION]:
+      digits += 1
+
+    power = _POW10[digits]
+    value, remainder = divmod(value, power)
+    twice = 2 * remainder
+    if twice > power or (twice == power and value & 1):
+      value += 1
+    shift += digits
+
+  if shift >= 0:
+    return value * _POW10[shift]
+
+  # see _roundOdd
+  value, remainder = divmod(value, _POW10[-shift])
+  return value | 1 if remainder else value
+
+
+def _quotient(numerator, denominator):
+  """Divide two integers like Decimal and convert the result into units.
+
+    Parameters:
+      numerator    The dividend (int), in units.
+      denominator  The divisor (int).
+
+    Returns:
+      The count of units (int) of the quotient rounded to _PRECISION significant digits, ties to the
+      even neighbor.
+  """
+  negative = (numerator < 0) != (denominator < 0)
+  numerator = -numerator if numerator < 0 else numerator
+  denominator = -denominator if denominator < 0 else denominator
+
+  # Estimate the number of digits of the quotient beyond _PRECISION ones from the bit lengths, so a
+  # single division usually suffices. The estimate is off by one at most.
+  digits = ((numerator.bit_length() - denominator.bit_length()) * 1233 >> 12) - _GUARD_DIGITS
+  digits = digits if digits > 0 else 0
+
+  while True:
+    divisor = denominator * _POW10[digits]
+    quotient, remainder = divmod(numerator, divisor)
+
+    if quotient >= _LIMIT:
+      digits += 1
+    elif digits and quotient < _GUARD:
+      digits -= 1
+    else:
+      break
+
+  if quotient >= _GUARD:
+    # there are at least _PRECISION digits in front of the units' one, the result is exact
+    twice = 2 * remainder
+    if twice > divisor or (twice == divisor and quotient & 1):
+      quotient += 1
+    quotient *= _POW10[digits]
+  elif remainder:
+    quotient |= 1
+
+  return -quotient if negative else quotient
+
+
+# Strategies tend to combine prices with a small set of Decimal constants (smoothing factors and
+# the like) over and over again. We remember the coefficients and exponents of those.
+_DECIMAL_CACHE_SIZE = 256
+_decimals = {}
+
+
+def _split(value):
+  """Express a Decimal object as an integer coefficient and an exponent of ten.
+
+    Parameters:
+      value  A finite Decimal object.
+
+    Returns:
+      A tuple (coefficient, exponent) of ints with value == coefficient * 10^exponent.
+  """
+  numerator, denominator = value.as_integer_ratio()
+  exponent = value.as_tuple().exponent
+
+  if exponent >= 0:
+    return numerator, 0
+
+  return numerator * (_POW10[-exponent] // denominator), exponent
+
+
+def _parse(string):
+  """Express a string of a plain decimal number (as sent by the server) as coefficient and exponent.
+
+    Returns:
+      A tuple (coefficient, exponent) of ints or None if the string is not of the expected form.
+  """
+  whole, _, fraction = string.partition('.')
+
+  # int() accepts underscores and whitespace in places Decimal does not
+  if '_' not in string and fraction.isdigit():
+    try:
+      return int(whole + fraction), -len(fraction)
+    except ValueError:
+      pass
+
+  return None
+
+
+def _decimal(value):
+  """Express a value as an integer coefficient and an exponent of ten.
+
+    Parameters:
+      value  A Price, Decimal, int, or string.
+
+    Returns:
+      A tuple (coefficient, exponent) of ints with value == coefficient * 10^exponent.
+  """
+  if type(value) is Decimal:
+    result = _decimals.get(value)
+
+    if result is None:
+      if len(_decimals) >= _DECIMAL_CACHE_SIZE:
+        _decimals.clear()
+      result = _decimals[value] = _split(value)
+
+    return result
+  if type(value) is Price:
+    return value._decimal()
+  if type(value) is int:
+    return value, 0
+  if type(value) is str:
+    result = _parse(value)
+    if result is not None:
+      return result
+
+  return _split(Decimal(value))
+
+
+# Number of strings a PriceScale object remembers the units of.
+_PARSED_CACHE_SIZE = 4096
+
+
+class PriceScale:
+  # A PriceScale object is shared by all Price objects of an instrument, so there is no need for
+  # any per object dictionary.
+  __slots__ = ('quantum', 'exponent', 'parsed')
+
+  def __init__(self, pip):
+    """Create a new PriceScale object describing the representation of prices with a given pip.
+
+      Parameters:
+        pip  Quantity of a pip (Decimal).
+
+      Notes:
+        Clients should use priceScale() to retrieve a shared object instead.
+    """
+    # Decimal.quantize only regards the exponent of its argument. That of 1/10th of a pip is the
+    # exponent of the pip reduced by one.
+    self.quantum = Decimal(pip).as_tuple().exponent - 1
+    # a Price object with scale s and 'units' represents units * 10^s.exponent
+    self.exponent = self.quantum - _GUARD_DIGITS
+    # units of recently parsed strings, quotes of an instrument repeat a lot
+    self.parsed = {}
+
+
+  def units(self, value):
+    """Convert a string into units of the scale.
+
+      Parameters:
+        value  A price (string).
+
+      Returns:
+        The count of units (int).
+    """
+    parsed = self.parsed
+    units = parsed.get(value)
+
+    if units is None:
+      coefficient, exponent = _parse(value) or _split(Decimal(value))
+      units = _scaled(coefficient, exponent - self.exponent)
+
+      if len(parsed) >= _PARSED_CACHE_SIZE:
+        parsed.clear()
+      parsed[value] = units
+
+    return units
+
+
+_scales = {}
+
+
+def priceScale(pip):
+  """Retrieve the PriceScale object for a given pip.
+
+    Parameters:
+      pip  Quantity of a pip (Decimal).
+
+    Returns:
+      A PriceScale object. The same object is returned for equal pips.
+  """
+  key = str(pip)
+  scale = _scales.get(key)
+
+  if scale is None:
+    scale = _scales.setdefault(key, PriceScale(pip))
+
+  return scale
 
 
 class Price:
+  __slots__ = ('__units', '__scale')
+
   def __init__(self, value, pip):
     """Create a new price object given a value and the quantity of a pip.
 
       Parameters:
-        value  A price (Decimal).
-        pip    Quantity of a pip (Decimal).
+        value  A price (Decimal, float, int, or string).
+        pip    Quantity of a pip (Decimal) or a PriceScale object.
+
+      Notes:
+        Internally a price is a fixed-point number: an integer count of units, 10^-27 of a 1/10th
+        pip each, and a scale shared by all prices of an instrument. Arithmetic is performed on
+        integers only, conversions from and to Decimal happen on construction and on conversion
+        into a string. Results are rounded like Decimal's default context does, to 28 significant
+        digits, so strings of prices are the ones their Decimal counterparts yield. Zero is
+        unsigned though, and values below 1/10th of a pip are accurate to 27 digits beyond it.
+    """
+    scale = pip if type(pip) is PriceScale else priceScale(pip)
+    self.__scale = scale
+
+    if type(value) is str:
+      # the common case, quotes are strings
+      self.__units = scale.parsed.get(value) or scale.units(value)
+    elif type(value) is float:
+      # the exact value of a float is a binary fraction
+      numerator, denominator = value.as_integer_ratio()
+      self.__units = _roundOdd(numerator * _POW10[-scale.exponent], denominator)
+    else:
+      coefficient, exponent = _split(Decimal(value))
+      self.__units = _scaled(coefficient, exponent - scale.exponent)
+
+
+  def _decimal(self):
+    """Express the value of the Price object as an integer coefficient and an exponent of ten.
+
+      Returns:
+        A tuple (coefficient, exponent) of ints.
     """
-    self.__value = Decimal(value)
-    self.__pip = Decimal(pip)
+    return self.__units, self.__scale.exponent
 
 
   def __str__(self):
     """Get a string representation of the Price object."""
     # ROUND_HALF_EVEN is often referred to as Banker's Rounding and used in many financial
     # applications. Note that we always care for 1/10th of a pip.
-    return str(self.__value.quantize(self.__pip * Decimal('0.1'), rounding=ROUND_HALF_EVEN))
+    units = self.__units
+    value, remainder = divmod(units, _GUARD)
+
+    if remainder > _HALF or (remainder == _HALF and value & 1):
+      value += 1
+
+    exponent = self.__scale.quantum
+    digits = str(-value if value < 0 else value)
+    sign = '-' if units < 0 else ''
+    left = len(digits) + exponent
+
+    # These are the cases in which Decimal uses neither scientific nor engineering notation, they
+    # cover all prices we ever deal with. For the others we defer to Decimal's formatting.
+    if exponent < 0 and left > -6:
+      if left > 0:
+        return sign + digits[:left] + '.' + digits[left:]
+      return sign + '0.' + '0' * -left + digits
+
+    return str(Decimal((1 if units < 0 else 0, tuple(map(int, digits)), exponent)))
 
 
   def __repr__(self):
@@ -50,7 +381,29 @@ class Price:
       Returns:
         New Price object created by negating this Price object.
     """
-    return Price(-self.__value, self.__pip)
+    price = _new(Price)
+    price.__units = -self.__units
+    price.__scale = self.__scale
+    return price
+
+
+  def __plus(self, coefficient, exponent):
+    """Add coefficient * 10^exponent to the Price object.
+
+      Returns:
+        New Price object holding the sum.
+    """
+    shift = exponent - self.__scale.exponent
+
+    if shift >= 0:
+      units = _fit(self.__units + coefficient * _POW10[shift], 0)
+    else:
+      units = _fit(self.__units * _POW10[-shift] + coefficient, shift)
+
+    price = _new(Price)
+    price.__units = units
+    price.__scale = self.__scale
+    return price
 
 
   def __add__(self, value):
@@ -66,7 +419,8 @@ class Price:
       raise TypeError('unsupported operand type(s) for +: \'' +
                       type(self).__name__ + '\' and \'' +
                       type(value).__name__ + '\'')
-    return Price(self.__value + value, self.__pip)
+    coefficient, exponent = _decimals.get(value) or _decimal(value)
+    return self.__plus(coefficient, exponent)
 
 
   def __radd__(self, value):
@@ -94,7 +448,8 @@ class Price:
       raise TypeError('unsupported operand type(s) for -: \'' +
                       type(self).__name__ + '\' and \'' +
                       type(value).__name__ + '\'')
-    return Price(self.__value - value, self.__pip)
+    coefficient, exponent = _decimals.get(value) or _decimal(value)
+    return self.__plus(-coefficient, exponent)
 
 
   def __rsub__(self, value):
@@ -122,7 +477,13 @@ class Price:
       raise TypeError('unsupported operand type(s) for *: \'' +
                       type(self).__name__ + '\' and \'' +
                       type(value).__name__ + '\'')
-    return Price(self.__value * value, self.__pip)
+    coefficient, exponent = _decimals.get(value) or _decimal(value)
+    units = _fit(self.__units * coefficient, exponent)
+
+    price = _new(Price)
+    price.__units = units
+    price.__scale = self.__scale
+    return price
 
 
   def __rmul__(self, value):
@@ -150,7 +511,17 @@ class Price:
       raise TypeError('unsupported operand type(s) for /: \'' +
                       type(self).__name__ + '\' and \'' +
                       type(value).__name__ + '\'')
-    return Price(self.__value / value, self.__pip)
+    coefficient, exponent = _decimal(value)
+
+    if exponent > 0:
+      units = _quotient(self.__units, coefficient * _POW10[exponent])
+    else:
+      units = _quotient(self.__units * _POW10[-exponent], coefficient)
+
+    price = _new(Price)
+    price.__units = units
+    price.__scale = self.__scale
+    return price
 
 
   def __rdiv__(self, value):
@@ -162,7 +533,19 @@ class Price:
       Returns:
         New Price object created by dividing the given value by the Price object.
     """
-    return Price(value / self.__value, self.__pip)
+    coefficient, exponent = _decimal(value)
+    # the quotient in units is coefficient * 10^(exponent - 2 * scale.exponent) / units
+    shift = exponent - 2 * self.__scale.exponent
+
+    if shift >= 0:
+      units = _quotient(coefficient * _POW10[shift], self.__units)
+    else:
+      units = _quotient(coefficient, self.__units * _POW10[-shift])
+
+    price = _new(Price)
+    price.__units = units
+    price.__scale = self.__scale
+    return price
 
 
   def __truediv__(self, value):
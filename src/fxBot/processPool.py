@@ -0,0 +1,359 @@
+# processPool.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+from currency        import Currency
+from price           import Price
+from worker          import Worker
+from workerPool      import _shard
+from datetimeRfc3339 import parseDateMicros
+from multiprocessing import Pipe, Process
+from threading       import Lock, Thread
+from queue           import Full
+from select          import select
+from datetime        import datetime, timedelta
+from signal          import signal, SIG_DFL, SIG_IGN, SIGINT, SIGTERM, SIGHUP
+from traceback       import print_exc
+from os              import kill, getppid
+from struct          import Struct
+from time            import monotonic
+
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+# The binary encoding of a tick sent to a child process: the index of the currency in the child's
+# list of currencies, the time in microseconds since the epoch, and the ask and bid prices.
+_TICK = Struct('<Hqdd')
+
+
+def encodeTick(index, tick):
+  '''Encode a tick for sending it to a child process.
+
+    Parameters:
+      index  The index of the tick's currency in the child's list of currencies.
+      tick   A tick as received from the rate stream or the watchdog (see Worker.handleTick).
+
+    Returns:
+      A bytes object of fixed size.
+  '''
+  if 'parsed' in tick:
+    micros = (tick['time'] - _EPOCH) // _MICROSECOND
+    # Price objects are converted via their string representation which carries all relevant
+    # digits
+    return _TICK.pack(index, micros, float(str(tick['ask'])), float(str(tick['bid'])))
+
+  return _TICK.pack(index, parseDateMicros(tick['time']), float(tick['ask']), float(tick['bid']))
+
+
+def decodeTick(data):
+  '''Decode a tick encoded by encodeTick.
+
+    Parameters:
+      data  A bytes object as returned by encodeTick.
+
+    Returns:
+      A tuple (index, time, ask, bid) with the time being a datetime and ask and bid being floats.
+  '''
+  index, micros, ask, bid = _TICK.unpack(data)
+  return index, _EPOCH + _MICROSECOND * micros, ask, bid
+
+
+class _RemoteServer:
+  def __init__(self, connection):
+    '''Create a new _RemoteServer object forwarding all method calls to the parent process.
+
+      Parameters:
+        connection  The child's end of a connection to the parent's _serve thread.
+    '''
+    self.__connection = connection
+
+
+  def __getattr__(self, name):
+    '''Retrieve a function invoking the server method with the given name in the parent process.'''
+    def call(*args, **kwargs):
+      self.__connection.send((name, args, kwargs))
+      success, value = self.__connection.recv()
+
+      if not success:
+        raise value
+
+      return value
+
+    return call
+
+
+def _run(names, strategies, ticks, requests):
+  '''Handle ticks in a child process.
+
+    Parameters:
+      names       List of the names of the currencies handled by the child.
+      strategies  List of the strategies associated with the currencies.
+      ticks       The child's end of the pipe over which the ticks are received.
+      requests    The child's end of the pipe over which server requests are made.
+  '''
+  # The parent coordinates the termination (and reloading) of the program. The signal handlers
+  # inherited from it must not run here.
+  signal(SIGINT, SIG_IGN)
+  signal(SIGHUP, SIG_IGN)
+  signal(SIGTERM, SIG_DFL)
+
+  server = _RemoteServer(requests)
+  currencies = [Currency(server, name) for name in names]
+
+  try:
+    while True:
+      data = ticks.recv_bytes()
+
+      # an empty message signals termination
+      if not data:
+        break
+
+      index, time, ask, bid = decodeTick(data)
+      currency = currencies[index]
+      scale = currency.scale()
+      strategies[index].onChange(currency, time, Price(ask, scale), Price(bid, scale))
+  except BaseException:
+    # just like tryRun does for threads, terminate the whole program gracefully
+    print_exc()
+    kill(getppid(), SIGTERM)
+  finally:
+    ticks.close()
+    requests.close()
+
+
+class _Shard:
+  def __init__(self, server, pairs):
+    '''Create a new _Shard object representing a child process and its connections.
+
+      Parameters:
+        server  The server object to handle the child's requests with.
+        pairs   Dictionary indexed by currency names containing dictionaries containing currency
+                objects and associated strategies.
+    '''
+    names = sorted(pairs.keys())
+    ticksReceive, ticksSend = Pipe(duplex=False)
+    requestsParent, requestsChild = Pipe()
+
+    self.indices = {name: index for index, name in enumerate(names)}
+    self.lock = Lock()
+    self.ticks = ticksSend
+    self.requests = requestsParent
+    self.process = Process(target=_run,
+                           args=(names, [pairs[n]['strategy'] for n in names],
+                                 ticksReceive, requestsChild),
+                           daemon=True)
+    self.thread = Thread(target=self.__serve, args=(server,), daemon=True)
+    # the child's ends of the pipes, closed in the parent once the child is started
+    self.childEnds = [ticksReceive, requestsChild]
+
+
+  def send(self, data, block=True, timeout=None):
+    '''Send a message to the child process.
+
+      Parameters:
+        data     A bytes object as returned by encodeTick or the empty one signaling termination.
+        block    (optional) Whether to wait for the child to make room in the pipe if it is full.
+        timeout  (optional) Maximum time (in seconds) to wait if 'block' is True. By default there
+                 is no limit.
+
+      Raises:
+        queue.Full if the message could not be sent in time.
+    '''
+    if not block:
+      timeout = 0.0
+
+    deadline = monotonic() + timeout if timeout is not None else None
+
+    # The rate streamer and the watchdog send concurrently. A thread waiting for the child to read
+    # holds the lock, so acquiring it must obey the timeout as well.
+    if timeout is None:
+      acquired = self.lock.acquire()
+    elif timeout > 0.0:
+      acquired = self.lock.acquire(True, timeout)
+    else:
+      acquired = self.lock.acquire(False)
+
+    if not acquired:
+      raise Full
+
+    try:
+      # A message is smaller than PIPE_BUF, so a pipe reported writable takes all of it at once.
+      if deadline is not None:
+        if not select((), (self.ticks,), (), max(0.0, deadline - monotonic()))[1]:
+          raise Full
+
+      self.ticks.send_bytes(data)
+    finally:
+      self.lock.release()
+
+
+  def __serve(self, server):
+    '''Handle the server requests of the child process until it terminates.'''
+    while True:
+      try:
+        name, args, kwargs = self.requests.recv()
+      except (EOFError, OSError):
+        break
+
+      try:
+        result = (True, getattr(server, name)(*args, **kwargs))
+      except Exception as exception:
+        result = (False, exception)
+
+      try:
+        self.requests.send(result)
+      except (EOFError, OSError):
+        break
+      except Exception as exception:
+        # The result (or the exception raised) cannot be pickled. The child waits for an answer, so
+        # it gets one it can raise.
+        self.requests.send((False, RuntimeError(str(exception))))
+
+
+class ProcessPool:
+  def __init__(self, currencies, count, server):
+    '''Create a new pool of worker processes.
+
+      The currencies are distributed among the processes based on a hash of their names and their
+      strategies run in the respective process, so that CPU bound strategies of different currencies
+      run in parallel. Ticks are sent to the processes in a compact binary encoding. All requests a
+      strategy makes to the server are forwarded to the parent process and handled by the given
+      server object there, so caching and rate limiting work across all processes.
+
+      Transactions, heartbeats, and ticks for unknown currencies are handled by a worker thread in
+      the parent process.
+
+      Parameters:
+        currencies  Dictionary indexed by currency names containing dictionaries containing currency
+                    objects and associated strategies. The strategies must be picklable.
+        count       Number of worker processes to use.
+        server      The server object used by the currencies.
+
+      Notes:
+        The child processes are created when start() is invoked. This should happen before any
+        other threads are created.
+    '''
+    shards = [{} for _ in range(count)]
+
+    for name, pair in currencies.items():
+      shards[_shard(name, count)][name] = pair
+
+    self.__shards = [_Shard(server, pairs) for pairs in shards if pairs]
+    # dict indexed by currency names containing the shard responsible and the currency's index
+    self.__routes = {name: (shard, shard.indices[name])
+                     for shard in self.__shards for name in shard.indices}
+    self.__worker = Worker({})
+    self.__lastTicks = {}
+    # dict indexed by currency names containing the number of ticks passed on
+    self.__ticks = {}
+
+
+  def start(self):
+    '''Start all worker processes.'''
+    for shard in self.__shards:
+      shard.process.start()
+
+      for end in shard.childEnds:
+        end.close()
+
+      shard.thread.start()
+
+    self.__worker.start()
+
+
+  def destroy(self):
+    '''Destroy all worker processes.
+
+      Notes:
+        A process whose pipe is full is lagging far behind (or hangs) and would not see the
+        request to terminate any time soon. It is terminated right away instead.
+    '''
+    for shard in self.__shards:
+      try:
+        shard.send(b'', block=False)
+      except Full:
+        shard.process.terminate()
+      except OSError:
+        # the process is gone already
+        pass
+
+    self.__worker.destroy()
+
+
+  def join(self, timeout=None):
+    '''Wait for all worker processes to terminate.
+
+      Parameters:
+        timeout  (optional) Maximum time (in seconds) to wait for each of the processes.
+    '''
+    for shard in self.__shards:
+      shard.process.join(timeout)
+
+    self.__worker.join(timeout)
+
+
+  def lastTick(self, currency):
+    '''Retrieve the time the last tick for a currency was sent to its process (see lastTick).'''
+    return self.__lastTicks.get(currency)
+
+
+  def ticks(self):
+    '''Retrieve the number of ticks passed to the processes per currency.
+
+      Returns:
+        A dict object indexed by currency names containing the number of ticks passed on.
+    '''
+    return dict(self.__ticks)
+
+
+  def put(self, data, block=True, timeout=None):
+    '''Pass a message to the process responsible for it.
+
+      Parameters:
+        data     A message as put into a worker's queue (see Worker.run).
+        block    (optional) Whether to wait if the process (or queue) does not accept the message
+                 right away.
+        timeout  (optional) Maximum time (in seconds) to wait if 'block' is True. By default there
+                 is no limit.
+
+      Raises:
+        queue.Full if the message could not be passed on in time.
+    '''
+    if 'transaction' not in data and 'heartbeat' not in data:
+      tick = data['tick'] if 'tick' in data else data
+      route = self.__routes.get(tick['instrument'])
+
+      if route is not None:
+        shard, index = route
+        shard.send(encodeTick(index, tick), block, timeout)
+
+        self.__lastTicks[tick['instrument']] = monotonic()
+        self.__ticks[tick['instrument']] = self.__ticks.get(tick['instrument'], 0) + 1
+        return
+
+    self.__worker.queue().put(data, block, timeout)
+
+
+  def queue(self):
+    '''Retrieve the queue through which to pass messages to the workers.
+
+      Returns:
+        An object with a put() method distributing the messages among the processes.
+    '''
+    return self
@@ -17,34 +17,52 @@
 # *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
 # ***************************************************************************/
 
-from currency      import Currency
-from emaStrategy   import EmaStrategy
-from worker        import Worker
-from watchdog      import Watchdog
-from eventStreamer import EventStreamer
-from rateStreamer  import RateStreamer
+from currency        import Currency
+from emaStrategy     import EmaStrategy
+from workerPool      import WorkerPool
+from processPool     import ProcessPool
+from conflatingQueue import ConflatingQueue
+from channel         import Channel, BLOCK, CONFLATE
+from queue           import Queue
+from watchdog        import Watchdog
+from asyncStreamer   import AsyncStreamer, PRACTICE_URL
+from tickJournal     import RecordingQueue
+from backtest        import Backtest
+from metrics         import Counter, Gauge
+from time            import monotonic
 
 
 class Program:
-  def __init__(self, server):
+  def __init__(self, server, streamUrl=PRACTICE_URL, journal=None, tracer=None, registry=None):
     """Create new Program object using the given access token.
 
       Parameters:
-        server  An object to use for interacting with an OANDA server.
+        server     An object to use for interacting with an OANDA server.
+        streamUrl  (optional) The URL of the server providing the rate and event streams.
+        journal    (optional) A TickJournal object to record all ticks received from the rate
+                   stream in. It is closed when the program is destroyed.
+        tracer     (optional) A LatencyTracer object to record the latencies of all ticks in. Only
+                   ticks handled by worker threads are traced, not the ones handled by processes.
+        registry   (optional) A metrics.Registry object to register the metrics of the program's
+                   components with once it is started.
     """
     self.__server = server
+    self.__streamUrl = streamUrl
+    self.__journal = journal
+    self.__tracer = tracer
+    self.__registry = registry
     self.__worker = None
     self.__watchdog = None
-    self.__rateStreamer = None
-    self.__eventStreamer = None
+    self.__streamer = None
 
 
   def destroy(self):
     '''Destroy the program.'''
-    self.__eventStreamer.disconnect() if self.__eventStreamer else None
-    self.__rateStreamer.disconnect()  if self.__rateStreamer else None
-    self.__watchdog.destroy()         if self.__watchdog else None
-    self.__worker.destroy()           if self.__worker else None
+    # the streaming thread does not keep the program alive, we do not wait for it indefinitely
+    self.__streamer.disconnect(5) if self.__streamer else None
+    self.__journal.close()        if self.__journal else None
+    self.__watchdog.destroy()     if self.__watchdog else None
+    self.__worker.destroy()       if self.__worker else None
 
 
   def __queryWidths(self, dictionaries, *keys):
@@ -130,7 +148,85 @@ class Program:
                                          str(trade['trailingStop']).ljust(widths[7])))
 
 
-  def start(self, account_id, currencies, timeout):
+  def __createCurrencies(self, currencies):
+    """Create the currency objects and strategies for a list of currencies.
+
+      Parameters:
+        currencies  Comma separated list of currencies.
+
+      Returns:
+        A dictionary indexed by currency names containing dictionaries containing the currency
+        object ('currency') and the associated strategy ('strategy').
+    """
+    # create a set of currency names we are interested in (removes potential duplicates)
+    currencySet = set([c.strip() for c in currencies.split(',')])
+    # for now we associate an EmaStrategy with every currency
+    return {c: {'currency': Currency(self.__server, c),
+                'strategy': EmaStrategy()} for c in currencySet}
+
+
+  def __onReconnect(self, stream, start, end):
+    """Handle the end of an outage of one of the streams.
+
+      Parameters:
+        stream  The name of the stream ('rates' or 'events').
+        start   The time (datetime) the outage started.
+        end     The time (datetime) the stream was connected again.
+    """
+    # cached candles of the outage's period are outdated, request them right away instead of
+    # delaying the next tick handled by a strategy
+    if stream == 'rates' and hasattr(self.__server, 'backfill'):
+      self.__server.backfill(start, end)
+
+
+  def __registerMetrics(self, registry):
+    """Register the metrics of the program's components.
+
+      Parameters:
+        registry  The metrics.Registry object to register the metrics with.
+
+      Notes:
+        All values are collected from the components when the metrics are exposed, the components
+        themselves only keep plain counts.
+    """
+    worker = self.__worker
+    watchdog = self.__watchdog
+    streamer = self.__streamer
+    server = self.__server
+
+    registry.register(Counter('fxbot_ticks_total', "Ticks handled per instrument.",
+                              ('instrument',), worker.ticks))
+    registry.register(Counter('fxbot_watchdog_polls_total',
+                              "Price requests issued for currencies without recent ticks.",
+                              collect=lambda: watchdog.stats()['polls']))
+    registry.register(Counter('fxbot_stream_reconnects_total',
+                              "Reconnects of the streams after an outage.", ('stream',),
+                              streamer.reconnects))
+    registry.register(Gauge('fxbot_heartbeat_age_seconds',
+                            "Time since the last heartbeat of a stream was received.", ('stream',),
+                            lambda: {name: monotonic() - time
+                                     for name, time in streamer.heartbeats().items()}))
+
+    if hasattr(worker, 'queueStats'):
+      registry.register(Gauge('fxbot_queue_depth', "Messages waiting for a worker thread.",
+                              ('worker',),
+                              lambda: {str(index): stats['size']
+                                       for index, stats in enumerate(worker.queueStats())}))
+
+    if hasattr(server, 'stats'):
+      registry.register(Counter('fxbot_cache_hits_total',
+                                "Histories served from the cache without a request.",
+                                collect=lambda: server.stats()['hits']))
+      registry.register(Counter('fxbot_cache_misses_total',
+                                "Histories requested from the server in full.",
+                                collect=lambda: server.stats()['misses']))
+
+    if hasattr(server, 'waitTimes'):
+      registry.register(server.waitTimes())
+
+
+  def start(self, account_id, currencies, timeout, workers=1, processes=0, conflate=False,
+            capacity=0, overflow=BLOCK):
     """Start the program.
 
       An invocation of this method causes the object to create the necessary infrastructure to
@@ -140,7 +236,17 @@ class Program:
         account_id  The ID of the account which to use for interaction with the OANDA servers.
         currencies  List of currencies managed by the program.
         timeout     A timeout value (in milliseconds) after which the watchdog will query new prices
-                    for a currency and place them in the queue.
+                    for a currency and place them in the queue if no tick was received for it.
+        workers     (optional) Number of worker threads among which the currencies are distributed.
+        processes   (optional) Number of worker processes among which the currencies are
+                    distributed. If non-zero the strategies run in child processes and the
+                    workers, conflate, capacity, and overflow arguments are ignored.
+        conflate    (optional) Whether the worker threads skip all but the most recent tick of a
+                    currency while they are falling behind.
+        capacity    (optional) Maximum number of messages waiting for a worker thread. Zero means
+                    unlimited.
+        overflow    (optional) Policy to apply if a worker's queue is full (see Channel). If
+                    conflate is set the policy is always CONFLATE.
 
       Notes:
         Python has a very limited signal handling mechanism in that only the main thread can receive
@@ -149,22 +255,64 @@ class Program:
         streamer uses them and so does the worker), we cannot perform any of this work synchronously
         here and risk to block. Instead, we create new threads for all tasks and return.
     """
-    # create a set of currency names we are interested in (removes potential duplicates)
-    currencySet = set([c.strip() for c in currencies.split(',')])
-    # for now we associate an EmaStrategy with every currency
-    currencyDict = {c: {'currency': Currency(self.__server, c),
-                        'strategy': EmaStrategy()} for c in currencySet}
+    currencyDict = self.__createCurrencies(currencies)
+
+    if processes > 0:
+      self.__worker = ProcessPool(currencyDict, processes, self.__server)
+    else:
+      if capacity > 0:
+        policy = CONFLATE if conflate else overflow
+        queueFactory = lambda: Channel(capacity, policy)
+      elif conflate:
+        queueFactory = ConflatingQueue
+      else:
+        queueFactory = Queue
 
-    self.__worker = Worker(currencyDict)
-    self.__watchdog = Watchdog(currencyDict, self.__worker.queue(), timeout)
-    self.__rateStreamer = RateStreamer(self.__server.token(), self.__worker.queue())
-    self.__eventStreamer = EventStreamer(self.__server.token(), self.__worker.queue())
+      self.__worker = WorkerPool(currencyDict, workers, queueFactory, self.__tracer)
+
+    self.__watchdog = Watchdog(currencyDict, self.__worker.queue(), timeout,
+                               self.__worker.lastTick)
+    queue = self.__worker.queue()
+    if self.__journal is not None:
+      queue = RecordingQueue(queue, self.__journal)
+
+    self.__streamer = AsyncStreamer(self.__server.token(), queue, self.__streamUrl,
+                                    self.__onReconnect, tracer=self.__tracer)
+
+    if self.__registry is not None:
+      self.__registerMetrics(self.__registry)
 
     # now start up all our threads
     self.__worker.start()
     self.__watchdog.start()
-    self.__rateStreamer.start(accountId=account_id, instruments=currencies)
-    self.__eventStreamer.start(accountId=account_id, ignore_heartbeat=False)
+    self.__streamer.start(accountId=account_id, instruments=currencies)
 
-    # We are done, we exit here -- the worker thread as well as the streamer threads will continue
+    # We are done, we exit here -- the worker thread as well as the streamer thread will continue
     # running. Note that this is only due to f*cked up Python signal handling.
+
+
+  def backtest(self, currencies=None, granularity=None):
+    """Replay recorded data through the strategies as fast as possible.
+
+      Parameters:
+        currencies   (optional) Comma separated list of currencies to replay. Defaults to all
+                     currencies for which data was recorded.
+        granularity  (optional) Granularity of the candles to derive ticks from in case no ticks
+                     were recorded.
+
+      Returns:
+        A dict object describing the replay as returned by Backtest.run.
+
+      Notes:
+        The server this program was created with must be a BacktestServer object. In contrast to
+        start() all work is performed synchronously.
+    """
+    if not currencies:
+      currencies = ','.join(self.__server.currencies())
+
+    backtest = Backtest(self.__server, self.__createCurrencies(currencies))
+    result = backtest.run(granularity)
+
+    print("replayed %d ticks in %.3fs (%.1f ticks/s)"
+          % (result['ticks'], result['seconds'], result['rate']))
+    return result
@@ -0,0 +1,108 @@
+# resample.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+"""Functions for building candles of a coarser granularity from ones of a finer granularity."""
+
+from datetimeRfc3339 import parseDateMicros, formatDate
+from datetime        import datetime, timedelta
+
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_HOUR = timedelta(hours=1)
+
+
+def canResample(delta, target):
+  """Check whether candles of one granularity can be built from candles of another one.
+
+    Parameters:
+      delta   A timedelta representing the length of the finer candles.
+      target  A timedelta representing the length of the candles to build.
+
+    Returns:
+      True if candles of length 'target' can be built from candles of length 'delta', False
+      otherwise.
+
+    Notes:
+      Candles of up to one hour are aligned to the top of the minute or the top of the hour (see
+      cacheProxy._deltas), which for all of them is the same as being aligned to the epoch. Coarser
+      candles are aligned to 17:00 in New York (subject to daylight saving time) or even to weeks
+      and months and are not supported.
+  """
+  return (delta < target <= _HOUR and
+          _HOUR % target == timedelta() and
+          target % delta == timedelta())
+
+
+def resample(candles, delta, target):
+  """Build candles of a coarser granularity.
+
+    Parameters:
+      candles  A list of dicts as returned by Server.history (the oldest candle first) of candles
+               of length 'delta'.
+      delta    A timedelta representing the length of the given candles.
+      target   A timedelta representing the length of the candles to build. canResample must be
+               True for 'delta' and 'target'.
+
+    Returns:
+      A list of dicts in the format returned by Server.history, the oldest candle first, of length
+      'target'.
+
+    Notes:
+      The server omits candles for periods without any ticks, so gaps are expected. However, we
+      cannot tell whether the first of the given candles is the first one of its period, so the
+      first coarse candle is dropped unless it starts exactly with one of the given candles.
+  """
+  length = delta // _MICROSECOND
+  step = target // _MICROSECOND
+  result = []
+  current = None
+
+  for candle in candles:
+    time = parseDateMicros(candle['time'])
+    start = time - time % step
+
+    if current is not None and start == current['start']:
+      current['highMid'] = max(current['highMid'], candle['highMid'])
+      current['lowMid'] = min(current['lowMid'], candle['lowMid'])
+      current['closeMid'] = candle['closeMid']
+      current['volume'] += candle['volume']
+    else:
+      if current is not None:
+        # a candle of a later period exists, so the current one is final
+        current['complete'] = True
+        result.append(current)
+      elif time != start:
+        # the beginning of the very first period is not covered, skip it
+        continue
+
+      current = {'start': start, 'openMid': candle['openMid'], 'highMid': candle['highMid'],
+                 'lowMid': candle['lowMid'], 'closeMid': candle['closeMid'],
+                 'volume': candle['volume']}
+
+    # the last period is final only if the candle ending it is
+    current['complete'] = candle['complete'] and time + length == start + step
+
+  if current is not None:
+    result.append(current)
+
+  for candle in result:
+    candle['time'] = formatDate(_EPOCH + _MICROSECOND * candle.pop('start'))
+
+  return result
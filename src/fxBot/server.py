@@ -85,11 +85,14 @@ class Server:
     """Retrieve the current bid and ask prices for a currency.
 
       Parameters:
-        currency  String representing the currency for which to query the current prices.
+        currency  String representing the currency for which to query the current prices or a list
+                  of such strings.
 
       Returns:
         A dict object representing the current prices. It contains the following keys: 'instrument',
-        'time', 'ask', 'bid', and (potentially) 'status'.
+        'time', 'ask', 'bid', and (potentially) 'status'. In case a list of currencies was given, a
+        list of such dict objects in the same order, retrieved using a single request. Currencies
+        for which the server did not return any prices are omitted from this list.
 
       Examples:
         A possible return value might look like this:
@@ -105,16 +108,25 @@ class Server:
         The 'status' key (whose corresponding value may only be 'halted') is only available if the
         currency is currently not being traded.
     """
+    if isinstance(currency, list):
+      prices = self.__api.get_prices(instruments=','.join(currency)).get('prices')
+      prices = {price['instrument']: price for price in prices}
+      return [prices[c] for c in currency if c in prices]
+
     return self.__api.get_prices(instruments=currency).get('prices')[0]
 
 
-  def history(self, currency, granularity, count):
+  def history(self, currency, granularity, count, start=None, includeFirst=True):
     """Query the server for a currency's historic data.
 
       Parameters:
-        currency     Name of the currency for which to query the history.
-        granularity  Granularity of the historic data to retrieve.
-        count        Number of data points to retrieve.
+        currency      Name of the currency for which to query the history.
+        granularity   Granularity of the historic data to retrieve.
+        count         Number of data points to retrieve.
+        start         (optional) Time (RFC3339 string) of the first data point to retrieve. If
+                      given, at most 'count' data points starting at this time are retrieved
+                      instead of the 'count' most recent ones.
+        includeFirst  (optional) Whether to include the data point starting exactly at 'start'.
 
       Returns:
         A list of dicts representing the various data points. Each dict has the following keys:
@@ -132,11 +144,16 @@ class Server:
           'complete': True,
         }]
     """
+    if start is not None:
+      return self.__api.get_history(instrument=currency,
+                                    granularity=granularity,
+                                    start=start,
+                                    includeFirst='true' if includeFirst else 'false',
+                                    candleFormat='midpoint',
+                                    count=count).get('candles')
+
     return self.__api.get_history(instrument=currency,
                                   granularity=granularity,
-                                  #start=...,
-                                  #end=datetime.now().isoformat('T') + 'Z',
-                                  #includeFirst='false',
                                   candleFormat='midpoint',
                                   count=count).get('candles')
 
@@ -0,0 +1,491 @@
+# standInServer.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+"""A local stand-in for OANDA's REST and streaming servers, meant for load testing."""
+
+from cacheProxy      import _deltas
+from datetimeRfc3339 import parseDateMicros, formatDateMicros
+from http.server     import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse    import urlsplit, parse_qs
+from optparse        import OptionParser
+from threading       import Thread, Event, Lock
+from datetime        import datetime, timedelta
+from random          import Random
+from math            import sin
+from time            import time, sleep
+from json            import dumps
+
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+"""Names and approximate prices of the instruments served first."""
+_INSTRUMENTS = [
+  ('EUR_USD', 1.36), ('USD_JPY', 101.5), ('GBP_USD', 1.71), ('AUD_USD', 0.94), ('USD_CHF', 0.89),
+  ('USD_CAD', 1.07), ('NZD_USD', 0.87), ('EUR_GBP', 0.79), ('EUR_JPY', 138.1), ('XAU_USD', 1338.4),
+]
+
+# the interval (in seconds) between two heartbeats of a stream
+_HEARTBEAT = 1.0
+
+
+def _now():
+  """Retrieve the current time in microseconds since the epoch."""
+  return int(time() * 1000000)
+
+
+class Market:
+  def __init__(self, count=len(_INSTRUMENTS), spread=0.0002):
+    """Create a new Market object simulating the prices of a number of instruments.
+
+      Prices are a deterministic function of the time, so all requests for a point in time yield
+      the same answer, no matter which endpoint they are sent to.
+
+      Parameters:
+        count   (optional) Number of instruments. Beyond the ones in _INSTRUMENTS, synthetic
+                instruments named INSTxxx_USD are created.
+        spread  (optional) The spread between the ask and the bid price, relative to the price.
+    """
+    random = Random(4711)
+    self.__spread = spread
+    self.__instruments = {}
+
+    for index in range(count):
+      if index < len(_INSTRUMENTS):
+        name, base = _INSTRUMENTS[index]
+      else:
+        name, base = 'INST%03d_USD' % index, round(random.uniform(0.5, 2.0), 2)
+
+      self.__instruments[name] = {'index': index, 'base': base}
+
+
+  def names(self):
+    """Retrieve the names of all instruments, in the order they were created."""
+    return list(self.__instruments.keys())
+
+
+  def instrument(self, name):
+    """Retrieve the description of an instrument as provided by the instruments endpoint."""
+    base = self.__instruments[name]['base']
+    pip = '0.01' if base >= 10 else '0.0001'
+    return {'instrument': name, 'displayName': name.replace('_', '/'), 'pip': pip,
+            'maxTradeUnits': 10000000}
+
+
+  def mid(self, name, micros):
+    """Retrieve the mid price of an instrument at a point in time (epoch microseconds)."""
+    instrument = self.__instruments[name]
+    index = instrument['index']
+    seconds = micros / 1000000.0
+    return instrument['base'] * (1.0 + 0.002 * sin(seconds / 600.0 + index) +
+                                 0.0005 * sin(seconds / 7.0 + 2 * index))
+
+
+  def prices(self, name, micros):
+    """Retrieve the prices of an instrument at a point in time (epoch microseconds).
+
+      Returns:
+        A dict object in the format of the prices endpoint.
+    """
+    mid = self.mid(name, micros)
+    half = mid * self.__spread / 2.0
+    digits = 3 if mid >= 10 else 5
+    return {'instrument': name, 'time': formatDateMicros(micros),
+            'ask': round(mid + half, digits), 'bid': round(mid - half, digits)}
+
+
+  def candle(self, name, start, delta, now):
+    """Create a candle.
+
+      Parameters:
+        name   The name of the instrument.
+        start  The start of the candle (epoch microseconds).
+        delta  The length of the candle (microseconds).
+        now    The current time (epoch microseconds).
+
+      Returns:
+        A dict object in the format of the candles endpoint.
+    """
+    end = min(start + delta, now)
+    samples = [self.mid(name, start + (end - start) * i // 8) for i in range(9)]
+    digits = 3 if samples[0] >= 10 else 6
+    return {'time': formatDateMicros(start),
+            'openMid': round(samples[0], digits),
+            'highMid': round(max(samples), digits),
+            'lowMid': round(min(samples), digits),
+            'closeMid': round(samples[-1], digits),
+            'volume': max(1, (end - start) // 1000000),
+            'complete': start + delta <= now}
+
+
+  def candles(self, name, granularity, count, start=None, includeFirst=True, now=None):
+    """Create the candles of an instrument.
+
+      Parameters:
+        name          The name of the instrument.
+        granularity   The granularity of the candles.
+        count         The maximum number of candles.
+        start         (optional) Time (epoch microseconds) of the first candle. If not given, the
+                      most recent candles are created.
+        includeFirst  (optional) Whether to include the candle starting exactly at 'start'.
+        now           (optional) The current time (epoch microseconds).
+
+      Returns:
+        A list of dict objects in the format of the candles endpoint, the oldest first.
+    """
+    delta = _deltas[granularity] // _MICROSECOND
+    now = now if now is not None else _now()
+    # the start of the current, incomplete candle
+    last = now - now % delta
+
+    if start is None:
+      first = last - (count - 1) * delta
+    else:
+      first = start - start % delta
+      if first < start or not includeFirst:
+        first += delta
+
+    stop = min(last, first + (count - 1) * delta)
+    return [self.candle(name, s, delta, now) for s in range(first, stop + 1, delta)]
+
+
+class _Handler(BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+
+
+  def log_message(self, *args):
+    """Suppress the logging of requests."""
+    pass
+
+
+  def __send(self, status, data):
+    """Send a complete JSON response."""
+    body = dumps(data).encode()
+    self.send_response(status)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+
+  def __chunk(self, data):
+    """Send a chunk of a streamed response."""
+    self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+    self.wfile.flush()
+
+
+  def do_GET(self):
+    standIn = self.server.standIn
+    url = urlsplit(self.path)
+    query = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+    try:
+      if self.server.streaming:
+        self.__stream(standIn, url.path, query)
+      else:
+        status, data = standIn.handle(url.path, query)
+        self.__send(status, data)
+    except (ConnectionError, BrokenPipeError):
+      # the client went away
+      pass
+
+
+  def __stream(self, standIn, path, query):
+    """Serve one of the streams until the stand-in is stopped or the connection drops."""
+    if path not in ('/v1/prices', '/v1/events') or 'accountId' not in query:
+      self.__send(400, {'code': 1, 'message': 'Invalid request', 'moreInfo': ''})
+      return
+
+    self.send_response(200)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Transfer-Encoding', 'chunked')
+    self.end_headers()
+
+    if path == '/v1/prices':
+      names = query.get('instruments', '').split(',')
+      generator = standIn.ticks([n for n in names if n])
+    else:
+      generator = standIn.events()
+
+    for lines in generator:
+      if lines is None:
+        # an injected error: drop the connection without terminating the response
+        return
+
+      self.__chunk(b''.join(dumps(line).encode() + b'\r\n' for line in lines))
+
+    self.__chunk(b'')
+
+
+class StandInServer:
+  def __init__(self, instruments=len(_INSTRUMENTS), tickRate=10.0, latency=0.0, errorRate=0.0,
+               disconnectRate=0.0, seed=None):
+    """Create a new StandInServer object.
+
+      A StandInServer serves the v1 REST endpoints used by Server (accounts, instruments, prices,
+      candles, and trades) as well as the rate and event streams, each on a port of its own. All
+      data is synthetic (see Market).
+
+      Parameters:
+        instruments     (optional) Number of instruments served.
+        tickRate        (optional) Number of ticks per second sent on a rate stream, distributed
+                        evenly among the instruments subscribed to. With 0 only heartbeats are
+                        sent.
+        latency         (optional) Time (in seconds) every REST request is delayed.
+        errorRate       (optional) Fraction of REST requests answered with an internal server
+                        error.
+        disconnectRate  (optional) Probability of a rate stream being dropped after a tick.
+        seed            (optional) Seed of the random number generator used for injecting errors.
+    """
+    self.__market = Market(instruments)
+    self.__tickRate = tickRate
+    self.__latency = latency
+    self.__errorRate = errorRate
+    self.__disconnectRate = disconnectRate
+    self.__random = Random(seed)
+    self.__lock = Lock()
+    self.__stop = Event()
+    self.__servers = []
+    self.__threads = []
+    self.__stats = {'requests': 0, 'errors': 0, 'ticks': 0, 'disconnects': 0}
+
+
+  def market(self):
+    """Retrieve the Market object providing the data served."""
+    return self.__market
+
+
+  def stats(self):
+    """Retrieve statistics about the requests served.
+
+      Returns:
+        A dict object containing the number of REST requests served ('requests'), of those answered
+        with an injected error ('errors'), the number of ticks streamed ('ticks'), and the number of
+        streams dropped on purpose ('disconnects').
+    """
+    with self.__lock:
+      return dict(self.__stats)
+
+
+  def __count(self, key, amount=1):
+    with self.__lock:
+      self.__stats[key] += amount
+
+
+  def __chance(self, probability):
+    """Decide randomly whether an event with the given probability happens."""
+    if probability <= 0.0:
+      return False
+
+    with self.__lock:
+      return self.__random.random() < probability
+
+
+  def handle(self, path, query):
+    """Handle a REST request.
+
+      Parameters:
+        path   The path of the request.
+        query  A dict object of the request's parameters.
+
+      Returns:
+        A tuple of the HTTP status code and the object to send as JSON.
+    """
+    self.__count('requests')
+
+    if self.__latency > 0.0:
+      sleep(self.__latency)
+
+    if self.__chance(self.__errorRate):
+      self.__count('errors')
+      return 500, {'code': 500, 'message': 'Injected error', 'moreInfo': ''}
+
+    market = self.__market
+    parts = path.strip('/').split('/')
+
+    try:
+      if parts == ['v1', 'accounts']:
+        return 200, {'accounts': [{'accountId': 1815754, 'accountName': 'Primary',
+                                   'accountCurrency': 'USD', 'marginRate': 0.05}]}
+      if len(parts) == 4 and parts[:2] == ['v1', 'accounts'] and parts[3] == 'trades':
+        return 200, {'trades': []}
+      if parts == ['v1', 'instruments']:
+        names = query['instruments'].split(',') if 'instruments' in query else market.names()
+        return 200, {'instruments': [market.instrument(name) for name in names]}
+      if parts == ['v1', 'prices']:
+        now = _now()
+        return 200, {'prices': [market.prices(n, now) for n in query['instruments'].split(',')]}
+      if parts == ['v1', 'candles']:
+        start = parseDateMicros(query['start']) if 'start' in query else None
+        candles = market.candles(query['instrument'], query.get('granularity', 'S5'),
+                                 int(query.get('count', 500)), start,
+                                 query.get('includeFirst', 'true') == 'true')
+        return 200, {'instrument': query['instrument'],
+                     'granularity': query.get('granularity', 'S5'),
+                     'candles': candles}
+    except (KeyError, ValueError) as exception:
+      return 400, {'code': 1, 'message': 'Invalid request: %s' % exception, 'moreInfo': ''}
+
+    return 404, {'code': 2, 'message': 'Not found', 'moreInfo': ''}
+
+
+  def ticks(self, names):
+    """Generate the messages of a rate stream.
+
+      Parameters:
+        names  List of the names of the instruments subscribed to.
+
+      Returns:
+        A generator yielding lists of messages to send at once, or None if the stream is to be
+        dropped. Besides the ticks there is a heartbeat every _HEARTBEAT seconds. It ends when the
+        stand-in is stopped.
+    """
+    market = self.__market
+    names = [name for name in names if name in market.names()] or market.names()
+    start = time()
+    heartbeat = start
+    sent = 0
+
+    while not self.__stop.is_set():
+      now = time()
+      micros = int(now * 1000000)
+      due = int((now - start) * self.__tickRate) - sent
+      lines = []
+
+      for i in range(sent, sent + due):
+        lines.append({'tick': market.prices(names[i % len(names)], micros)})
+
+        if self.__chance(self.__disconnectRate):
+          self.__count('disconnects')
+          self.__count('ticks', len(lines))
+          yield lines
+          yield None
+          return
+
+      if due > 0:
+        sent += due
+        self.__count('ticks', due)
+
+      if now - heartbeat >= _HEARTBEAT:
+        lines.append({'heartbeat': {'time': formatDateMicros(micros)}})
+        heartbeat = now
+
+      if lines:
+        yield lines
+      else:
+        # wait until the next tick or heartbeat is due, but wake up regularly to check for
+        # termination
+        timeout = min(heartbeat + _HEARTBEAT - now, 0.05)
+        if self.__tickRate > 0:
+          timeout = min(timeout, (sent + 1) / self.__tickRate - (now - start))
+
+        self.__stop.wait(timeout)
+
+
+  def events(self):
+    """Generate the messages of an event stream (heartbeats only).
+
+      Returns:
+        A generator yielding lists of messages to send at once. It ends when the stand-in is
+        stopped.
+    """
+    while True:
+      yield [{'heartbeat': {'time': formatDateMicros(_now())}}]
+
+      if self.__stop.wait(_HEARTBEAT):
+        break
+
+
+  def start(self, host='127.0.0.1', restPort=0, streamPort=0):
+    """Start serving requests.
+
+      Parameters:
+        host        (optional) The address to listen on.
+        restPort    (optional) The port to serve the REST endpoints on, 0 for any free one.
+        streamPort  (optional) The port to serve the streams on, 0 for any free one.
+
+      Returns:
+        A tuple of the URLs of the REST and the streaming server.
+    """
+    urls = []
+
+    for port, streaming in ((restPort, False), (streamPort, True)):
+      server = ThreadingHTTPServer((host, port), _Handler)
+      server.daemon_threads = True
+      server.standIn = self
+      server.streaming = streaming
+
+      thread = Thread(target=server.serve_forever, args=(0.05,))
+      thread.start()
+
+      self.__servers.append(server)
+      self.__threads.append(thread)
+      urls.append('http://%s:%d' % server.server_address[:2])
+
+    return tuple(urls)
+
+
+  def stop(self):
+    """Stop serving requests and end all streams."""
+    self.__stop.set()
+
+    for server in self.__servers:
+      server.shutdown()
+      server.server_close()
+
+    for thread in self.__threads:
+      thread.join()
+
+
+def main():
+  """Run a stand-in server until interrupted."""
+  parser = OptionParser()
+  parser.add_option("--host", dest="host", default="127.0.0.1",
+                    help="address to listen on")
+  parser.add_option("--rest-port", dest="rest_port", default=8080, type="int",
+                    help="port to serve the REST endpoints on")
+  parser.add_option("--stream-port", dest="stream_port", default=8081, type="int",
+                    help="port to serve the rate and event streams on")
+  parser.add_option("-i", "--instruments", dest="instruments", default=len(_INSTRUMENTS),
+                    type="int", help="number of instruments to serve")
+  parser.add_option("-r", "--rate", dest="rate", default=10.0, type="float",
+                    help="number of ticks per second sent on a rate stream")
+  parser.add_option("-l", "--latency", dest="latency", default=0.0, type="float",
+                    help="delay (in seconds) of every REST response")
+  parser.add_option("-e", "--errors", dest="errors", default=0.0, type="float",
+                    help="fraction of REST requests answered with an error")
+  parser.add_option("-d", "--disconnects", dest="disconnects", default=0.0, type="float",
+                    help="probability of a rate stream being dropped after a tick")
+
+  (options, arguments) = parser.parse_args()
+
+  standIn = StandInServer(options.instruments, options.rate, options.latency, options.errors,
+                          options.disconnects)
+  restUrl, streamUrl = standIn.start(options.host, options.rest_port, options.stream_port)
+  print("serving REST requests on %s and streams on %s" % (restUrl, streamUrl))
+
+  try:
+    while True:
+      sleep(3600)
+  except KeyboardInterrupt:
+    standIn.stop()
+
+
+if __name__ == '__main__':
+  main()
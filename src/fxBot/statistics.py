@@ -17,7 +17,8 @@
 # *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
 # ***************************************************************************/
 
-from decimal import Decimal
+from decimal     import Decimal
+from collections import deque
 
 
 def calculateEMA(values, count, avgKey, emaKey):
@@ -80,3 +81,221 @@ def calculateAvg(values, openKey, closeKey, avgKey):
     value[avgKey] = (value[openKey] + value[closeKey]) / Decimal(2)
 
   return values
+
+
+class EMA:
+  def __init__(self, count):
+    """Create a new EMA object calculating an Exponential Moving Average incrementally.
+
+      In contrast to calculateEMA, which recalculates the EMA over a whole list of values, an EMA
+      object keeps its state and updates it in constant time whenever a new value arrives.
+
+      Parameters:
+        count  Number of periods the EMA is calculated for.
+    """
+    n = Decimal(count)
+
+    self.__count = count
+    self.__c = Decimal(2) / (n + Decimal(1))
+    self.__ema = None
+
+
+  def seed(self, values, avgKey):
+    """Seed the EMA with historic values.
+
+      Parameters:
+        values  List of dicts with the most recent values at the lower indices (as returned by
+                Currency.history). It must contain at least 'count' elements.
+        avgKey  Key into each of the dicts containing the average price.
+
+      Returns:
+        The EMA of the most recent value. It is the same value calculateEMA stores for the first
+        element of the given list.
+    """
+    count = self.__count
+
+    # the seeding mirrors the special treatment of the oldest element in calculateEMA
+    if count < len(values):
+      self.__ema = values[count][avgKey]
+    else:
+      self.__ema = values[count - 1][avgKey]
+
+    for i in reversed(range(count - 1)):
+      self.update(values[i][avgKey])
+
+    return self.__ema
+
+
+  def update(self, price):
+    """Update the EMA with the value of a new, completed period.
+
+      Parameters:
+        price  The average price of the period.
+
+      Returns:
+        The updated EMA.
+    """
+    if self.__ema is None:
+      self.__ema = price
+    else:
+      self.__ema = self.__c * price + (1 - self.__c) * self.__ema
+
+    return self.__ema
+
+
+  def estimate(self, price):
+    """Calculate the EMA as it would be if the current, not yet completed period ended now.
+
+      Parameters:
+        price  The current average price of the period in progress.
+
+      Returns:
+        The estimated EMA or None if the EMA was neither seeded nor updated yet. The state of the
+        object is not changed.
+    """
+    if self.__ema is None:
+      return None
+
+    return self.__c * price + (1 - self.__c) * self.__ema
+
+
+  def value(self):
+    """Retrieve the current EMA.
+
+      Returns:
+        The EMA of the period that completed last or None if there is none.
+    """
+    return self.__ema
+
+
+class SMA:
+  def __init__(self, count):
+    """Create a new SMA object calculating a Simple Moving Average incrementally.
+
+      Parameters:
+        count  Number of periods the SMA is calculated for.
+    """
+    self.__count = count
+    self.__values = deque(maxlen=count)
+    self.__sum = None
+
+
+  def seed(self, values, avgKey):
+    """Seed the SMA with historic values.
+
+      Parameters:
+        values  List of dicts with the most recent values at the lower indices (as returned by
+                Currency.history).
+        avgKey  Key into each of the dicts containing the average price.
+
+      Returns:
+        The SMA of the most recent value or None if there were not enough values.
+    """
+    for i in reversed(range(min(self.__count, len(values)))):
+      self.update(values[i][avgKey])
+
+    return self.value()
+
+
+  def update(self, price):
+    """Update the SMA with the value of a new, completed period.
+
+      Parameters:
+        price  The average price of the period.
+
+      Returns:
+        The updated SMA or None if less than 'count' values were seen so far.
+    """
+    values = self.__values
+
+    if self.__sum is None:
+      self.__sum = price
+    elif len(values) == self.__count:
+      # the deque drops its oldest element by itself, we just have to account for it in the sum
+      self.__sum = self.__sum - values[0] + price
+    else:
+      self.__sum = self.__sum + price
+
+    values.append(price)
+    return self.value()
+
+
+  def estimate(self, price):
+    """Calculate the SMA as it would be if the current, not yet completed period ended now.
+
+      Parameters:
+        price  The current average price of the period in progress.
+
+      Returns:
+        The estimated SMA or None if less than 'count' - 1 values were seen so far. The state of
+        the object is not changed.
+    """
+    values = self.__values
+
+    if len(values) == self.__count:
+      return (self.__sum - values[0] + price) / Decimal(self.__count)
+    elif len(values) == self.__count - 1:
+      return ((self.__sum + price) if values else price) / Decimal(self.__count)
+
+    return None
+
+
+  def value(self):
+    """Retrieve the current SMA.
+
+      Returns:
+        The SMA of the period that completed last or None if less than 'count' values were seen.
+    """
+    if len(self.__values) < self.__count:
+      return None
+
+    return self.__sum / Decimal(self.__count)
+
+
+class Avg:
+  def __init__(self):
+    """Create a new Avg object tracking the average price of the period in progress.
+
+      The average price is based on the opening and the latest price of a period, just like
+      calculateAvg uses the opening and closing prices of completed periods.
+    """
+    self.__open = None
+    self.__avg = None
+
+
+  def start(self, price):
+    """Start a new period.
+
+      Parameters:
+        price  The opening price of the period.
+
+      Returns:
+        The average price of the new period.
+    """
+    self.__open = price
+    return self.update(price)
+
+
+  def update(self, price):
+    """Update the average price with the latest price of the period in progress.
+
+      Parameters:
+        price  The latest price.
+
+      Returns:
+        The updated average price.
+    """
+    if self.__open is None:
+      self.__open = price
+
+    self.__avg = (self.__open + price) / Decimal(2)
+    return self.__avg
+
+
+  def value(self):
+    """Retrieve the current average price.
+
+      Returns:
+        The average price of the period in progress or None if there is none.
+    """
+    return self.__avg
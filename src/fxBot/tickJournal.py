@@ -0,0 +1,325 @@
+# tickJournal.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+from price           import Price
+from worker          import messageInstrument
+from datetimeRfc3339 import parseDateMicros
+from datetime        import datetime, timedelta
+from threading       import Lock
+from decimal         import Decimal
+from bisect          import bisect_left
+from logging         import warning
+from struct          import Struct
+from mmap            import mmap, ACCESS_READ
+from os              import listdir, makedirs
+from os.path         import join, exists, getsize
+
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_SECOND = 1000000
+_DAY = 24 * 60 * 60 * _SECOND
+
+# A record of the journal: the ID of the instrument, the time in microseconds since the epoch, and
+# the bid and ask prices as integers scaled by _SCALE.
+_RECORD = Struct('<Hqqq')
+_TIME = Struct('<q')
+_DIGITS = 6
+_SCALE = 10 ** _DIGITS
+# the offset of the time within a record
+_TIME_OFFSET = 2
+# the number of records read at once
+_BLOCK = 65536
+
+# the sidecar file listing the names of the instruments, the line number being the instrument's ID
+_INSTRUMENTS = 'instruments'
+_SUFFIX = '.ticks'
+
+
+def _fileName(day):
+  """Retrieve the name of the file containing the ticks of a day.
+
+    Parameters:
+      day  The number of days since the epoch.
+  """
+  return (_EPOCH + timedelta(days=day)).strftime('%Y-%m-%d') + _SUFFIX
+
+
+def _scaled(price):
+  """Convert a price as found in a tick to a scaled integer."""
+  if isinstance(price, Price):
+    # the string representation contains all relevant digits
+    return int((Decimal(str(price)) * _SCALE).to_integral_value())
+
+  return round(float(price) * _SCALE)
+
+
+def _readInstruments(directory):
+  """Read the names of the instruments recorded in a journal.
+
+    Returns:
+      A list of names, indexed by instrument IDs.
+  """
+  path = join(directory, _INSTRUMENTS)
+
+  if not exists(path):
+    return []
+
+  with open(path, 'r') as file:
+    return [line.strip() for line in file if line.strip()]
+
+
+class TickJournal:
+  def __init__(self, directory):
+    """Create a new TickJournal object appending ticks to the files in a directory.
+
+      Every tick is stored as a fixed size binary record. There is one file per (UTC) day, named
+      after the day, the ticks being assigned to files by their time. The names of the instruments
+      are stored in a separate file.
+
+      Records are buffered and written to the file whenever a tick of a new second is recorded,
+      so at most the ticks of the current second are lost if the program terminates.
+
+      Parameters:
+        directory  The directory to store the journal in. It is created if it does not exist.
+                   Ticks are appended to the data already recorded in it.
+    """
+    makedirs(directory, exist_ok=True)
+
+    self.__directory = directory
+    self.__lock = Lock()
+    self.__names = {name: id for id, name in enumerate(_readInstruments(directory))}
+    self.__instruments = open(join(directory, _INSTRUMENTS), 'a')
+    self.__file = None
+    self.__day = None
+    # the second (since the epoch) of the last tick recorded
+    self.__second = None
+
+
+  def __id(self, name):
+    """Retrieve the ID of an instrument, assigning a new one if necessary."""
+    id = self.__names.get(name)
+
+    if id is None:
+      id = len(self.__names)
+      # the name has to be known before any record referring to it can be read
+      self.__instruments.write(name + '\n')
+      self.__instruments.flush()
+      self.__names[name] = id
+
+    return id
+
+
+  def record(self, tick):
+    """Append a tick to the journal.
+
+      Parameters:
+        tick  A tick in any of the formats a worker handles (see Worker.handleTick).
+    """
+    tick = tick['tick'] if 'tick' in tick else tick
+
+    if 'parsed' in tick:
+      micros = (tick['time'] - _EPOCH) // _MICROSECOND
+    else:
+      micros = parseDateMicros(tick['time'])
+
+    bid = _scaled(tick['bid'])
+    ask = _scaled(tick['ask'])
+    second = micros // _SECOND
+    day = micros // _DAY
+
+    with self.__lock:
+      data = _RECORD.pack(self.__id(tick['instrument']), micros, bid, ask)
+
+      if day != self.__day:
+        if self.__file is not None:
+          self.__file.close()
+
+        self.__file = open(join(self.__directory, _fileName(day)), 'ab')
+        self.__day = day
+
+      self.__file.write(data)
+
+      if second != self.__second:
+        self.__file.flush()
+        self.__second = second
+
+
+  def flush(self):
+    """Write all buffered records to the journal's files."""
+    with self.__lock:
+      if self.__file is not None:
+        self.__file.flush()
+
+
+  def close(self):
+    """Close the journal."""
+    with self.__lock:
+      if self.__file is not None:
+        self.__file.close()
+        self.__file = None
+        self.__day = None
+        self.__second = None
+
+      self.__instruments.close()
+
+
+class RecordingQueue:
+  def __init__(self, queue, journal):
+    """Create a new RecordingQueue object.
+
+      Parameters:
+        queue    The queue to pass all messages on to.
+        journal  The TickJournal object to record all ticks in.
+    """
+    self.__queue = queue
+    self.__journal = journal
+
+
+  def put(self, data, *args, **kwargs):
+    """Record a message if it is a tick and put it into the queue.
+
+      Parameters:
+        data  A message as put into a worker's queue (see Worker.run).
+    """
+    if 'transaction' not in data and messageInstrument(data) is not None:
+      try:
+        self.__journal.record(data)
+      except Exception as exception:
+        # the tick is still handled, it is just missing in the journal
+        warning("Failed to record tick: %s" % exception)
+
+    self.__queue.put(data, *args, **kwargs)
+
+
+class _Times:
+  def __init__(self, buffer, count):
+    """Create a new _Times object providing the times of the records in a buffer as a sequence."""
+    self.__buffer = buffer
+    self.__count = count
+
+
+  def __len__(self):
+    return self.__count
+
+
+  def __getitem__(self, index):
+    return _TIME.unpack_from(self.__buffer, index * _RECORD.size + _TIME_OFFSET)[0]
+
+
+class JournalReader:
+  def __init__(self, directory):
+    """Create a new JournalReader object reading the ticks recorded by a TickJournal.
+
+      Parameters:
+        directory  The directory containing the journal.
+
+      Notes:
+        The records of a file are expected to be ordered by time (as received from the rate
+        stream). The files are memory mapped, so no data is read that is not required.
+    """
+    self.__directory = directory
+    self.__names = _readInstruments(directory)
+    self.__files = sorted(f for f in listdir(directory) if f.endswith(_SUFFIX))
+
+
+  def instruments(self):
+    """Retrieve the names of the instruments recorded."""
+    return list(self.__names)
+
+
+  def records(self, start=None, end=None):
+    """Iterate over the recorded ticks in raw form.
+
+      Parameters:
+        start  (optional) A datetime object. Ticks before it are skipped.
+        end    (optional) A datetime object. Ticks at or after it are skipped.
+
+      Returns:
+        An iterator over tuples (instrument name, epoch microseconds, scaled bid, scaled ask), the
+        prices being integers scaled by 10^6.
+    """
+    first = (start - _EPOCH) // _MICROSECOND if start is not None else None
+    last = (end - _EPOCH) // _MICROSECOND if end is not None else None
+    names = self.__names
+    size = _RECORD.size
+
+    for name in self.__files:
+      day = (datetime.strptime(name[:-len(_SUFFIX)], '%Y-%m-%d') - _EPOCH).days
+
+      if first is not None and (day + 1) * _DAY <= first:
+        continue
+      if last is not None and day * _DAY >= last:
+        continue
+
+      path = join(self.__directory, name)
+      # a record might be incomplete if the program terminated while writing it
+      count = getsize(path) // size
+      if not count:
+        continue
+
+      with open(path, 'rb') as file, mmap(file.fileno(), 0, access=ACCESS_READ) as buffer:
+        times = _Times(buffer, count)
+        lower = bisect_left(times, first) if first is not None else 0
+        upper = bisect_left(times, last) if last is not None else count
+
+        for block in range(lower, upper, _BLOCK):
+          data = buffer[block * size:min(block + _BLOCK, upper) * size]
+
+          for id, micros, bid, ask in _RECORD.iter_unpack(data):
+            yield names[id], micros, bid, ask
+
+
+  def ticks(self, scales, start=None, end=None):
+    """Iterate over the recorded ticks.
+
+      Parameters:
+        scales  Dict indexed by the names of the instruments of interest containing the PriceScale
+                objects of their prices (see Currency.scale). Ticks of other instruments are
+                skipped.
+        start   (optional) A datetime object. Ticks before it are skipped.
+        end     (optional) A datetime object. Ticks at or after it are skipped.
+
+      Returns:
+        An iterator over ticks in the parsed format a worker handles (see Worker.handleTick), i.e.,
+        dicts containing an 'instrument', a 'time' (datetime), an 'ask' and a 'bid' (Price), and a
+        'parsed' key.
+    """
+    # Ticks are ordered by time and many of them share the same second, so we create the datetime
+    # object of a second only once.
+    current = None
+    base = None
+
+    for name, micros, bid, ask in self.records(start, end):
+      scale = scales.get(name)
+      if scale is None:
+        continue
+
+      second, fraction = divmod(micros, _SECOND)
+
+      if second != current:
+        current = second
+        base = _EPOCH + timedelta(seconds=second)
+
+      # the scaled integers are converted exactly, without taking the detour via a float
+      yield {'instrument': name,
+             'time': base + timedelta(microseconds=fraction),
+             'ask': Price(Decimal(ask).scaleb(-_DIGITS), scale),
+             'bid': Price(Decimal(bid).scaleb(-_DIGITS), scale),
+             'parsed': True}
@@ -49,19 +49,26 @@ class TimeProxy:
   def currentPrices(self, *args, **kwargs):
     """Intercept a server's response to a request for the current prices."""
     prices = super().currentPrices(*args, **kwargs)
-    self.feedTime(parseDate(prices['time']))
+
+    if isinstance(prices, list):
+      # the prices of a batch are retrieved at the same time, the most recent one is the best sample
+      if prices:
+        self.feedTime(parseDate(max(price['time'] for price in prices)))
+    else:
+      self.feedTime(parseDate(prices['time']))
+
     return prices
 
 
   def history(self, *args, **kwargs):
     """Intercept a server's response to a history request."""
     history = super().history(*args, **kwargs)
-    last = history[-1]
 
     # In case the last element is already complete we cannot say if it represents the server's
-    # *current* time (and not just an aligned one) -- so do not use it.
-    if not last['complete']:
-      self.feedTime(parseDate(last['time']))
+    # *current* time (and not just an aligned one) -- so do not use it. Note that incremental
+    # requests (see CacheProxy) might not yield any data at all.
+    if history and not history[-1]['complete']:
+      self.feedTime(parseDate(history[-1]['time']))
 
     return history
 
@@ -18,20 +18,29 @@
 # ***************************************************************************/
 
 from tryRun          import tryRun
+from currency        import Currency
 from threading       import Thread, Event
 from multiprocessing import Pipe
 from select          import poll, POLLIN
+from heapq           import heapify, heappop, heappush
+from time            import monotonic
+from logging         import debug
 
 
 class Watchdog(Thread):
-  def __init__(self, currencies, queue, timeout):
+  def __init__(self, currencies, queue, timeout, lastTick=None):
     '''Create a new watchdog thread.
 
       Parameters:
         currencies  List of currencies managed by this worker.
         queue       A queue to use for placing new prices.
         timeout     A timeout value (in milliseconds) after which the watchdog will query new prices
-                    for a currency and place them in the queue.
+                    for a currency and place them in the queue if no tick was received for it in
+                    the meantime. Either a single value for all currencies or a dict indexed by
+                    currency names.
+        lastTick    (optional) A function retrieving the (monotonic) time of the last tick received
+                    for a currency given its name, or None if there was none (see Worker.lastTick).
+                    Without it, prices are queried after every timeout.
     '''
 
     super().__init__()
@@ -45,6 +54,18 @@ class Watchdog(Thread):
     self.__registered = False
     self.__destroy = Event()
     self.__timeout = timeout
+    self.__lastTick = lastTick if lastTick is not None else lambda currency: None
+    # number of price requests issued and of currencies whose prices were queried by them
+    self.__polls = 0
+    self.__polled = 0
+
+
+  def __interval(self, currency):
+    '''Retrieve the time (in seconds) after which prices of a currency without ticks are queried.'''
+    if isinstance(self.__timeout, dict):
+      return self.__timeout[currency] / 1000.0
+
+    return self.__timeout / 1000.0
 
 
   @tryRun
@@ -54,27 +75,83 @@ class Watchdog(Thread):
     self.__poll.register(self.__pipePoll, POLLIN)
     self.__registered = True
 
+    # heap of (deadline, currency name) tuples, the deadline being the (monotonic) time after which
+    # the currency is to be checked for staleness
+    now = monotonic()
+    deadlines = [(now + self.__interval(name), name) for name in self.__currencies]
+    heapify(deadlines)
+
     while True:
-      self.__poll.poll(self.__timeout)
+      timeout = max(0.0, deadlines[0][0] - monotonic()) if deadlines else None
+      self.__poll.poll(timeout * 1000.0 if timeout is not None else None)
 
       if self.__destroy.is_set():
         break
 
-      for pair in self.__currencies.values():
-        # TODO: check if a tick is required (because none has been received for a long time) and
-        #       only send it if so
-        currency = pair['currency']
-        prices = currency.currentPrices()
-        prices['instrument'] = currency.name()
-        prices['parsed'] = True
-        self.__queue.put(prices)
+      now = monotonic()
+      stale = []
+      due = []
+
+      # Each currency is checked at most once per round. With a timeout of zero its new deadline
+      # would be due right away and we would never get to check whether we are to terminate.
+      while deadlines and deadlines[0][0] <= now:
+        due.append(heappop(deadlines)[1])
+
+      for name in due:
+        interval = self.__interval(name)
+        last = self.__lastTick(name)
+
+        # a currency that received a tick recently does not need to be checked again before its
+        # interval passed since that tick
+        if last is not None and now - last < interval:
+          heappush(deadlines, (last + interval, name))
+        else:
+          stale.append(self.__currencies[name]['currency'])
+          heappush(deadlines, (now + interval, name))
+
+      if stale:
+        debug("watchdog: querying prices of %s" % ', '.join(c.name() for c in stale))
+
+        self.__polls += 1
+        self.__polled += len(stale)
+
+        # the prices of all stale currencies are retrieved using a single request
+        prices = Currency.batchCurrentPrices(stale)
+        missing = [c.name() for c in stale if c.name() not in prices]
+
+        if missing:
+          # they are queried again once their interval passed
+          debug("watchdog: no prices received for %s" % ', '.join(missing))
+
+        for name, price in prices.items():
+          price['instrument'] = name
+          price['parsed'] = True
+          self.__queue.put(price)
+
+
+  def stats(self):
+    '''Retrieve statistics about the prices queried.
+
+      Returns:
+        A dict object containing the number of price requests issued ('polls') and the number of
+        currencies whose prices were queried by them ('currencies').
+    '''
+    return {'polls': self.__polls, 'currencies': self.__polled}
 
 
   def destroy(self):
-    '''Destroy the watchdog thread.'''
+    '''Destroy the watchdog thread.
+
+      Notes:
+        A round of queries in progress is finished first, no prices are placed in the queue once
+        this method returned.
+    '''
     self.__destroy.set()
     self.__pipeSignal.send([])
 
+    if self.is_alive():
+      self.join()
+
     if self.__registered:
       self.__poll.unregister(self.__pipePoll)
 
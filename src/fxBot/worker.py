@@ -22,15 +22,43 @@ from tryRun    import tryRun
 from threading import Thread, Event
 from logging   import info, warning
 from queue     import Queue
+from time      import monotonic, monotonic_ns
+
+
+def messageInstrument(data):
+  '''Retrieve the name of the instrument a message destined for a worker refers to.
+
+    Parameters:
+      data  A message as put into a worker's queue, i.e., a tick (in any of its formats), a
+            transaction, a heartbeat, or the empty list a worker wakes itself up with.
+
+    Returns:
+      The name of the instrument for ticks and transactions referring to one, None otherwise.
+  '''
+  if not isinstance(data, dict):
+    return None
+  if 'transaction' in data:
+    return data['transaction'].get('instrument')
+  if 'heartbeat' in data:
+    return None
+  if 'tick' in data:
+    return data['tick']['instrument']
+
+  return data.get('instrument')
 
 
 class Worker(Thread):
-  def __init__(self, currencies):
+  def __init__(self, currencies, queueFactory=Queue, tracer=None):
     '''Create a new worker thread.
 
       Parameters:
-        currencies  Dictionary indexed by currency names containing dictionaries containing currency
-                    objects and associated strategies.
+        currencies    Dictionary indexed by currency names containing dictionaries containing
+                      currency objects and associated strategies.
+        queueFactory  (optional) Callable creating the queue the worker operates on. The queue has
+                      to provide the put() and get() methods of queue.Queue (see ConflatingQueue
+                      and Channel).
+        tracer        (optional) A LatencyTracer object to record the latencies of ticks carrying
+                      the times they were received and enqueued (see LatencyTracer.stamp) in.
     '''
 
     # Please note that we have full control over the termination of the worker thread, i.e., we can
@@ -39,20 +67,31 @@ class Worker(Thread):
     super().__init__()
 
     self.__currencies = currencies
-    self.__queue = Queue()
+    self.__queue = queueFactory()
     self.__destroy = Event()
+    self.__tracer = tracer
+    # dict indexed by currency names containing the (monotonic) time the last tick was handled
+    self.__lastTicks = {}
+    # dict indexed by currency names containing the number of ticks handled
+    self.__ticks = {}
 
 
-  def handleTick(self, tick):
+  def handleTick(self, tick, trace=None, dequeued=None):
     '''Handle a tick received from the OANDA server.
 
       Parameters:
-        tick  Either dict object containing 'time', 'ask' and 'bid' price as strings or a dict
-              object containing them in an already parsed format: 'time': datetime, 'ask' and 'bid'
-              both Price objects. In the latter case the a 'parsed' key will exist.
+        tick      Either dict object containing 'time', 'ask' and 'bid' price as strings or a dict
+                  object containing them in an already parsed format: 'time': datetime, 'ask' and
+                  'bid' both Price objects. In the latter case the a 'parsed' key will exist.
+        trace     (optional) The times the tick was received and enqueued (see
+                  LatencyTracer.stamp). If given, the latencies of the tick are recorded.
+        dequeued  (optional) The time (as returned by time.monotonic_ns) the tick was taken out of
+                  the queue. Required if trace is given.
     '''
-    if tick['instrument'] in self.__currencies:
-      pair = self.__currencies[tick['instrument']]
+    name = tick['instrument']
+
+    if name in self.__currencies:
+      pair = self.__currencies[name]
       currency = pair['currency']
       strategy = pair['strategy']
 
@@ -62,12 +101,42 @@ class Worker(Thread):
       if not 'parsed' in tick:
         tick = parsePrice(currency, tick)
 
+      if trace is not None:
+        parsed = monotonic_ns()
+
+      self.__lastTicks[name] = monotonic()
+      self.__ticks[name] = self.__ticks.get(name, 0) + 1
       strategy.onChange(currency, tick['time'], tick['ask'], tick['bid'])
+
+      if trace is not None:
+        self.__tracer.record(name, trace, dequeued, parsed, monotonic_ns())
     else:
       warning("Received tick for unhandled currency: %s: %s ask=%s, bid=%s"
               % (tick['time'], tick['instrument'], tick['ask'], tick['bid']))
 
 
+  def lastTick(self, currency):
+    '''Retrieve the time the last tick for a currency was handled.
+
+      Parameters:
+        currency  The name of the currency.
+
+      Returns:
+        The value of time.monotonic() at the time the last tick was handled or None if no tick was
+        handled yet.
+    '''
+    return self.__lastTicks.get(currency)
+
+
+  def ticks(self):
+    '''Retrieve the number of ticks handled per currency.
+
+      Returns:
+        A dict object indexed by currency names containing the number of ticks handled.
+    '''
+    return dict(self.__ticks)
+
+
   def handleEvent(self, event):
     '''Handle an event received from the OANDA server.
 
@@ -126,12 +195,21 @@ class Worker(Thread):
   @tryRun
   def run(self):
     '''Perform the actual work of processing newly incoming events.'''
+    tracer = self.__tracer
+    trace = None
+    dequeued = None
+
     while True:
       data = self.__queue.get()
 
       if self.__destroy.is_set():
         break
 
+      # the messages only carry the times of the earlier stages if the streamer is tracing, too
+      if tracer is not None:
+        dequeued = monotonic_ns()
+        trace = data.get('trace')
+
       if 'transaction' in data:
         self.handleEvent(data['transaction'])
       # not sure if the API allows for heartbeat and transaction events at the same time (I think so),
@@ -145,9 +223,9 @@ class Worker(Thread):
       # that they used the 'tick' key to indicate a tick but do so no longer but then they suddenly
       # switched back. We can handle both cases here and treat them uniformly afterwards.
       elif 'tick' in data:
-        self.handleTick(data['tick'])
+        self.handleTick(data['tick'], trace, dequeued)
       else:
-        self.handleTick(data)
+        self.handleTick(data, trace, dequeued)
 
 
   def destroy(self):
@@ -159,6 +237,26 @@ class Worker(Thread):
     self.__queue.put([])
 
 
+  def conflated(self):
+    '''Retrieve the number of ticks dropped per currency (see ConflatingQueue.conflated).
+
+      Returns:
+        A dict object indexed by currency names, empty if the worker's queue never drops ticks.
+    '''
+    queue = self.__queue
+    return queue.conflated() if hasattr(queue, 'conflated') else {}
+
+
+  def queueStats(self):
+    '''Retrieve statistics about the usage of the worker's queue (see Channel.stats).
+
+      Returns:
+        A dict object containing at least the number of messages waiting in the queue ('size').
+    '''
+    queue = self.__queue
+    return queue.stats() if hasattr(queue, 'stats') else {'size': queue.qsize()}
+
+
   def queue(self):
     '''Retrieve the queue on which this worker opperates.
 
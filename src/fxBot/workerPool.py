@@ -0,0 +1,150 @@
+# workerPool.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+from worker import Worker, messageInstrument
+from queue  import Queue
+from zlib   import crc32
+
+
+def _shard(currency, count):
+  '''Determine the shard responsible for a currency.
+
+    Parameters:
+      currency  The name of the currency or None.
+      count     The number of shards.
+
+    Returns:
+      The index of the shard. Messages not referring to any currency are handled by the first one.
+  '''
+  if currency is None:
+    return 0
+
+  # unlike hash(), crc32 is stable across runs which makes the assignment reproducible
+  return crc32(currency.encode()) % count
+
+
+class _RoutingQueue:
+  def __init__(self, queues):
+    '''Create a new _RoutingQueue object.
+
+      Parameters:
+        queues  The list of the shards' queues.
+    '''
+    self.__queues = queues
+
+
+  def put(self, data, *args, **kwargs):
+    '''Put a message into the queue of the shard responsible for it.
+
+      Parameters:
+        data  A message as put into a worker's queue (see Worker.run).
+    '''
+    queues = self.__queues
+    queues[_shard(messageInstrument(data), len(queues))].put(data, *args, **kwargs)
+
+
+class WorkerPool:
+  def __init__(self, currencies, count=1, queueFactory=Queue, tracer=None):
+    '''Create a new pool of worker threads.
+
+      The currencies are distributed among the workers based on a hash of their names. Every
+      message is routed to the worker responsible for the currency it refers to, so the messages
+      of a currency are handled in the order they were received while a slow strategy only delays
+      the currencies sharing its worker. Messages not referring to any currency (heartbeats, for
+      instance) are handled by the first worker.
+
+      Parameters:
+        currencies    Dictionary indexed by currency names containing dictionaries containing
+                      currency objects and associated strategies.
+        count         (optional) Number of worker threads to use.
+        queueFactory  (optional) Callable creating the queue of a worker (see Worker).
+        tracer        (optional) A LatencyTracer object shared by all workers (see Worker).
+    '''
+    shards = [{} for _ in range(count)]
+
+    for name, pair in currencies.items():
+      shards[_shard(name, count)][name] = pair
+
+    self.__workers = [Worker(shard, queueFactory, tracer) for shard in shards]
+    self.__queue = _RoutingQueue([worker.queue() for worker in self.__workers])
+
+
+  def start(self):
+    '''Start all worker threads.'''
+    for worker in self.__workers:
+      worker.start()
+
+
+  def destroy(self):
+    '''Destroy all worker threads.'''
+    for worker in self.__workers:
+      worker.destroy()
+
+
+  def join(self, timeout=None):
+    '''Wait for all worker threads to terminate.
+
+      Parameters:
+        timeout  (optional) Maximum time (in seconds) to wait for each of the threads.
+    '''
+    for worker in self.__workers:
+      worker.join(timeout)
+
+
+  def lastTick(self, currency):
+    '''Retrieve the time the last tick for a currency was handled (see Worker.lastTick).'''
+    return self.__workers[_shard(currency, len(self.__workers))].lastTick(currency)
+
+
+  def ticks(self):
+    '''Retrieve the number of ticks handled per currency (see Worker.ticks).'''
+    ticks = {}
+
+    for worker in self.__workers:
+      ticks.update(worker.ticks())
+
+    return ticks
+
+
+  def conflated(self):
+    '''Retrieve the number of ticks dropped per currency (see Worker.conflated).'''
+    conflated = {}
+
+    for worker in self.__workers:
+      conflated.update(worker.conflated())
+
+    return conflated
+
+
+  def queueStats(self):
+    '''Retrieve statistics about the usage of the workers' queues (see Worker.queueStats).
+
+      Returns:
+        A list of dict objects, one for each worker.
+    '''
+    return [worker.queueStats() for worker in self.__workers]
+
+
+  def queue(self):
+    '''Retrieve the queue through which to pass messages to the workers.
+
+      Returns:
+        An object with a put() method distributing the messages among the workers' queues.
+    '''
+    return self.__queue
@@ -0,0 +1,72 @@
+# fixtures.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+from strategy  import Strategy
+from threading import Event
+
+
+class CountingStrategy(Strategy):
+  def __init__(self, count=None):
+    """Create a new CountingStrategy object counting the ticks it is notified of.
+
+      Parameters:
+        count  (optional) Number of ticks after which the 'done' event is set.
+    """
+    self.ticks = 0
+    self.done = Event()
+    self.__count = count
+
+
+  def onChange(self, currency, time, ask, bid):
+    self.ticks += 1
+    if self.ticks == self.__count:
+      self.done.set()
+
+
+class RecordingStrategy(CountingStrategy):
+  def __init__(self, count=None, blocker=None, history=False):
+    """Create a new RecordingStrategy object recording the ticks it is notified of.
+
+      Parameters:
+        count    (optional) Number of ticks after which the 'done' event is set.
+        blocker  (optional) Event object to wait for before handling any tick.
+        history  (optional) Whether to record the last ten 5s candles along with every tick.
+    """
+    super().__init__(count)
+    # tuples of the name of the instrument, the time, and the bid price (as string) of the ticks
+    self.records = []
+    self.histories = []
+    self.__blocker = blocker
+    self.__history = history
+
+
+  def onChange(self, currency, time, ask, bid):
+    if self.__blocker is not None:
+      self.__blocker.wait()
+
+    self.records.append((currency.name(), time, str(bid)))
+    if self.__history:
+      self.histories.append(currency.history('5s', 10))
+
+    super().onChange(currency, time, ask, bid)
+
+
+def tick(name, i):
+  """Create a tick with a bid price of i and an ask price of i + 1 for an instrument."""
+  return {'instrument': name, 'time': '2014-07-11T20:59:58.718193Z', 'ask': i + 1, 'bid': i}
@@ -0,0 +1,256 @@
+# testAsyncStreamer.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+from asyncStreamer import AsyncStreamer
+from channel       import Channel
+from backoff       import Backoff
+from latencyTracer import LatencyTracer
+from http.server   import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse  import urlsplit, parse_qs
+from threading     import Thread, Event
+from queue         import Queue
+from time          import monotonic, sleep
+from json          import dumps
+from unittest      import TestCase, main
+
+
+_TICK1 = {'tick': {'instrument': 'EUR_USD', 'time': '2014-07-11T20:59:58.718193Z',
+                   'bid': 1.3601, 'ask': 1.3603}}
+_TICK2 = {'tick': {'instrument': 'EUR_USD', 'time': '2014-07-11T20:59:59.718193Z',
+                   'bid': 1.3602, 'ask': 1.3604}}
+_HEARTBEAT = {'heartbeat': {'time': '2014-07-11T21:00:00.000000Z'}}
+_TRANSACTION = {'transaction': {'instrument': 'GBP_USD', 'time': '2014-07-17T18:57:05.000000Z',
+                                'type': 'ORDER_FILLED', 'id': 1}}
+
+
+class StreamHandler(BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+
+
+  def log_message(self, *args):
+    pass
+
+
+  def __chunk(self, data):
+    self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+    self.wfile.flush()
+
+
+  def do_GET(self):
+    url = urlsplit(self.path)
+    self.server.requests.append((url.path, parse_qs(url.query),
+                                 self.headers['Authorization']))
+
+    # the failures to simulate for the first requests of every stream
+    failures = self.server.failures.get(url.path)
+    failure = failures.pop(0) if failures else None
+
+    if failure == 503:
+      self.send_response(503)
+      self.send_header('Content-Length', '11')
+      self.end_headers()
+      self.wfile.write(b'unavailable')
+      return
+
+    if url.path == '/v1/prices':
+      lines = [_HEARTBEAT, _TICK1, _TICK2]
+    elif url.path == '/v1/events':
+      lines = [_HEARTBEAT, _TRANSACTION]
+    else:
+      self.send_response(404)
+      self.send_header('Content-Length', '9')
+      self.end_headers()
+      self.wfile.write(b'not found')
+      return
+
+    self.send_response(200)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Transfer-Encoding', 'chunked')
+    self.end_headers()
+
+    # a connection gone half-open: nothing arrives but nothing fails either
+    if failure == 'silent':
+      self.server.stop.wait()
+      return
+
+    data = b''.join(dumps(line).encode() + b'\r\n' for line in lines)
+    # split a message across chunks
+    self.__chunk(data[:10])
+    self.__chunk(data[10:])
+
+    # keep the stream open just like the real server does, unless it is to be interrupted
+    while failure != 'close' and not self.server.stop.wait(0.05):
+      pass
+
+    self.__chunk(b'')
+
+
+class TestAsyncStreamer(TestCase):
+  def setUp(self):
+    self.__server = ThreadingHTTPServer(('127.0.0.1', 0), StreamHandler)
+    self.__server.daemon_threads = True
+    self.__server.requests = []
+    self.__server.failures = {}
+    self.__server.stop = Event()
+    self.__thread = Thread(target=self.__server.serve_forever)
+    self.__thread.start()
+    self.__url = 'http://127.0.0.1:%d' % self.__server.server_address[1]
+
+
+  def tearDown(self):
+    self.__server.stop.set()
+    self.__server.shutdown()
+    self.__server.server_close()
+    self.__thread.join()
+
+
+  def testStreams(self):
+    """Verify that messages of both streams are put into the queue."""
+    queue = Queue()
+    streamer = AsyncStreamer('XXXXXXXXXX', queue, self.__url)
+    streamer.start(accountId='1815754', instruments='EUR_USD,GBP_USD')
+
+    messages = [queue.get(timeout=5) for _ in range(4)]
+    ticks = [m for m in messages if 'tick' in m]
+    others = [m for m in messages if 'tick' not in m]
+
+    # heartbeats of the rate stream are ignored, those of the event stream are not
+    self.assertEqual(ticks, [_TICK1, _TICK2])
+    self.assertEqual(others, [_HEARTBEAT, _TRANSACTION])
+    # heartbeats are tracked for both streams nonetheless
+    self.assertEqual(sorted(streamer.heartbeats()), ['events', 'rates'])
+
+    requests = sorted(self.__server.requests)
+    self.assertEqual(requests[0], ('/v1/events', {'accountId': ['1815754']}, 'Bearer XXXXXXXXXX'))
+    self.assertEqual(requests[1], ('/v1/prices', {'accountId': ['1815754'],
+                                                  'instruments': ['EUR_USD,GBP_USD']},
+                                   'Bearer XXXXXXXXXX'))
+
+    # the streams are still open, yet disconnecting is immediate
+    start = monotonic()
+    streamer.disconnect(5)
+    self.assertLess(monotonic() - start, 1)
+    self.assertFalse(streamer._AsyncStreamer__thread.is_alive())
+    self.assertTrue(queue.empty())
+
+
+  def testTrace(self):
+    """Verify that a tracing streamer stamps messages with the times of receipt and enqueueing."""
+    queue = Queue()
+    streamer = AsyncStreamer('XXXXXXXXXX', queue, self.__url, tracer=LatencyTracer())
+    streamer.start(accountId='1815754', instruments='EUR_USD,GBP_USD')
+
+    try:
+      messages = [queue.get(timeout=5) for _ in range(4)]
+    finally:
+      streamer.disconnect(5)
+
+    for message in messages:
+      received, enqueued = message.pop('trace')
+      self.assertLessEqual(received, enqueued)
+
+    self.assertIn(_TICK1, messages)
+
+
+  def testEarlyDisconnect(self):
+    """Verify that a streamer can be disconnected right after it was started."""
+    streamer = AsyncStreamer('XXXXXXXXXX', Queue(), self.__url)
+    streamer.start(accountId='1815754', instruments='EUR_USD')
+    streamer.disconnect(5)
+    self.assertFalse(streamer._AsyncStreamer__thread.is_alive())
+
+    # disconnecting twice is fine as well
+    streamer.disconnect(5)
+
+
+  def testReadTimeout(self):
+    """Verify that a stream not delivering any data is reconnected."""
+    self.__server.failures = {'/v1/prices': ['silent']}
+    queue = Queue()
+    streamer = AsyncStreamer('XXXXXXXXXX', queue, self.__url,
+                             backoffFactory=lambda: Backoff(0.01, 0.05), readTimeout=0.5)
+    streamer.start(accountId='1815754', instruments='EUR_USD')
+
+    ticks = []
+    try:
+      while len(ticks) < 2:
+        message = queue.get(timeout=5)
+        if 'tick' in message:
+          ticks.append(message)
+    finally:
+      streamer.disconnect(5)
+
+    self.assertEqual(ticks, [_TICK1, _TICK2])
+    self.assertGreaterEqual(streamer.reconnects()['rates'], 1)
+    self.assertGreaterEqual(len([r for r in self.__server.requests if r[0] == '/v1/prices']), 2)
+
+
+  def testFullQueue(self):
+    """Verify that a full queue neither blocks the other stream nor disconnecting."""
+    queue = Channel(1)
+    streamer = AsyncStreamer('XXXXXXXXXX', queue, self.__url)
+    streamer.start(accountId='1815754', instruments='EUR_USD')
+
+    # the heartbeats of both streams are received although nobody makes room in the queue
+    deadline = monotonic() + 5
+    while len(streamer.heartbeats()) < 2 and monotonic() < deadline:
+      sleep(0.01)
+
+    self.assertEqual(sorted(streamer.heartbeats()), ['events', 'rates'])
+    self.assertEqual(queue.qsize(), 1)
+
+    # messages waiting for room are delivered as it is made
+    messages = [queue.get(timeout=5) for _ in range(4)]
+    self.assertEqual(len([m for m in messages if 'tick' in m]), 2)
+
+    start = monotonic()
+    streamer.disconnect(5)
+    self.assertLess(monotonic() - start, 1)
+    self.assertFalse(streamer._AsyncStreamer__thread.is_alive())
+
+
+  def testReconnect(self):
+    """Verify that interrupted streams are reconnected and their outages are reported."""
+    self.__server.failures = {'/v1/prices': ['close', 503, 503], '/v1/events': [503]}
+    queue = Queue()
+    reconnects = Queue()
+    streamer = AsyncStreamer('XXXXXXXXXX', queue, self.__url,
+                             lambda *args: reconnects.put(args),
+                             lambda: Backoff(0.01, 0.05))
+    streamer.start(accountId='1815754', instruments='EUR_USD')
+
+    # the rates are received twice: before and after the interruption
+    messages = [queue.get(timeout=5) for _ in range(6)]
+    self.assertEqual([m for m in messages if 'tick' in m], [_TICK1, _TICK2] * 2)
+
+    reported = sorted([reconnects.get(timeout=5) for _ in range(2)])
+    self.assertEqual([stream for stream, start, end in reported], ['events', 'rates'])
+    for stream, start, end in reported:
+      self.assertLess(start, end)
+
+    streamer.disconnect(5)
+
+    outages = streamer.outages()
+    self.assertEqual(sorted(o['stream'] for o in outages), ['events', 'rates'])
+    self.assertEqual(streamer.reconnects(), {'rates': 1, 'events': 1})
+    self.assertEqual(len([r for r in self.__server.requests if r[0] == '/v1/prices']), 4)
+
+
+if __name__ == '__main__':
+  main()
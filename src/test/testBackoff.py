@@ -1,4 +1,4 @@
-# eventStreamer.py
+# testBackoff.py
 
 #/***************************************************************************
 # *   Copyright (C) 2014 Daniel Mueller                                     *
@@ -17,23 +17,28 @@
 # *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
 # ***************************************************************************/
 
-from threadedStreamer import ThreadedStreamer
+from backoff  import Backoff
+from unittest import TestCase, main
 
 
-class EventStreamer(ThreadedStreamer):
-  def __init__(self, token, queue, *args, **kwargs):
-    super().__init__(queue, access_token=token, *args, **kwargs)
+class TestBackoff(TestCase):
+  def testGrowth(self):
+    """Verify that delays grow exponentially up to the maximum."""
+    backoff = Backoff(1.0, 8.0, 2.0, 0.0)
+    self.assertEqual([backoff.delay() for _ in range(6)], [1.0, 2.0, 4.0, 8.0, 8.0, 8.0])
 
-    # overwrite the URL to use -- the Streamer class can only query rate streams, no event streams
-    # TODO: find out which URL to use in case of a live account
-    self.api_url = 'https://stream-fxpractice.oanda.com/v1/events'
+    backoff.reset()
+    self.assertEqual(backoff.delay(), 1.0)
 
 
-  def on_success(self, data):
-    """Handle received event data.
+  def testJitter(self):
+    """Verify that delays are randomized within the given fraction."""
+    backoff = Backoff(1.0, 1.0, 2.0, 0.5)
+    delays = [backoff.delay() for _ in range(100)]
 
-      Parameters:
-        data  Data received from the server. May be a heartbeat message or an event such as a filled
-              order.
-    """
-    self.queue.put(data)
+    self.assertTrue(all(0.5 <= delay <= 1.0 for delay in delays))
+    self.assertGreater(len(set(delays)), 1)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,135 @@
+# testBacktest.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+from backtest       import Backtest
+from backtestServer import BacktestServer
+from currency       import Currency
+from fixtures       import RecordingStrategy
+from datetime       import datetime
+from unittest       import TestCase, main
+
+
+_CANDLES = {
+  'XAU_USD': {
+    'S5': [
+      {'complete': True, 'closeMid': 1338.3945, 'highMid': 1338.432, 'lowMid': 1338.3945,
+       'volume': 6, 'openMid': 1338.432, 'time': '2014-07-12T22:25:05.000000Z'},
+      {'complete': True, 'closeMid': 1338.325, 'highMid': 1338.355, 'lowMid': 1338.325,
+       'volume': 5, 'openMid': 1338.355, 'time': '2014-07-12T22:25:10.000000Z'},
+      {'complete': True, 'closeMid': 1338.3435, 'highMid': 1338.3635, 'lowMid': 1338.325,
+       'volume': 9, 'openMid': 1338.325, 'time': '2014-07-12T22:25:15.000000Z'},
+    ],
+  },
+  'EUR_USD': {
+    'S5': [
+      {'complete': True, 'closeMid': 1.36803, 'highMid': 1.368125, 'lowMid': 1.364275,
+       'volume': 3, 'openMid': 1.36803, 'time': '2014-07-12T22:25:08.000000Z'},
+    ],
+  },
+}
+
+
+class TestBacktest(TestCase):
+  def setUp(self):
+    self.__server = BacktestServer(candles=_CANDLES)
+    self.__strategy = RecordingStrategy(history=True)
+    self.__currencies = {c: {'currency': Currency(self.__server, c),
+                             'strategy': self.__strategy} for c in _CANDLES}
+
+
+  def __scales(self, *names):
+    return {name: self.__currencies[name]['currency'].scale() for name in names}
+
+
+  def testReplayOrder(self):
+    """Verify that ticks of all currencies are replayed in the order of their occurrence."""
+    result = Backtest(self.__server, self.__currencies).run()
+
+    self.assertEqual(result['ticks'], 4)
+    self.assertGreater(result['rate'], 0)
+
+    self.assertEqual([(name, time) for name, time, _ in self.__strategy.records], [
+      ('XAU_USD', datetime(2014, 7, 12, 22, 25, 10)),
+      ('EUR_USD', datetime(2014, 7, 12, 22, 25, 13)),
+      ('XAU_USD', datetime(2014, 7, 12, 22, 25, 15)),
+      ('XAU_USD', datetime(2014, 7, 12, 22, 25, 20)),
+    ])
+    self.assertEqual(self.__strategy.records[0][2], '1338.3945')
+
+
+  def testNoLookAhead(self):
+    """Verify that a strategy only ever sees history that was complete at the time of a tick."""
+    Backtest(self.__server, self.__currencies).run()
+
+    lengths = [len(history) for history in self.__strategy.histories]
+    self.assertEqual(lengths, [1, 1, 2, 3])
+
+    for (_, time, _), history in zip(self.__strategy.records, self.__strategy.histories):
+      # the most recent candle is the first one
+      self.assertLess(history[0]['time'], time)
+
+
+  def testCurrentPrices(self):
+    """Verify that the current prices reflect the tick being replayed."""
+    server = self.__server
+    ticks = list(server.ticks(self.__scales('XAU_USD'), 'S5'))
+    self.assertEqual(len(ticks), 3)
+
+    server.advance(ticks[1])
+    prices = server.currentPrices('XAU_USD')
+    self.assertEqual(prices['time'], '2014-07-12T22:25:15.000000Z')
+    self.assertEqual(prices['bid'], 1338.325)
+
+
+  def testHistoryStart(self):
+    """Verify that history can be requested starting at a given time."""
+    server = self.__server
+    start = '2014-07-12T22:25:10.000000Z'
+
+    history = server.history('XAU_USD', 'S5', 5, start=start)
+    self.assertEqual([h['volume'] for h in history], [5, 9])
+
+    history = server.history('XAU_USD', 'S5', 5, start=start, includeFirst=False)
+    self.assertEqual([h['volume'] for h in history], [9])
+
+    # no look-ahead either
+    server.advance(list(server.ticks(self.__scales('XAU_USD'), 'S5'))[0])
+    self.assertEqual(server.history('XAU_USD', 'S5', 5, start=start), [])
+
+
+  def testRecordedTicks(self):
+    """Verify that recorded ticks take precedence over candles and are replayed in order."""
+    ticks = [
+      {'tick': {'instrument': 'XAU_USD', 'time': '2014-07-12T22:25:12.000000Z',
+                'ask': 1338.5, 'bid': 1338.3}},
+      {'heartbeat': {'time': '2014-07-12T22:25:11.000000Z'}},
+      {'instrument': 'EUR_USD', 'time': '2014-07-12T22:25:11.500000Z',
+       'ask': 1.36805, 'bid': 1.36801},
+    ]
+    server = BacktestServer(candles=_CANDLES, ticks=ticks)
+    self.__currencies = {c: {'currency': Currency(server, c),
+                             'strategy': self.__strategy} for c in _CANDLES}
+
+    result = Backtest(server, self.__currencies).run()
+    self.assertEqual(result['ticks'], 2)
+    self.assertEqual([name for name, _, _ in self.__strategy.records], ['EUR_USD', 'XAU_USD'])
+
+
+if __name__ == '__main__':
+  main()
@@ -17,11 +17,18 @@
 # *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
 # ***************************************************************************/
 
-from proxy      import createProxyInstance
-from cacheProxy import CacheProxy
-from datetime   import datetime, timedelta
-from unittest   import TestCase, main
-from mock       import patch
+from proxy           import createProxyInstance
+from cacheProxy      import CacheProxy
+from candleStore     import CandleStore
+from datetimeRfc3339 import formatDate
+from datetime        import datetime, timedelta
+from threading       import Event, Thread
+from tempfile        import TemporaryDirectory
+from sqlite3         import connect
+from os.path         import join
+from time            import sleep
+from unittest        import TestCase, main
+from mock            import patch
 
 
 class MockServer:
@@ -32,9 +39,24 @@ class MockServer:
       servers in a way to just return predefined values.
     """
     self.__disabled = False
+    # list of all requests made, as tuples (currency, granularity, count, start, includeFirst)
+    self.requests = []
     self.__history = {
       'EUR_USD': {
         'S5': [],
+        'S30': [
+          {'complete': True, 'closeMid': 1.36803, 'highMid': 1.36805, 'lowMid': 1.36801,
+           'volume': 1, 'openMid': 1.36802, 'time': '2014-07-12T22:24:%s.000000Z' % s}
+          for s in ('00', '30')
+        ] + [
+          {'complete': True, 'closeMid': 1.36803, 'highMid': 1.36805, 'lowMid': 1.36801,
+           'volume': 1, 'openMid': 1.36802, 'time': '2014-07-12T22:%s.000000Z' % t}
+          for t in ('25:00', '25:30', '26:00', '26:30')
+        ] + [
+          {'complete': False, 'closeMid': 1.36803, 'highMid': 1.36805, 'lowMid': 1.36801,
+           'volume': 1, 'openMid': 1.36802, 'time': '2014-07-12T22:27:00.000000Z'}
+        ],
+        'M1': [],
       },
       'XAU_USD': {
         'S30': [],
@@ -50,14 +72,28 @@ class MockServer:
     }
 
 
-  def history(self, currency, granularity, count):
+  def history(self, currency, granularity, count, start=None, includeFirst=True):
+    self.requests.append((currency, granularity, count, start, includeFirst))
+
     if self.__disabled:
       return []
 
     values = self.__history[currency][granularity]
+
+    if start is not None:
+      values = [v for v in values if v['time'] > start or (includeFirst and v['time'] == start)]
+      return values[0:count]
+
     return values[len(values) - count:len(values)]
 
 
+  def append(self, currency, granularity, candle):
+    """Append a candle to the history of a currency, completing the formerly last one."""
+    values = self.__history[currency][granularity]
+    values[-1] = dict(values[-1], complete=True)
+    values.append(candle)
+
+
   def disable(self):
     """Disable the server object to just return an empty list on every incocation of history()."""
     self.__disabled = True
@@ -68,6 +104,41 @@ class MockServer:
     self.__disabled = False
 
 
+class SeriesServer:
+  def __init__(self, count):
+    """Create a new SeriesServer object serving 'count' complete S5 candles of XAU_USD."""
+    self.count = count
+    self.requests = []
+
+
+  def history(self, currency, granularity, count, start=None, includeFirst=True):
+    self.requests.append((currency, granularity, count, start, includeFirst))
+    time = datetime(2014, 7, 14, 8, 0, 0)
+    values = [{'complete': True, 'closeMid': 1338.3945, 'highMid': 1338.432, 'lowMid': 1338.3945,
+               'volume': i, 'openMid': 1338.432,
+               'time': formatDate(time + timedelta(seconds=5 * i))} for i in range(self.count)]
+
+    if start is not None:
+      values = [v for v in values if v['time'] > start or (includeFirst and v['time'] == start)]
+      return values[0:count]
+
+    return values[len(values) - count:len(values)]
+
+
+class SlowServer(MockServer):
+  def __init__(self):
+    """Create a new SlowServer object whose history requests block until released."""
+    super().__init__()
+    self.entered = Event()
+    self.released = Event()
+
+
+  def history(self, *args, **kwargs):
+    self.entered.set()
+    self.released.wait()
+    return super().history(*args, **kwargs)
+
+
 class TestCacheProxy(TestCase):
   def setUp(self):
     self.__server = MockServer()
@@ -117,13 +188,26 @@ class TestCacheProxy(TestCase):
       history = self.__proxy.history('XAU_USD', 'S5', 2)
       self.assertEqual(len(history), 2)
 
+    self.assertEqual(len(self.__server.requests), 2)
+
     with patch('cacheProxy.datetime') as mock_now:
       # advance wallclock time by 5 seconds -- we are outside of our granularity so the proxy
       # should know that it needs to fetch new data from the server
       mock_now.now.return_value = now + timedelta(seconds=5)
 
+      # the server did not report any new candles so the cached ones are retained
+      history = self.__proxy.history('XAU_USD', 'S5', 2)
+      self.assertEqual(len(history), 2)
+      self.assertEqual(len(self.__server.requests), 3)
+
+    with patch('cacheProxy.datetime') as mock_now:
+      # advance wallclock time beyond the time span covered by the cached data -- all of it would
+      # be replaced so it is retrieved completely
+      mock_now.now.return_value = now + timedelta(seconds=20)
+
       history = self.__proxy.history('XAU_USD', 'S5', 2)
       self.assertEqual(history, [])
+      self.assertEqual(self.__server.requests[-1], ('XAU_USD', 'S5', 2, None, True))
 
     # reenable the server again
     self.__server.enable()
@@ -133,12 +217,43 @@ class TestCacheProxy(TestCase):
     with patch('cacheProxy.datetime') as mock_now:
       # now we are within the granularity again but the cached history no longer contains enough
       # elements (because the last request returned an empty list)
-      mock_now.now.return_value = now + timedelta(seconds=2)
+      mock_now.now.return_value = now + timedelta(seconds=22)
 
       history = self.__proxy.history('XAU_USD', 'S5', 2)
       self.assertEqual(len(history), 2)
 
 
+  def testHistoryIncremental(self):
+    """Verify that stale historical data is updated with only the candles following it."""
+    now = datetime.now()
+
+    with patch('cacheProxy.datetime') as mock_now:
+      mock_now.now.return_value = now
+
+      history = self.__proxy.history('XAU_USD', 'S5', 3)
+      self.assertEqual([h['volume'] for h in history], [6, 5, 9])
+
+    self.__server.append('XAU_USD', 'S5', {
+      'complete': False, 'closeMid': 1338.3, 'highMid': 1338.3, 'lowMid': 1338.3,
+      'volume': 1, 'openMid': 1338.3, 'time': '2014-07-12T22:25:20.000000Z'
+    })
+
+    with patch('cacheProxy.datetime') as mock_now:
+      mock_now.now.return_value = now + timedelta(seconds=5)
+
+      # the incomplete candle is replaced and the window keeps its size
+      history = self.__proxy.history('XAU_USD', 'S5', 3)
+      self.assertEqual([h['volume'] for h in history], [5, 9, 1])
+      self.assertTrue(history[1]['complete'])
+      self.assertEqual(self.__server.requests[-1],
+                       ('XAU_USD', 'S5', 3, '2014-07-12T22:25:10.000000Z', False))
+
+      # the most recent candles are returned for a smaller count
+      history = self.__proxy.history('XAU_USD', 'S5', 2)
+      self.assertEqual([h['volume'] for h in history], [9, 1])
+      self.assertEqual(len(self.__server.requests), 2)
+
+
   def testHistoryCachingGranularity(self):
     """Verify that historical data is cached but on a granularity basis."""
     with patch('cacheProxy.datetime') as mock_now:
@@ -169,5 +284,252 @@ class TestCacheProxy(TestCase):
       self.assertEqual(history, [])
 
 
+  def testWarmRestart(self):
+    """Verify that a proxy backed by a store only requests candles not yet stored."""
+    store = CandleStore(':memory:')
+    self.__proxy.attachStore(store)
+
+    # only the two complete candles are stored
+    history = self.__proxy.history('XAU_USD', 'S5', 3)
+    self.assertEqual(len(history), 3)
+    self.assertEqual(self.__server.requests, [('XAU_USD', 'S5', 3, None, True)])
+
+    # a new proxy (as after a restart) warms up from the store
+    server = MockServer()
+    proxy = createProxyInstance(server, CacheProxy)
+    proxy.attachStore(store)
+
+    history = proxy.history('XAU_USD', 'S5', 2)
+    self.assertEqual([h['volume'] for h in history], [5, 9])
+    self.assertEqual(server.requests,
+                     [('XAU_USD', 'S5', 2, '2014-07-12T22:25:10.000000Z', False)])
+
+    # the cache is invalidated but the store is retained
+    proxy.invalidate()
+    server.disable()
+
+    history = proxy.history('XAU_USD', 'S5', 2)
+    self.assertEqual([h['volume'] for h in history], [6, 5])
+
+    # too few stored candles require a full request
+    history = proxy.history('XAU_USD', 'S30', 2)
+    self.assertEqual(server.requests[-1], ('XAU_USD', 'S30', 2, None, True))
+
+
+  def testStoreIncremental(self):
+    """Verify that an incremental update records the candle it follows in the store."""
+    with TemporaryDirectory() as directory:
+      path = join(directory, 'candles.db')
+      store = CandleStore(path)
+      self.__proxy.attachStore(store)
+      now = datetime.now()
+
+      with patch('cacheProxy.datetime') as mock_now:
+        mock_now.now.return_value = now
+        self.__proxy.history('XAU_USD', 'S5', 3)
+
+      self.__server.append('XAU_USD', 'S5', {
+        'complete': False, 'closeMid': 1338.3, 'highMid': 1338.3, 'lowMid': 1338.3,
+        'volume': 1, 'openMid': 1338.3, 'time': '2014-07-12T22:25:20.000000Z'
+      })
+
+      with patch('cacheProxy.datetime') as mock_now:
+        mock_now.now.return_value = now + timedelta(seconds=5)
+        history = self.__proxy.history('XAU_USD', 'S5', 3)
+
+      self.assertEqual([h['volume'] for h in history], [5, 9, 1])
+      self.assertEqual([h['volume'] for h in store.load('XAU_USD', 'S5', 10)], [6, 5, 9])
+      store.close()
+
+      connection = connect(path)
+      rows = connection.execute("SELECT time, previous FROM candles ORDER BY time").fetchall()
+      connection.close()
+
+      self.assertEqual(rows, [('2014-07-12T22:25:05.000000Z', None),
+                              ('2014-07-12T22:25:10.000000Z', '2014-07-12T22:25:05.000000Z'),
+                              ('2014-07-12T22:25:15.000000Z', '2014-07-12T22:25:10.000000Z')])
+
+
+  def testWarmRestartHoles(self):
+    """Verify that candles of different runs are not stitched together across a hole."""
+    store = CandleStore(':memory:')
+
+    def run(server, count):
+      proxy = createProxyInstance(server, CacheProxy)
+      proxy.attachStore(store)
+      return [candle['volume'] for candle in proxy.history('XAU_USD', 'S5', count)]
+
+    # the first run stores candles 0 to 99
+    self.assertEqual(run(SeriesServer(100), 100), list(range(100)))
+
+    # the second run finds too many new candles for an incremental update and stores 900 to 999
+    server = SeriesServer(1000)
+    self.assertEqual(run(server, 100), list(range(900, 1000)))
+    self.assertEqual(server.requests[-1], ('XAU_USD', 'S5', 100, None, True))
+
+    # the third run must not combine candles 50 to 99 with 900 to 999
+    server = SeriesServer(1000)
+    self.assertEqual(run(server, 150), list(range(850, 1000)))
+    self.assertEqual(server.requests, [('XAU_USD', 'S5', 150, None, True)])
+
+    # the fourth run has all it needs in the store
+    server = SeriesServer(1000)
+    last = formatDate(datetime(2014, 7, 14, 8, 0, 0) + timedelta(seconds=5 * 999))
+    self.assertEqual(run(server, 150), list(range(850, 1000)))
+    self.assertEqual(server.requests, [('XAU_USD', 'S5', 150, last, False)])
+
+
+  def testStats(self):
+    """Verify that hits, misses, and updates are counted."""
+    now = datetime.now()
+
+    with patch('cacheProxy.datetime') as mock_now:
+      mock_now.now.return_value = now
+
+      self.__proxy.history('XAU_USD', 'S5', 3)
+      self.__proxy.history('XAU_USD', 'S5', 2)
+      self.__proxy.history('XAU_USD', 'S5', 3)
+
+      mock_now.now.return_value = now + timedelta(seconds=5)
+      self.__proxy.history('XAU_USD', 'S5', 3)
+
+    stats = self.__proxy.stats()
+    self.assertEqual(stats['hits'], 2)
+    self.assertEqual(stats['savedCalls'], 2)
+    self.assertEqual(stats['misses'], 1)
+    self.assertEqual(stats['updates'], 1)
+    # the incremental update only returned the incomplete candle
+    self.assertEqual(stats['savedCandles'], 2)
+    self.assertEqual(stats['entries'], 1)
+    self.assertEqual(stats['evictions'], 0)
+    self.assertGreater(stats['bytes'], 0)
+
+    self.__proxy.invalidate()
+    self.assertEqual(self.__proxy.stats()['bytes'], 0)
+
+
+  def testEviction(self):
+    """Verify that the least recently used entries are evicted."""
+    with patch('cacheProxy.datetime') as mock_now:
+      mock_now.now.return_value = datetime.now()
+
+      self.__proxy.setBudget(maxEntries=2)
+      self.__proxy.history('XAU_USD', 'S5', 2)
+      self.__proxy.history('XAU_USD', 'S30', 2)
+      self.__proxy.history('XAU_USD', 'S5', 2)
+      self.__proxy.history('EUR_USD', 'S5', 2)
+
+      stats = self.__proxy.stats()
+      self.assertEqual(stats['entries'], 2)
+      self.assertEqual(stats['evictions'], 1)
+
+      # the S5 entry was used more recently than the S30 one and has to be retained
+      self.__server.disable()
+      self.assertEqual(len(self.__proxy.history('XAU_USD', 'S5', 2)), 2)
+
+      # a byte limit smaller than any entry retains only the most recently used one
+      self.__proxy.setBudget(maxBytes=1)
+      stats = self.__proxy.stats()
+      self.assertEqual(stats['entries'], 1)
+      self.assertEqual(stats['evictions'], 2)
+      self.assertEqual(len(self.__proxy.history('XAU_USD', 'S5', 2)), 2)
+
+
+  def testResampling(self):
+    """Verify that coarser histories are built from cached finer ones."""
+    with patch('cacheProxy.datetime') as mock_now:
+      mock_now.now.return_value = datetime.now()
+
+      self.__proxy.history('EUR_USD', 'S30', 7)
+      self.assertEqual(len(self.__server.requests), 1)
+
+      history = self.__proxy.history('EUR_USD', 'M1', 2)
+      self.assertEqual([h['time'] for h in history],
+                       ['2014-07-12T22:26:00.000000Z', '2014-07-12T22:27:00.000000Z'])
+      self.assertEqual([h['volume'] for h in history], [2, 1])
+      self.assertEqual([h['complete'] for h in history], [True, False])
+      self.assertEqual(len(self.__server.requests), 1)
+      self.assertEqual(self.__proxy.stats()['resampled'], 1)
+
+      # all four candles that could be built were cached
+      self.assertEqual(len(self.__proxy.history('EUR_USD', 'M1', 4)), 4)
+      self.assertEqual(len(self.__server.requests), 1)
+
+      # the finer data is not sufficient for more candles (the MockServer has none either)
+      self.assertEqual(self.__proxy.history('EUR_USD', 'M1', 5), [])
+      self.assertEqual(len(self.__server.requests), 2)
+
+
+  def testCoalescing(self):
+    """Verify that concurrent requests for the same data are sent to the server only once."""
+    server = SlowServer()
+    proxy = createProxyInstance(server, CacheProxy)
+    results = []
+
+    def request(count):
+      results.append(proxy.history('XAU_USD', 'S5', count))
+
+    leader = Thread(target=request, args=(2,))
+    leader.start()
+    server.entered.wait()
+
+    followers = [Thread(target=request, args=(count,)) for count in (2, 1, 2)]
+    larger = Thread(target=request, args=(3,))
+    for thread in followers + [larger]:
+      thread.start()
+
+    # give the other threads a chance to block on the request in flight
+    sleep(0.1)
+    server.released.set()
+
+    for thread in [leader, larger] + followers:
+      thread.join()
+
+    self.assertEqual(sorted(len(r) for r in results), [1, 2, 2, 2, 3])
+    # the request for more data than in flight could not be coalesced
+    self.assertEqual(len(server.requests), 2)
+
+    stats = proxy.stats()
+    self.assertEqual(stats['coalesced'] + stats['hits'], 3)
+
+
+  def testBackfill(self):
+    """Verify that histories current during an outage are refreshed incrementally."""
+    now = datetime.now()
+
+    with patch('cacheProxy.datetime') as mock_now:
+      mock_now.now.return_value = now - timedelta(seconds=60)
+      self.__proxy.history('EUR_USD', 'S30', 2)
+      mock_now.now.return_value = now
+      self.__proxy.history('XAU_USD', 'S5', 3)
+
+    self.__server.append('XAU_USD', 'S5', {
+      'complete': False, 'closeMid': 1338.3, 'highMid': 1338.3, 'lowMid': 1338.3,
+      'volume': 1, 'openMid': 1338.3, 'time': '2014-07-12T22:25:20.000000Z'
+    })
+
+    with patch('cacheProxy.datetime') as mock_now:
+      mock_now.now.return_value = now + timedelta(seconds=3)
+
+      # the EUR_USD history was outdated before the outage started already
+      self.assertEqual(self.__proxy.backfill(now + timedelta(seconds=1),
+                                             now + timedelta(seconds=2)), 1)
+      self.assertEqual(self.__server.requests[-1],
+                       ('XAU_USD', 'S5', 3, '2014-07-12T22:25:10.000000Z', False))
+
+      # neither history was current during this outage
+      self.assertEqual(self.__proxy.backfill(now - timedelta(seconds=20),
+                                             now - timedelta(seconds=10)), 0)
+
+      # the refreshed data is current now
+      history = self.__proxy.history('XAU_USD', 'S5', 3)
+      self.assertEqual([h['volume'] for h in history], [5, 9, 1])
+      self.assertEqual(len(self.__server.requests), 3)
+
+    stats = self.__proxy.stats()
+    self.assertEqual(stats['backfilled'], 1)
+    self.assertEqual(stats['updates'], 1)
+
+
 if __name__ == '__main__':
   main()
@@ -0,0 +1,99 @@
+# testCandleSeries.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+from candleSeries import CandleSeries
+from statistics   import calculateEMA
+from decimal      import Decimal
+from datetime     import datetime
+from unittest     import TestCase, main
+
+
+_HISTORY = [
+  {'complete': True, 'closeMid': 1338.3945, 'highMid': 1338.432, 'lowMid': 1338.3945,
+   'volume': 6, 'openMid': 1338.432, 'time': '2014-07-12T22:25:05.000000Z'},
+  {'complete': True, 'closeMid': 1338.325, 'highMid': 1338.355, 'lowMid': 1338.325,
+   'volume': 5, 'openMid': 1338.355, 'time': '2014-07-12T22:25:10.000000Z'},
+  {'complete': False, 'closeMid': 1338.3435, 'highMid': 1338.3635, 'lowMid': 1338.325,
+   'volume': 9, 'openMid': 1338.325, 'time': '2014-07-12T22:25:15.000000Z'}
+]
+
+
+class TestCandleSeries(TestCase):
+  def setUp(self):
+    self.__series = CandleSeries(_HISTORY, Decimal('0.01'))
+
+
+  def testIndexing(self):
+    """Verify that the most recent candle has the lowest index."""
+    series = self.__series
+    self.assertEqual(len(series), 3)
+
+    self.assertEqual(series[0]['time'], datetime(2014, 7, 12, 22, 25, 15))
+    self.assertEqual(series[2]['time'], datetime(2014, 7, 12, 22, 25, 5))
+    self.assertEqual(series[-1]['time'], datetime(2014, 7, 12, 22, 25, 5))
+    self.assertEqual(str(series[0]['open']), '1338.325')
+    self.assertEqual(str(series[1]['close']), '1338.325')
+    self.assertEqual(series[0]['volume'], 9)
+    self.assertFalse(series[0]['complete'])
+    self.assertTrue(series[1]['complete'])
+
+    self.assertRaises(IndexError, series.__getitem__, 3)
+    self.assertEqual([c['volume'] for c in series], [9, 5, 6])
+
+
+  def testSlicing(self):
+    """Verify that slices are views on the same data."""
+    series = self.__series
+    view = series[1:]
+    self.assertIsInstance(view, CandleSeries)
+    self.assertEqual(len(view), 2)
+    self.assertIs(view[0], series[1])
+    self.assertIs(view[1], series[2])
+
+    view = series[0:2]
+    self.assertEqual([c['volume'] for c in view], [9, 5])
+    self.assertEqual(len(view[1:1]), 0)
+    self.assertEqual(len(series[5:]), 0)
+    self.assertEqual([c['volume'] for c in series[::2]], [9, 6])
+
+
+  def testColumns(self):
+    """Verify that the raw columns are provided in chronological order."""
+    view = self.__series[0:2]
+    self.assertEqual(list(view.column('volume')), [5, 9])
+    self.assertEqual(list(view.column('close')), [1338.325, 1338.3435])
+    self.assertEqual(list(self.__series.column('time')),
+                     [1405203905000000, 1405203910000000, 1405203915000000])
+
+
+  def testStatistics(self):
+    """Verify that values stored in the candles by the statistics module are retained."""
+    series = self.__series
+    for candle in series:
+      candle['avg'] = Decimal(candle['volume'])
+
+    calculateEMA(series, 2, 'avg', 'ema')
+
+    c = Decimal(2) / Decimal(3)
+    self.assertEqual(series[1]['ema'], Decimal(6))
+    self.assertEqual(series[0]['ema'], c * Decimal(9) + (1 - c) * Decimal(6))
+
+
+if __name__ == '__main__':
+  main()
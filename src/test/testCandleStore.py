@@ -0,0 +1,112 @@
+# testCandleStore.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+from candleStore import CandleStore
+from sqlite3     import connect
+from os.path     import join
+from tempfile    import TemporaryDirectory
+from unittest    import TestCase, main
+
+
+def _candle(time, volume, complete=True):
+  return {'complete': complete, 'closeMid': 1.5, 'highMid': 2.0, 'lowMid': 1.0, 'openMid': 1.25,
+          'volume': volume, 'time': '2014-07-12T22:25:%02d.000000Z' % time}
+
+
+class TestCandleStore(TestCase):
+  def testStoreLoad(self):
+    """Verify that stored candles are loaded in chronological order."""
+    store = CandleStore(':memory:')
+    store.store('XAU_USD', 'S5', [_candle(5, 1), _candle(10, 2), _candle(15, 3, False)])
+    store.store('XAU_USD', 'S10', [_candle(0, 4)])
+
+    self.assertEqual(store.load('XAU_USD', 'S5', 10), [_candle(5, 1), _candle(10, 2)])
+    self.assertEqual(store.load('XAU_USD', 'S5', 1), [_candle(10, 2)])
+    self.assertEqual(store.load('XAU_USD', 'S10', 10), [_candle(0, 4)])
+    self.assertEqual(store.load('EUR_USD', 'S5', 10), [])
+
+    # candles are replaced, not duplicated
+    store.store('XAU_USD', 'S5', [_candle(10, 5), _candle(15, 6)])
+    self.assertEqual(store.load('XAU_USD', 'S5', 10),
+                     [_candle(5, 1), _candle(10, 5), _candle(15, 6)])
+    store.close()
+
+
+  def testPersistence(self):
+    """Verify that candles survive closing the store."""
+    with TemporaryDirectory() as directory:
+      path = join(directory, 'candles.db')
+
+      store = CandleStore(path)
+      store.store('XAU_USD', 'S5', [_candle(5, 1)])
+      store.close()
+
+      store = CandleStore(path)
+      self.assertEqual(store.load('XAU_USD', 'S5', 10), [_candle(5, 1)])
+      store.close()
+
+
+  def testHoles(self):
+    """Verify that only the most recent contiguous candles are loaded."""
+    store = CandleStore(':memory:')
+    store.store('XAU_USD', 'S5', [_candle(5, 1), _candle(10, 2)])
+    # a later request of the most recent candles only, the ones in between are unknown
+    store.store('XAU_USD', 'S5', [_candle(40, 3), _candle(45, 4)])
+    self.assertEqual(store.load('XAU_USD', 'S5', 10), [_candle(40, 3), _candle(45, 4)])
+
+    # an incremental update follows the candle it was requested after
+    store.store('XAU_USD', 'S5', [_candle(50, 5)], _candle(45, 4)['time'])
+    self.assertEqual(store.load('XAU_USD', 'S5', 10),
+                     [_candle(40, 3), _candle(45, 4), _candle(50, 5)])
+
+    # the hole is closed once the candles in between are retrieved
+    store.store('XAU_USD', 'S5', [_candle(10, 2), _candle(25, 6), _candle(40, 3)])
+    self.assertEqual([c['volume'] for c in store.load('XAU_USD', 'S5', 10)], [1, 2, 6, 3, 4, 5])
+    store.close()
+
+
+  def testMigration(self):
+    """Verify that a store created without the predecessors of candles can be used."""
+    with TemporaryDirectory() as directory:
+      path = join(directory, 'candles.db')
+
+      connection = connect(path)
+      with connection:
+        connection.execute("CREATE TABLE candles (instrument TEXT NOT NULL, granularity TEXT NOT "
+                           "NULL, time TEXT NOT NULL, openMid REAL NOT NULL, highMid REAL NOT "
+                           "NULL, lowMid REAL NOT NULL, closeMid REAL NOT NULL, volume INTEGER "
+                           "NOT NULL, PRIMARY KEY (instrument, granularity, time)) WITHOUT ROWID")
+        connection.execute("INSERT INTO candles VALUES ('XAU_USD', 'S5', ?, 1.25, 2.0, 1.0, 1.5, "
+                           "1)", (_candle(5, 1)['time'],))
+        connection.execute("INSERT INTO candles VALUES ('XAU_USD', 'S5', ?, 1.25, 2.0, 1.0, 1.5, "
+                           "2)", (_candle(10, 2)['time'],))
+      connection.close()
+
+      # nothing is known about the order of the old candles
+      store = CandleStore(path)
+      self.assertEqual(store.load('XAU_USD', 'S5', 10), [_candle(10, 2)])
+
+      store.store('XAU_USD', 'S5', [_candle(5, 1), _candle(10, 2)])
+      self.assertEqual(store.load('XAU_USD', 'S5', 10), [_candle(5, 1), _candle(10, 2)])
+      store.close()
+
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,162 @@
+# testChannel.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+from channel   import Channel, BLOCK, DROP_OLDEST, CONFLATE
+from fixtures  import tick
+from queue     import Empty, Full
+from threading import Thread
+from mock      import patch
+from unittest  import TestCase, main
+
+
+def _transaction(i):
+  return {'transaction': {'instrument': 'EUR_USD', 'id': i}}
+
+
+class TestChannel(TestCase):
+  def testInvalid(self):
+    self.assertRaises(ValueError, Channel, 0)
+    self.assertRaises(ValueError, Channel, 4, 'foo')
+
+
+  def testBlock(self):
+    """Verify that a full channel with the BLOCK policy makes the producer wait."""
+    channel = Channel(3, BLOCK)
+    for i in range(3):
+      channel.put(tick('EUR_USD', i))
+
+    self.assertRaises(Full, channel.put, tick('EUR_USD', 3), False)
+    self.assertRaises(Full, channel.put, tick('EUR_USD', 3), timeout=0.01)
+    self.assertEqual([channel.get()['bid'] for _ in range(3)], [0, 1, 2])
+    self.assertRaises(Empty, channel.get, False)
+    self.assertRaises(Empty, channel.get, timeout=0.01)
+
+    stats = channel.stats()
+    self.assertEqual(stats['highWater'], 3)
+    self.assertEqual(stats['blocked'], 2)
+    self.assertEqual(stats['size'], 0)
+    self.assertEqual(stats['dropped'], 0)
+
+
+  def testOrdering(self):
+    """Verify that messages pass a small channel in order while producer and consumer race."""
+    channel = Channel(4, BLOCK)
+    received = []
+
+    def consume():
+      for _ in range(1000):
+        received.append(channel.get(timeout=5)['bid'])
+
+    consumer = Thread(target=consume)
+    consumer.start()
+
+    for i in range(1000):
+      channel.put(tick('EUR_USD', i), timeout=5)
+
+    consumer.join(5)
+    self.assertEqual(received, list(range(1000)))
+    self.assertLessEqual(channel.stats()['highWater'], 4)
+
+
+  def testDropOldest(self):
+    """Verify that the oldest tick is dropped but transactions are kept."""
+    channel = Channel(3, DROP_OLDEST)
+    channel.put(_transaction(0))
+    channel.put(tick('EUR_USD', 1))
+    channel.put(_transaction(2))
+    channel.put({'tick': tick('GBP_USD', 3)})
+    channel.put(tick('EUR_USD', 4))
+
+    self.assertEqual(channel.get(), _transaction(0))
+    self.assertEqual(channel.get(), _transaction(2))
+    self.assertEqual(channel.get(), tick('EUR_USD', 4))
+    self.assertEqual(channel.conflated(), {'EUR_USD': 1, 'GBP_USD': 1})
+    self.assertEqual(channel.stats()['dropped'], 2)
+
+    # without any ticks in the channel the producer has to wait
+    for i in range(3):
+      channel.put(_transaction(i))
+
+    self.assertRaises(Full, channel.put, tick('EUR_USD', 5), False)
+    self.assertEqual([channel.get()['transaction']['id'] for _ in range(3)], [0, 1, 2])
+
+
+  def testConflate(self):
+    """Verify that ticks replace waiting ticks of the same instrument."""
+    channel = Channel(2, CONFLATE)
+    for i in range(5):
+      channel.put(tick('EUR_USD', i))
+      channel.put({'tick': tick('GBP_USD', i)})
+
+    self.assertRaises(Full, channel.put, tick('USD_JPY', 0), False)
+    self.assertEqual(channel.get(), tick('EUR_USD', 4))
+
+    # the retrieved tick is no longer replaced
+    channel.put(tick('EUR_USD', 5))
+    self.assertEqual(channel.get(), {'tick': tick('GBP_USD', 4)})
+    self.assertEqual(channel.get(), tick('EUR_USD', 5))
+    self.assertEqual(channel.conflated(), {'EUR_USD': 4, 'GBP_USD': 4})
+    self.assertEqual(channel.stats()['conflated'], 8)
+
+
+  def testConflateTransaction(self):
+    """Verify that a tick is never delivered ahead of an earlier transaction for its instrument."""
+    channel = Channel(4, CONFLATE)
+    channel.put(tick('EUR_USD', 0))
+    channel.put(_transaction(1))
+    channel.put(tick('EUR_USD', 2))
+    channel.put(tick('EUR_USD', 3))
+
+    self.assertEqual(channel.get(), tick('EUR_USD', 0))
+    self.assertEqual(channel.get(), _transaction(1))
+    self.assertEqual(channel.get(), tick('EUR_USD', 3))
+    self.assertEqual(channel.qsize(), 0)
+
+
+  def testConflateAfterWait(self):
+    """Verify that a waiting producer conflates with a tick queued in the meantime."""
+    channel = Channel(2, CONFLATE)
+    channel.put({'tick': tick('GBP_USD', 0)})
+    channel.put({'tick': tick('USD_JPY', 0)})
+    lock = channel._Channel__lock
+    waits = []
+
+    def wait(condition, block, deadline, error):
+      # while the producer waits, the consumer makes room and another producer queues a tick
+      if waits:
+        raise error()
+      waits.append(condition)
+      lock.release()
+      try:
+        channel.get()
+        channel.put(tick('EUR_USD', 1))
+      finally:
+        lock.acquire()
+
+    with patch.object(channel, '_Channel__wait', wait):
+      channel.put(tick('EUR_USD', 2))
+
+    self.assertEqual(channel.qsize(), 2)
+    self.assertEqual(channel.get(), {'tick': tick('USD_JPY', 0)})
+    self.assertEqual(channel.get(), tick('EUR_USD', 2))
+    self.assertEqual(channel.conflated(), {'EUR_USD': 1})
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,131 @@
+# testConflatingQueue.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+from conflatingQueue import ConflatingQueue
+from worker          import Worker
+from currency        import Currency
+from strategy        import Strategy
+from fixtures        import tick
+from threading       import Event
+from unittest        import TestCase, main
+
+
+class BlockingStrategy(Strategy):
+  def __init__(self, blocker):
+    self.bids = []
+    self.handled = Event()
+    self.done = Event()
+    self.__blocker = blocker
+
+
+  def onChange(self, currency, time, ask, bid):
+    self.handled.set()
+    self.__blocker.wait()
+    self.bids.append(str(bid))
+    if len(self.bids) == 2:
+      self.done.set()
+
+
+class TestConflatingQueue(TestCase):
+  def testConflation(self):
+    """Verify that only the most recent tick of an instrument is kept."""
+    queue = ConflatingQueue()
+    queue.put(tick('EUR_USD', 1))
+    queue.put({'tick': tick('GBP_USD', 1)})
+    queue.put({'heartbeat': {'time': '2014-07-09T00:00:00.000000Z'}})
+    queue.put(tick('EUR_USD', 2))
+    queue.put({'tick': tick('GBP_USD', 2)})
+    queue.put(tick('EUR_USD', 3))
+
+    self.assertEqual(queue.qsize(), 3)
+    self.assertEqual(queue.get(), tick('EUR_USD', 3))
+    self.assertEqual(queue.get(), {'tick': tick('GBP_USD', 2)})
+    self.assertIn('heartbeat', queue.get())
+    self.assertEqual(queue.conflated(), {'EUR_USD': 2, 'GBP_USD': 1})
+
+    # once retrieved a tick is no longer replaced
+    queue.put(tick('EUR_USD', 4))
+    queue.put(tick('EUR_USD', 5))
+    self.assertEqual(queue.get(), tick('EUR_USD', 5))
+    self.assertEqual(queue.conflated()['EUR_USD'], 3)
+
+
+  def testTransactionOrder(self):
+    """Verify that a tick is never delivered ahead of an earlier transaction for its instrument."""
+    queue = ConflatingQueue()
+    queue.put(tick('EUR_USD', 1))
+    queue.put({'transaction': {'instrument': 'EUR_USD', 'id': 1}})
+    queue.put(tick('EUR_USD', 2))
+    queue.put(tick('EUR_USD', 3))
+    queue.put({'transaction': {'instrument': 'GBP_USD', 'id': 2}})
+    queue.put(tick('EUR_USD', 4))
+
+    self.assertEqual(queue.qsize(), 4)
+    self.assertEqual(queue.get(), tick('EUR_USD', 1))
+    self.assertEqual(queue.get(), {'transaction': {'instrument': 'EUR_USD', 'id': 1}})
+    self.assertEqual(queue.get(), tick('EUR_USD', 4))
+    self.assertEqual(queue.get(), {'transaction': {'instrument': 'GBP_USD', 'id': 2}})
+    self.assertEqual(queue.conflated(), {'EUR_USD': 2})
+
+    # the detached entry is gone, a new tick is queued once more
+    queue.put(tick('EUR_USD', 5))
+    queue.put({'transaction': {'instrument': 'EUR_USD', 'id': 3}})
+    self.assertEqual(queue.get(), tick('EUR_USD', 5))
+    queue.put(tick('EUR_USD', 6))
+    self.assertEqual(queue.qsize(), 2)
+
+
+  def testNeverDropped(self):
+    """Verify that transactions and heartbeats are never dropped."""
+    queue = ConflatingQueue()
+    for i in range(3):
+      queue.put({'transaction': {'instrument': 'GBP_USD', 'id': i}})
+      queue.put({'heartbeat': {'time': str(i)}})
+    queue.put([])
+
+    self.assertEqual(queue.qsize(), 7)
+    self.assertEqual(queue.conflated(), {})
+    self.assertEqual([queue.get() for _ in range(7)][-1], [])
+
+
+  def testWorker(self):
+    """Verify that a worker falling behind only handles the most recent tick."""
+    blocker = Event()
+    strategy = BlockingStrategy(blocker)
+    worker = Worker({'EUR_USD': {'currency': Currency(None, 'EUR_USD'), 'strategy': strategy}},
+                    queueFactory=ConflatingQueue)
+    worker.start()
+
+    worker.queue().put(tick('EUR_USD', 0))
+    self.assertTrue(strategy.handled.wait(5))
+
+    for i in range(1, 100):
+      worker.queue().put(tick('EUR_USD', i))
+
+    blocker.set()
+    self.assertTrue(strategy.done.wait(5))
+    worker.destroy()
+    worker.join(5)
+
+    self.assertEqual(strategy.bids, ['0.0000', '99.0000'])
+    self.assertEqual(worker.conflated(), {'EUR_USD': 98})
+
+
+if __name__ == '__main__':
+  main()
@@ -38,6 +38,24 @@ class MockServer:
       {'complete': False, 'closeMid': 1338.3435, 'highMid': 1338.3635, 'lowMid': 1338.325,
        'volume': 9, 'openMid': 1338.325, 'time': '2014-07-12T22:25:15.000000Z'}
     ]
+    # list of all currencies for which prices were requested, one entry per request
+    self.requests = []
+
+
+  def currentPrices(self, currency):
+    self.requests.append(currency)
+    prices = {
+      'XAU_USD': {'instrument': 'XAU_USD', 'time': '2014-07-11T20:59:58.718193Z',
+                  'ask': 1339.211, 'bid': 1336.661},
+      'EUR_USD': {'instrument': 'EUR_USD', 'time': '2014-07-11T20:59:57.000000Z',
+                  'ask': 1.36805, 'bid': 1.36801},
+    }
+
+    if isinstance(currency, list):
+      # like OANDA's server we silently omit unknown instruments
+      return [prices[c] for c in currency if c in prices]
+
+    return prices[currency]
 
 
   def history(self, currency, granularity, count):
@@ -67,5 +85,29 @@ class TestCurrency(TestCase):
     self.assertEqual(history[1]['time'], datetime(2014, 7, 12, 22, 25, 10))
 
 
+  def testBatchCurrentPrices(self):
+    """Verify that the prices of multiple currencies are retrieved using a single request."""
+    currencies = [self.__currency, Currency(self.__server, 'EUR_USD')]
+    prices = Currency.batchCurrentPrices(currencies)
+
+    self.assertEqual(self.__server.requests, [['XAU_USD', 'EUR_USD']])
+    self.assertEqual(sorted(prices.keys()), ['EUR_USD', 'XAU_USD'])
+    self.assertEqual(str(prices['EUR_USD']['bid']), '1.3680')
+    self.assertEqual(prices['XAU_USD']['time'], datetime(2014, 7, 11, 20, 59, 58, 718193))
+
+    # currencies of different servers require separate requests
+    server = MockServer()
+    prices = Currency.batchCurrentPrices([self.__currency, Currency(server, 'EUR_USD')])
+    self.assertEqual(len(prices), 2)
+    self.assertEqual(self.__server.requests[-1], ['XAU_USD'])
+    self.assertEqual(server.requests, [['EUR_USD']])
+
+    # currencies the server returned no prices for are left out
+    prices = Currency.batchCurrentPrices([Currency(self.__server, 'GBP_USD'), self.__currency])
+    self.assertEqual(self.__server.requests[-1], ['GBP_USD', 'XAU_USD'])
+    self.assertEqual(list(prices.keys()), ['XAU_USD'])
+    self.assertEqual(str(prices['XAU_USD']['ask']), '1339.2110')
+
+
 if __name__ == '__main__':
   main()
@@ -17,8 +17,8 @@
 # *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
 # ***************************************************************************/
 
-from datetime        import datetime
-from datetimeRfc3339 import parseDate, formatDate
+from datetime        import datetime, timedelta
+from datetimeRfc3339 import parseDate, parseDateMicros, formatDate
 from unittest        import TestCase, main
 
 
@@ -32,6 +32,38 @@ class TestDatetimeRfc3339(TestCase):
     self.assertEqual(parseDate("2014-07-09T19:02:50.000082Z"), datetime(2014, 7, 9, 19, 2, 50, 82))
 
 
+  def testParseFallback(self):
+    """Verify that strings not in OANDA's fixed layout are still handled like before."""
+    self.assertEqual(parseDate("2014-07-09T12:00:00.1Z"), datetime(2014, 7, 9, 12, 0, 0, 100000))
+    self.assertEqual(parseDate("2014-7-9T12:00:00.000001Z"), datetime(2014, 7, 9, 12, 0, 0, 1))
+
+    self.assertRaises(ValueError, parseDate, "2014-07-09T24:00:00.000000Z")
+    self.assertRaises(ValueError, parseDate, "2014-02-30T12:00:00.000000Z")
+    self.assertRaises(ValueError, parseDate, "2014-07-09T12:00:00.00000aZ")
+    self.assertRaises(ValueError, parseDate, "2014-07-09 12:00:00.000000Z")
+    self.assertRaises(ValueError, parseDate, "2014-07-09T12:00:00.000000")
+
+
+  def testParseMicros(self):
+    """Test parsing of dates into epoch microseconds."""
+    self.assertEqual(parseDateMicros("1970-01-01T00:00:00.000000Z"), 0)
+    self.assertEqual(parseDateMicros("1970-01-01T00:00:01.000002Z"), 1000002)
+    self.assertEqual(parseDateMicros("2014-07-09T19:02:50.000082Z"), 1404932570000082)
+    self.assertEqual(parseDateMicros("2014-07-09T19:02:50.1Z"), 1404932570100000)
+    self.assertRaises(ValueError, parseDateMicros, "2014-07-09T19:02:60.000000Z")
+
+    # the direct conversion agrees with parseDate and rejects the same strings
+    for string in ("2014-07-09T23:59:59.999999Z", "2016-02-29T00:00:00.000001Z",
+                   "1969-12-31T23:59:59.500000Z"):
+      self.assertEqual(parseDateMicros(string),
+                       (parseDate(string) - datetime(1970, 1, 1)) // timedelta(microseconds=1))
+
+    for string in ("2014-07-09T24:00:00.000000Z", "2014-02-30T12:00:00.000000Z",
+                   "2014-07-09T12:00:00.00000aZ", "2014-07-09T12:00:+1.000000Z",
+                   "2014-07-09T12:00:0_.000000Z", "2014-07-09 12:00:00.000000Z"):
+      self.assertRaises(ValueError, parseDateMicros, string)
+
+
   def testFormat(self):
     """Test formating a string out of a couple of dates."""
     self.assertEqual("2014-07-09T00:00:00.000000Z", formatDate(datetime(2014, 7, 9, 0, 0, 0, 0)))
@@ -0,0 +1,144 @@
+# testIndicators.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+from statistics import calculateEMA, calculateAvg
+from decimal    import Decimal
+from random     import Random
+from math       import isnan, sqrt
+from unittest   import TestCase, main, skipUnless
+
+# numpy is required by the indicators module only, it is optional for everything else
+try:
+  import numpy
+except ImportError:
+  numpy = None
+else:
+  from indicators import average, ema, sma, wma, rsi, bollingerBands, atr, macd
+
+
+@skipUnless(numpy, "numpy is not installed")
+class TestIndicators(TestCase):
+  def setUp(self):
+    random = Random(4711)
+    self.prices = [round(1.35 + random.uniform(-0.01, 0.01), 5) for _ in range(200)]
+
+
+  def assertAlmostEqualList(self, first, second, places=12):
+    self.assertEqual(len(first), len(second))
+
+    for x, y in zip(first, second):
+      if y is None:
+        self.assertTrue(isnan(x))
+      else:
+        self.assertAlmostEqual(x, float(y), places=places)
+
+
+  def testAverageParity(self):
+    """Verify that the vectorized average matches calculateAvg."""
+    opens = self.prices[:-1]
+    closes = self.prices[1:]
+    values = [{'open': Decimal(o), 'close': Decimal(c)} for o, c in zip(opens, closes)]
+    calculateAvg(values, 'open', 'close', 'avg')
+
+    self.assertAlmostEqualList(average(opens, closes), [v['avg'] for v in values])
+
+
+  def testEMAParity(self):
+    """Verify that the vectorized EMA matches calculateEMA."""
+    for count in (1, 2, 10, 200):
+      prices = self.prices[-count:]
+      # calculateEMA expects the most recent values at the lower indices
+      values = [{'avg': Decimal(p)} for p in reversed(prices)]
+      calculateEMA(values, count, 'avg', 'ema')
+
+      expected = [v['ema'] for v in reversed(values)]
+      self.assertAlmostEqualList(ema(prices, count), expected)
+
+
+  def testEMABlocks(self):
+    """Verify that the blockwise evaluation of long series matches a straight recursion."""
+    prices = self.prices * 50
+    c = 2.0 / 4.0
+    expected = [prices[0]]
+    for price in prices[1:]:
+      expected.append(c * price + (1 - c) * expected[-1])
+
+    self.assertAlmostEqualList(ema(prices, 3), expected)
+
+
+  def testSMA(self):
+    values = [1.0, 2.0, 6.0, 4.0, 5.0]
+    self.assertAlmostEqualList(sma(values, 3), [None, None, 3.0, 4.0, 5.0])
+    self.assertAlmostEqualList(sma(values, 6), [None] * 5)
+
+
+  def testWMA(self):
+    values = [1.0, 2.0, 6.0, 4.0]
+    self.assertAlmostEqualList(wma(values, 3), [None, None,
+                                                (1.0 + 4.0 + 18.0) / 6.0,
+                                                (2.0 + 12.0 + 12.0) / 6.0])
+
+
+  def testRSI(self):
+    values = [1.0, 2.0, 1.5, 2.5, 2.0]
+    # gains: 1, 0, 1, 0, losses: 0, 0.5, 0, 0.5
+    gain = (1.0 + 0.0) / 2.0
+    loss = (0.0 + 0.5) / 2.0
+    rsi2 = 100.0 - 100.0 / (1.0 + gain / loss)
+    gain = (gain + 1.0) / 2.0
+    loss = (loss + 0.0) / 2.0
+    rsi3 = 100.0 - 100.0 / (1.0 + gain / loss)
+    gain = (gain + 0.0) / 2.0
+    loss = (loss + 0.5) / 2.0
+    rsi4 = 100.0 - 100.0 / (1.0 + gain / loss)
+
+    self.assertAlmostEqualList(rsi(values, 2), [None, None, rsi2, rsi3, rsi4])
+    self.assertAlmostEqualList(rsi([1.0, 2.0, 3.0], 2), [None, None, 100.0])
+
+
+  def testBollingerBands(self):
+    values = [1.0, 2.0, 6.0, 4.0]
+    middle, upper, lower = bollingerBands(values, 3, 2.0)
+
+    deviation = sqrt(((1.0 - 3.0) ** 2 + (2.0 - 3.0) ** 2 + (6.0 - 3.0) ** 2) / 3.0)
+    self.assertAlmostEqualList(middle, [None, None, 3.0, 4.0])
+    self.assertAlmostEqual(upper[2], 3.0 + 2.0 * deviation)
+    self.assertAlmostEqual(lower[2], 3.0 - 2.0 * deviation)
+    self.assertTrue(isnan(upper[1]))
+
+
+  def testATR(self):
+    high = [2.0, 3.0, 2.5]
+    low = [1.0, 2.5, 1.0]
+    close = [1.5, 2.8, 2.0]
+    # true ranges: 1.0, max(0.5, 1.5, 1.0) = 1.5, max(1.5, 0.3, 1.8) = 1.8
+    first = (1.0 + 1.5) / 2.0
+    self.assertAlmostEqualList(atr(high, low, close, 2), [None, first, (first + 1.8) / 2.0])
+
+
+  def testMACD(self):
+    line, signal, histogram = macd(self.prices, 3, 6, 2)
+
+    self.assertAlmostEqualList(line, ema(self.prices, 3) - ema(self.prices, 6))
+    self.assertAlmostEqualList(signal, ema(line, 2))
+    self.assertAlmostEqualList(histogram, line - signal)
+
+
+if __name__ == '__main__':
+  main()
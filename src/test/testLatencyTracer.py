@@ -0,0 +1,108 @@
+# testLatencyTracer.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+from latencyTracer import LatencyTracer, Histogram, STAGES
+from worker        import Worker
+from currency      import Currency
+from fixtures      import CountingStrategy
+from time          import monotonic_ns
+from unittest      import TestCase, main
+
+
+class TestLatencyTracer(TestCase):
+  def testPercentiles(self):
+    """Verify that percentiles are reported with a bounded relative error."""
+    histogram = Histogram()
+    self.assertEqual(histogram.percentile(50), 0)
+
+    for value in range(1, 10001):
+      histogram.record(value * 1000)
+
+    self.assertEqual(histogram.count(), 10000)
+    self.assertEqual(histogram.max(), 10000000)
+    self.assertEqual(histogram.mean(), 5000500)
+    self.assertEqual(histogram.percentile(100), 10000000)
+
+    for percent in (1, 50, 90, 99, 99.9):
+      expected = percent * 100000
+      self.assertLessEqual(histogram.percentile(percent), expected)
+      self.assertGreater(histogram.percentile(percent), expected * 0.93)
+
+
+  def testSmallValues(self):
+    """Verify that small values are counted exactly."""
+    histogram = Histogram()
+
+    for value in (0, 1, 2, 3, 31):
+      histogram.record(value)
+
+    self.assertEqual(histogram.percentile(20), 0)
+    self.assertEqual(histogram.percentile(60), 2)
+    self.assertEqual(histogram.percentile(80), 3)
+
+
+  def testRecord(self):
+    """Verify that the latencies of all stages are derived from the times passed in."""
+    tracer = LatencyTracer()
+    tracer.record('EUR_USD', (1000, 3000), 7000, 8000, 20000)
+
+    histograms = tracer.histograms()['EUR_USD']
+    self.assertEqual(histograms['decode'].max(), 2000)
+    self.assertEqual(histograms['queue'].max(), 4000)
+    self.assertEqual(histograms['parse'].max(), 1000)
+    self.assertEqual(histograms['strategy'].max(), 12000)
+    self.assertEqual(histograms['total'].max(), 19000)
+
+    report = tracer.report().splitlines()
+    self.assertEqual(len(report), 1 + len(STAGES))
+    self.assertTrue(report[-1].startswith('EUR_USD'))
+
+
+  def testWorker(self):
+    """Verify that a worker records the latencies of stamped ticks only."""
+    tracer = LatencyTracer()
+    strategy = CountingStrategy(20)
+    worker = Worker({'EUR_USD': {'currency': Currency(None, 'EUR_USD'), 'strategy': strategy}},
+                    tracer=tracer)
+    worker.start()
+
+    try:
+      for i in range(20):
+        tick = {'instrument': 'EUR_USD', 'time': '2014-07-11T20:59:58.718193Z',
+                'ask': 1.3 + i / 1000, 'bid': 1.3}
+        if i % 2 == 0:
+          tracer.stamp(tick, monotonic_ns())
+          tick = {'tick': tick, 'trace': tick.pop('trace')}
+
+        worker.queue().put(tick)
+
+      self.assertTrue(strategy.done.wait(5))
+    finally:
+      worker.destroy()
+      worker.join()
+
+    histograms = tracer.histograms()['EUR_USD']
+    for stage in STAGES:
+      self.assertEqual(histograms[stage].count(), 10)
+
+    self.assertGreaterEqual(histograms['total'].max(), histograms['strategy'].max())
+
+
+if __name__ == '__main__':
+  main()
@@ -19,6 +19,7 @@
 
 from proxy      import createProxyInstance
 from limitProxy import LimitProxy
+from threading  import Thread
 from unittest   import TestCase, main
 from mock       import patch, MagicMock
 
@@ -26,86 +27,150 @@ from mock       import patch, MagicMock
 class MockTime:
   def __init__(self, value):
     self.__value = value
-    self.__slept = 0
+    self.__sleeps = []
 
 
   def __call__(self):
     return self.__value
 
 
-  def sleep(self, *args, count=1):
-    """Simulate a sleep.
+  def advance(self, seconds):
+    """Advance the time without sleeping."""
+    self.__value += seconds
 
-      Parameters:
-        count  Number of times to sleep in a granularity of 0.1s (i.e., a count of 10 simulates
-               sleeping one second).
-    """
-    self.__value += 0.1
-    self.__slept += 1
 
+  def sleep(self, seconds):
+    """Simulate a sleep."""
+    self.__value += seconds
+    self.__sleeps.append(round(seconds, 6))
 
-  def slept(self):
-    return self.__slept
+
+  def sleeps(self):
+    """Retrieve a list of the durations of all simulated sleeps."""
+    return self.__sleeps
 
 
 class TestLimitProxy(TestCase):
   def setUp(self):
     self.__server = MagicMock()
-    self.__proxy = createProxyInstance(self.__server, LimitProxy)
+    self.__time = MockTime(1.0)
+
+    with patch('limitProxy.monotonic', side_effect=self.__time):
+      self.__proxy = createProxyInstance(self.__server, LimitProxy)
 
 
   def testLimit(self):
-    with patch('limitProxy.time') as mock_time:
-      with patch('limitProxy.sleep') as mock_sleep:
-        time = MockTime(1.0)
-        # an invocation of limitProxy.time returns the value of the MockTime object
-        mock_time.side_effect = time
-        # an invocation of limitProxy.sleep increases the value of the MockTime object by 0.1
-        mock_sleep.side_effect = time.sleep
-
-        self.__proxy.currentPrices(self, 'XAU_USD')
-        self.__proxy.currentPrices(self, 'XAU_USD')
-        self.__proxy.currentPrices(self, 'XAU_USD')
-        self.__proxy.currentPrices(self, 'XAU_USD')
-        self.assertEqual(time.slept(), 0)
-        self.__proxy.currentPrices(self, 'XAU_USD')
-        self.assertEqual(time.slept(), 10)
-
-        self.assertEqual(self.__server.currentPrices.call_count, 5)
-
-
-  def testLimitWithSleep(self):
-    with patch('limitProxy.time') as mock_time:
-      with patch('limitProxy.sleep') as mock_sleep:
-        time = MockTime(1.0)
-        mock_time.side_effect = time
-        mock_sleep.side_effect = time.sleep
-
-        self.__proxy.currentPrices(self, 'XAU_USD')
-        time.sleep()
-        self.__proxy.instruments(self, '1815754', 'XAU_USD')
-        time.sleep()
-        self.__proxy.currentPrices(self, 'XAU_USD')
-        time.sleep()
-
-        self.__proxy.trades(self, '1815754')
-        self.assertEqual(time.slept(), 3)
-        self.__proxy.accounts(self)
-        self.assertEqual(time.slept(), 10)
-        self.__proxy.history('XAU_USD', 'S5', 10)
-        self.assertEqual(time.slept(), 11)
-        self.__proxy.currentPrices(self, 'XAU_USD')
-        self.assertEqual(time.slept(), 12)
-        self.__proxy.instruments(self, '1815754', 'XAU_USD')
-        self.assertEqual(time.slept(), 13)
-        self.__proxy.trades(self, '1815754')
-        self.assertEqual(time.slept(), 20)
-
-        self.assertEqual(self.__server.currentPrices.call_count, 3)
-        self.assertEqual(self.__server.instruments.call_count, 2)
-        self.assertEqual(self.__server.accounts.call_count, 1)
-        self.assertEqual(self.__server.history.call_count, 1)
-        self.assertEqual(self.__server.trades.call_count, 2)
+    """Verify that requests are limited to the allowed rate after a peak."""
+    with patch('limitProxy.monotonic', side_effect=self.__time), \
+         patch('limitProxy.sleep', side_effect=self.__time.sleep):
+      for _ in range(5):
+        self.__proxy.currentPrices('XAU_USD')
+      self.assertEqual(self.__time.sleeps(), [])
+
+      # the peak was reached, the next request has to wait until the first is a second ago
+      self.__proxy.currentPrices('XAU_USD')
+      self.assertEqual(self.__time.sleeps(), [1.0])
+      self.__proxy.history('XAU_USD', 'S5', 10)
+      self.assertEqual(self.__time.sleeps(), [1.0])
+
+      # two tokens were refilled in the meantime, then the peak limits again
+      for _ in range(4):
+        self.__proxy.currentPrices('XAU_USD')
+      self.assertEqual(self.__time.sleeps(), [1.0, 0.25, 0.75])
+
+      self.assertEqual(self.__server.currentPrices.call_count, 10)
+      self.assertEqual(self.__server.history.call_count, 1)
+
+      waits = self.__proxy.waitTimes().values()[()]
+      self.assertEqual(waits['count'], 11)
+      self.assertEqual(waits['sum'], 2.0)
+
+
+  def testLimitWindow(self):
+    """Verify that no second sees more requests than the allowed peak."""
+    starts = []
+    self.__server.currentPrices.side_effect = lambda *args: starts.append(self.__time())
+
+    with patch('limitProxy.monotonic', side_effect=self.__time), \
+         patch('limitProxy.sleep', side_effect=self.__time.sleep):
+      for pause in (0.0, 0.1, 0.6, 3.0, 0.3):
+        self.__time.advance(pause)
+        for _ in range(12):
+          self.__proxy.currentPrices('XAU_USD')
+
+    self.assertEqual(len(starts), 60)
+
+    for start in starts:
+      self.assertLessEqual(len([s for s in starts if start <= s < start + 1.0]), 5)
+
+
+  def testLimitRefill(self):
+    """Verify that the bucket is refilled over time but only up to the peak."""
+    with patch('limitProxy.monotonic', side_effect=self.__time), \
+         patch('limitProxy.sleep', side_effect=self.__time.sleep):
+      for _ in range(5):
+        self.__proxy.accounts()
+
+      self.__time.advance(1.0)
+      self.__proxy.trades('1815754')
+      self.__proxy.instruments('1815754', 'XAU_USD')
+      self.assertEqual(self.__time.sleeps(), [])
+
+      self.__time.advance(10.0)
+      for _ in range(5):
+        self.__proxy.accounts()
+      self.assertEqual(self.__time.sleeps(), [])
+
+      self.__proxy.accounts()
+      self.assertEqual(self.__time.sleeps(), [1.0])
+
+
+  def testTryAcquire(self):
+    """Verify that permissions can be acquired without blocking."""
+    with patch('limitProxy.monotonic', side_effect=self.__time), \
+         patch('limitProxy.sleep', side_effect=self.__time.sleep):
+      for _ in range(5):
+        self.assertTrue(self.__proxy.tryAcquire())
+
+      self.assertFalse(self.__proxy.tryAcquire())
+      self.assertFalse(self.__proxy.acquire(timeout=0.2))
+
+      # the permissions acquired are used by the following requests
+      for _ in range(5):
+        self.__proxy.currentPrices('XAU_USD')
+      self.assertEqual(self.__time.sleeps(), [])
+
+      self.assertFalse(self.__proxy.acquire(timeout=0.3))
+      self.assertTrue(self.__proxy.acquire(timeout=1.0))
+      self.assertEqual(self.__time.sleeps(), [1.0])
+      self.__proxy.currentPrices('XAU_USD')
+      self.assertEqual(self.__time.sleeps(), [1.0])
+
+      self.__time.advance(0.25)
+      self.assertTrue(self.__proxy.tryAcquire())
+      self.assertEqual(self.__server.currentPrices.call_count, 6)
+
+
+  def testNoSleepUnderLock(self):
+    """Verify that waiting threads do not hold the lock."""
+    proxy = self.__proxy
+    sleeps = []
+
+    def sleep(seconds):
+      self.assertFalse(proxy._LimitProxy__lock.locked())
+      # the time stands still, so all waiting threads find the peak reached
+      sleeps.append(seconds)
+
+    with patch('limitProxy.monotonic', side_effect=self.__time), \
+         patch('limitProxy.sleep', side_effect=sleep):
+      threads = [Thread(target=proxy.currentPrices, args=('XAU_USD',)) for _ in range(8)]
+      for thread in threads:
+        thread.start()
+      for thread in threads:
+        thread.join()
+
+    self.assertEqual(self.__server.currentPrices.call_count, 8)
+    self.assertEqual(len(sleeps), 3)
 
 
 if __name__ == '__main__':
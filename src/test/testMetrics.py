@@ -0,0 +1,111 @@
+# testMetrics.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+from metrics        import Registry, Counter, Gauge, Histogram, CONTENT_TYPE
+from urllib.request import urlopen
+from urllib.error   import HTTPError
+from unittest       import TestCase, main
+
+
+class TestMetrics(TestCase):
+  def testCounter(self):
+    """Verify that counters are exposed per label value and cannot decrease."""
+    registry = Registry()
+    counter = registry.register(Counter('ticks_total', "Ticks.", ('instrument',)))
+    counter.inc(labels='EUR_USD')
+    counter.inc(2, 'EUR_USD')
+    counter.inc(labels=('GBP_USD',))
+
+    self.assertRaises(ValueError, counter.inc, -1, 'EUR_USD')
+    self.assertRaises(ValueError, counter.inc, 1, ('EUR_USD', 'GBP_USD'))
+
+    self.assertEqual(registry.exposition(),
+                     '# HELP ticks_total Ticks.\n'
+                     '# TYPE ticks_total counter\n'
+                     'ticks_total{instrument="EUR_USD"} 3\n'
+                     'ticks_total{instrument="GBP_USD"} 1\n')
+
+
+  def testCollect(self):
+    """Verify that values can be collected when the metrics are exposed."""
+    depths = {'0': 4, '1': 0}
+    registry = Registry()
+    registry.register(Gauge('queue_depth', "Depth.", ('worker',), lambda: depths))
+    registry.register(Gauge('age_seconds', "Age.", collect=lambda: 0.25))
+    registry.register(Gauge('broken', "Broken.", collect=lambda: 1 / 0))
+
+    exposition = registry.exposition()
+    self.assertIn('queue_depth{worker="0"} 4\n', exposition)
+    self.assertIn('queue_depth{worker="1"} 0\n', exposition)
+    self.assertIn('age_seconds 0.25\n', exposition)
+    # a metric failing to collect its values is left out
+    self.assertNotIn('broken', exposition)
+
+    depths['1'] = 7
+    self.assertIn('queue_depth{worker="1"} 7\n', registry.exposition())
+
+
+  def testHistogram(self):
+    """Verify that histograms expose cumulative buckets, the sum, and the count."""
+    registry = Registry()
+    histogram = registry.register(Histogram('wait_seconds', "Wait.", [0.1, 1.0]))
+
+    for value in (0.0, 0.5, 0.75, 3.0):
+      histogram.observe(value)
+
+    self.assertEqual(registry.exposition().splitlines()[2:],
+                     ['wait_seconds_bucket{le="0.1"} 1',
+                      'wait_seconds_bucket{le="1"} 3',
+                      'wait_seconds_bucket{le="+Inf"} 4',
+                      'wait_seconds_sum 4.25',
+                      'wait_seconds_count 4'])
+
+
+  def testRegister(self):
+    """Verify that metric names are unique and label values are escaped."""
+    registry = Registry()
+    gauge = registry.register(Gauge('value', "Value.", ('name',)))
+    gauge.set(1, 'a "quoted"\nname')
+
+    self.assertRaises(ValueError, registry.register, Counter('value', "Again."))
+    self.assertIn('value{name="a \\"quoted\\"\\nname"} 1\n', registry.exposition())
+
+
+  def testServe(self):
+    """Verify that the metrics are served over HTTP."""
+    registry = Registry()
+    registry.register(Counter('requests_total', "Requests.")).inc()
+    url = registry.start()
+
+    try:
+      with urlopen(url, timeout=5) as response:
+        self.assertEqual(response.headers['Content-Type'], CONTENT_TYPE)
+        self.assertIn(b'requests_total 1\n', response.read())
+
+      with self.assertRaises(HTTPError) as context:
+        urlopen(url.replace('/metrics', '/other'), timeout=5)
+
+      self.assertEqual(context.exception.code, 404)
+      context.exception.close()
+    finally:
+      registry.stop()
+
+
+if __name__ == '__main__':
+  main()
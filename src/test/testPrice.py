@@ -17,9 +17,11 @@
 # *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
 # ***************************************************************************/
 
-from price           import Price
+from price           import Price, priceScale
 from currency        import Currency
-from decimal         import Decimal
+from statistics      import calculateAvg
+from decimal         import Decimal, ROUND_HALF_EVEN
+from random          import Random
 from datetime        import datetime
 from datetimeRfc3339 import formatDate
 from unittest        import TestCase, main
@@ -82,5 +84,113 @@ class TestCurrency(TestCase):
     self.assertEqual(str(price), '0.317358')
 
 
+  def testPriceArithmetic(self):
+    """Verify that prices can be combined with each other."""
+    first = Price(Decimal('1.2345'), Decimal('0.01'))
+    second = Price(Decimal('0.5'), Decimal('0.01'))
+    self.assertEqual(str(first + second), '1.734')
+    self.assertEqual(str(second - first), '-0.734')
+
+    values = [{'open': first, 'close': second}]
+    calculateAvg(values, 'open', 'close', 'avg')
+    self.assertIsInstance(values[0]['avg'], Price)
+    self.assertEqual(str(values[0]['avg']), '0.867')
+
+
+  def testRounding(self):
+    """Verify that string conversion rounds exactly like Decimal.quantize."""
+    random = Random(4711)
+
+    for pip in ('0.00001', '0.0001', '0.01', '1', '100', '1E+2'):
+      pip = Decimal(pip)
+      quantum = pip * Decimal('0.1')
+
+      for _ in range(200):
+        value = Decimal(random.randint(-10**9, 10**9)).scaleb(random.randint(-12, 2))
+        expected = str(value.quantize(quantum, rounding=ROUND_HALF_EVEN))
+        self.assertEqual(str(Price(value, pip)), expected)
+
+    # ties go to the even neighbor
+    self.assertEqual(str(Price(Decimal('1.25'), Decimal('1'))), '1.2')
+    self.assertEqual(str(Price(Decimal('1.35'), Decimal('1'))), '1.4')
+    # negative zero is retained, just as by Decimal
+    self.assertEqual(str(Price(Decimal('-0.04'), Decimal('1'))), '-0.0')
+    # Decimal uses scientific notation for these
+    self.assertEqual(str(Price(Decimal('1234'), Decimal('1E+2'))), '1.23E+3')
+    self.assertEqual(str(Price(Decimal('0.000000123'), Decimal('0.00000001'))), '1.23E-7')
+
+
+  def testPrecision(self):
+    """Verify that digits beyond the guard digits still take part in rounding."""
+    pip = Decimal('0.001')
+    self.assertEqual(str(Price(Decimal('1.000050000000000001'), pip)), '1.0001')
+    self.assertEqual(str(Price(Decimal('1.000049999999999999999999'), pip)), '1.0000')
+    self.assertEqual(str(Price(Decimal('1.00005'), pip)), '1.0000')
+    self.assertEqual(str(Price(Decimal('-1.000050000000000001'), pip)), '-1.0001')
+
+    random = Random(1405)
+    for _ in range(1000):
+      value = Decimal(random.randint(-10**30, 10**30)).scaleb(-random.randint(20, 30))
+      expected = str(value.quantize(pip * Decimal('0.1'), rounding=ROUND_HALF_EVEN))
+      self.assertEqual(str(Price(value, pip)), expected)
+
+
+  def testChainedArithmetic(self):
+    """Verify that chains of operations (EMAs) round like the Decimal based implementation."""
+    random = Random(4711)
+
+    for pip in ('0.00001', '0.001', '0.01'):
+      pip = Decimal(pip)
+      quantum = pip * Decimal('0.1')
+
+      for count in (3, 5, 9, 14, 26):
+        factor = Decimal(2) / Decimal(count + 1)
+        value = Decimal(random.randint(1, 10**7)).scaleb(-random.randint(3, 7))
+        expected = value
+        price = Price(value, pip)
+
+        for _ in range(400):
+          value = Decimal(random.randint(1, 10**7)).scaleb(-random.randint(3, 7))
+          expected = value * factor + expected * (Decimal(1) - factor)
+          price = Price(value, pip) * factor + price * (Decimal(1) - factor)
+          self.assertEqual(str(price), str(expected.quantize(quantum, rounding=ROUND_HALF_EVEN)))
+
+
+  def testParity(self):
+    """Verify that arithmetic yields the very strings the Decimal based implementation did."""
+    # the exact results lie right next to ties, rounded to 28 digits they are ties
+    factor = Decimal(2) / Decimal(11)
+    self.assertEqual(str(Price('-67.36125', Decimal('0.01')) * factor), '-12.248')
+    self.assertEqual(str(Price('333.1763', Decimal('0.001')) / factor), '1832.4696')
+
+    random = Random(1207)
+
+    for _ in range(20000):
+      pip = Decimal(random.choice(('0.00001', '0.0001', '0.001', '0.01')))
+      string = '%s%d.%05d' % (random.choice(('', '-')), random.randint(0, 2000),
+                              random.randint(1, 99999))
+      factor = Decimal(random.randint(1, 30)) / Decimal(random.randint(1, 30))
+      price = Price(string, pip)
+      value = Decimal(string)
+
+      for result, expected in ((price * factor, value * factor), (price / factor, value / factor),
+                               (price + factor, value + factor), (factor - price, factor - value),
+                               (factor / price, factor / value)):
+        expected = expected.quantize(pip * Decimal('0.1'), rounding=ROUND_HALF_EVEN)
+        self.assertEqual(str(result), str(expected), (string, factor))
+
+
+  def testConversion(self):
+    """Verify that prices can be created from floats and strings and share their scale."""
+    pip = Decimal('0.0001')
+    self.assertEqual(str(Price(1.36803, pip)), '1.36803')
+    self.assertEqual(str(Price('1.36803', pip)), '1.36803')
+    self.assertEqual(str(Price(1.36803, priceScale(pip))), '1.36803')
+
+    self.assertIs(priceScale(Decimal('0.0001')), priceScale(pip))
+    self.assertRaises(AttributeError, setattr, Price(1, pip), 'value', 1)
+    self.assertRaises(TypeError, Price(1, pip).__add__, 1.0)
+
+
 if __name__ == '__main__':
   main()
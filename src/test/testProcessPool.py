@@ -0,0 +1,203 @@
+# testProcessPool.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+from processPool     import ProcessPool, encodeTick, decodeTick
+from currency        import Currency
+from strategy        import Strategy
+from fixtures        import tick
+from multiprocessing import Queue
+from threading       import Lock
+from queue           import Full
+from datetime        import datetime
+from time            import sleep, monotonic
+from unittest        import TestCase, main
+
+
+_NAMES = ['XAU_USD', 'EUR_USD', 'GBP_USD', 'USD_JPY', 'AUD_USD', 'USD_CHF']
+
+
+class ReportingStrategy(Strategy):
+  def __init__(self, results, history=False):
+    self.__results = results
+    self.__history = history
+
+
+  def onChange(self, currency, time, ask, bid):
+    if self.__history:
+      try:
+        candles = currency.history('5s', 1)
+        self.__results.put((currency.name(), str(candles[0]['close'])))
+      except RuntimeError:
+        self.__results.put((currency.name(), 'RuntimeError'))
+    else:
+      self.__results.put((currency.name(), str(time), str(ask), str(bid)))
+
+
+class StallingStrategy(Strategy):
+  def onChange(self, currency, time, ask, bid):
+    # never return, so the process stops reading its ticks
+    sleep(3600)
+
+
+class MockServer:
+  def __init__(self):
+    self.requests = []
+
+
+  def history(self, currency, granularity, count):
+    self.requests.append((currency, granularity, count))
+    return [{'complete': True, 'closeMid': 1.2345, 'highMid': 1.3, 'lowMid': 1.2, 'volume': 1,
+             'openMid': 1.25, 'time': '2014-07-12T22:25:05.000000Z'}]
+
+
+class UnpicklableServer(MockServer):
+  def history(self, currency, granularity, count):
+    self.requests.append((currency, granularity, count))
+    return [Lock()]
+
+
+class TestProcessPool(TestCase):
+  def setUp(self):
+    self.__results = Queue()
+    self.__server = MockServer()
+
+
+  def __currencies(self, history=False):
+    return {name: {'currency': Currency(self.__server, name),
+                   'strategy': ReportingStrategy(self.__results, history)} for name in _NAMES}
+
+
+  def testEncoding(self):
+    """Verify that ticks survive the binary encoding."""
+    index, time, ask, bid = decodeTick(encodeTick(3, tick('EUR_USD', 1)))
+    self.assertEqual((index, time, ask, bid), (3, datetime(2014, 7, 11, 20, 59, 58, 718193), 2, 1))
+
+
+  def testOrdering(self):
+    """Verify that the ticks of every currency are handled in order in the child processes."""
+    pool = ProcessPool(self.__currencies(), 3, self.__server)
+    pool.start()
+
+    queue = pool.queue()
+    for i in range(100):
+      for j, name in enumerate(_NAMES):
+        queue.put(tick(name, i) if j % 2 else {'tick': tick(name, i)})
+
+    results = {name: [] for name in _NAMES}
+    for _ in range(100 * len(_NAMES)):
+      name, time, ask, bid = self.__results.get(timeout=5)
+      results[name].append(bid)
+      self.assertEqual(time, '2014-07-11 20:59:58.718193')
+
+    pool.destroy()
+    pool.join(5)
+
+    for name in _NAMES:
+      self.assertEqual(results[name], [str(i) + '.0000' for i in range(100)], name)
+      self.assertIsNotNone(pool.lastTick(name))
+
+
+  def testServerRequests(self):
+    """Verify that server requests of strategies are handled in the parent process."""
+    pool = ProcessPool(self.__currencies(True), 2, self.__server)
+    pool.start()
+
+    for name in _NAMES:
+      pool.queue().put(tick(name, 1))
+
+    results = sorted(self.__results.get(timeout=5) for _ in _NAMES)
+    self.assertEqual(results, sorted((name, '1.2345') for name in _NAMES))
+    self.assertEqual(sorted(self.__server.requests), sorted((n, 'S5', 1) for n in _NAMES))
+
+    pool.destroy()
+    pool.join(5)
+
+
+  def testUnpicklableResult(self):
+    """Verify that a result that cannot be sent to the child process is reported to it."""
+    server = UnpicklableServer()
+    currencies = {name: {'currency': Currency(server, name),
+                         'strategy': ReportingStrategy(self.__results, True)} for name in _NAMES}
+    pool = ProcessPool(currencies, 2, server)
+    pool.start()
+
+    for name in _NAMES:
+      pool.queue().put(tick(name, 1))
+
+    results = sorted(self.__results.get(timeout=5) for _ in _NAMES)
+    self.assertEqual(results, sorted((name, 'RuntimeError') for name in _NAMES))
+
+    # the connection is still usable afterwards
+    pool.queue().put(tick('XAU_USD', 2))
+    self.assertEqual(self.__results.get(timeout=5), ('XAU_USD', 'RuntimeError'))
+
+    pool.destroy()
+    pool.join(5)
+
+
+  def testStalledProcess(self):
+    """Verify that a process not reading its ticks does not block non-blocking puts."""
+    pool = ProcessPool({'EUR_USD': {'currency': Currency(self.__server, 'EUR_USD'),
+                                    'strategy': StallingStrategy()}}, 1, self.__server)
+    pool.start()
+    queue = pool.queue()
+
+    # the pipe fills up eventually
+    with self.assertRaises(Full):
+      for i in range(100000):
+        queue.put(tick('EUR_USD', i), block=False)
+
+    self.assertLess(pool.ticks()['EUR_USD'], 100000)
+
+    start = monotonic()
+    with self.assertRaises(Full):
+      queue.put(tick('EUR_USD', 0), timeout=0.1)
+    self.assertGreaterEqual(monotonic() - start, 0.1)
+
+    # messages for the parent are not affected
+    queue.put({'heartbeat': {'time': '2014-07-09T00:00:00.000000Z'}}, block=False)
+
+    pool.destroy()
+    pool.join(5)
+
+    for shard in pool._ProcessPool__shards:
+      self.assertFalse(shard.process.is_alive())
+
+
+  def testShutdown(self):
+    """Verify that all worker processes terminate when the pool is destroyed."""
+    pool = ProcessPool(self.__currencies(), 4, self.__server)
+    pool.start()
+
+    # heartbeats and transactions are handled in the parent
+    queue = pool.queue()
+    queue.put({'heartbeat': {'time': '2014-07-09T00:00:00.000000Z'}})
+    queue.put({'transaction': {'instrument': 'GBP_USD', 'time': '2014-07-17T18:57:05.000000Z',
+                               'type': 'ORDER_FILLED'}})
+
+    pool.destroy()
+    pool.join(5)
+
+    for shard in pool._ProcessPool__shards:
+      self.assertFalse(shard.process.is_alive())
+      self.assertEqual(shard.process.exitcode, 0)
+
+
+if __name__ == '__main__':
+  main()
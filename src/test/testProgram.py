@@ -19,6 +19,7 @@
 
 from price     import Price
 from program   import Program
+from metrics   import Registry
 from decimal   import Decimal
 from time      import sleep
 from datetime  import datetime
@@ -35,8 +36,11 @@ class MockServer:
 
   def currentPrices(self, currency):
     """Dummy implementation for the currentPrices() method of a real server."""
+    if isinstance(currency, list):
+      return [self.currentPrices(c) for c in currency]
+
     return {
-        'instrument': 'XAU_USD',
+        'instrument': currency,
         'time': '2014-07-11T20:59:58.718193Z',
         'ask': 1339.211,
         'bid': 1336.661,
@@ -92,7 +96,7 @@ class MockServer:
 
 
 class MockStreamer(Thread):
-  def __init__(self, token, queue):
+  def __init__(self, token, queue, url, onReconnect, tracer=None):
     super().__init__()
     self._destroy = Event()
     self._queue = queue
@@ -102,11 +106,19 @@ class MockStreamer(Thread):
     Thread.start(self)
 
 
-  def disconnect(self):
+  def disconnect(self, timeout=None):
     self._destroy.set()
+    self.join(timeout)
+
+
+  def reconnects(self):
+    return {'rates': 0, 'events': 0}
+
+
+  def heartbeats(self):
+    return {'events': 0.0}
 
 
-class MockRateStreamer(MockStreamer):
   def run(self):
     i = 0
     while not self._destroy.is_set():
@@ -126,14 +138,6 @@ class MockRateStreamer(MockStreamer):
           'parsed': True,
         })
 
-      i = i + 1
-      sleep(0)
-
-
-class MockEventStreamer(MockStreamer):
-  def run(self):
-    i = 0
-    while not self._destroy.is_set():
       if i % 10 != 0:
         self._queue.put({'transaction': {
           'tradeId': 615670377, 'accountBalance': 99959.6797, 'price': 173.366, 'side': 'buy',
@@ -166,8 +170,7 @@ class TestProgram(TestCase):
     self.__program.listTrades('1815754')
 
 
-  @patch('program.RateStreamer', MockRateStreamer)
-  @patch('program.EventStreamer', MockEventStreamer)
+  @patch('program.AsyncStreamer', MockStreamer)
   def testRun(self):
     """Test main infrastructure of the program.
 
@@ -184,6 +187,26 @@ class TestProgram(TestCase):
       self.fail('Interrupted')
 
 
+  @patch('program.AsyncStreamer', MockStreamer)
+  def testMetrics(self):
+    """Verify that the metrics of a running program are exposed."""
+    registry = Registry()
+    program = Program(self.__server, registry=registry)
+
+    try:
+      program.start('1815754', 'XAU_USD', 0, capacity=16)
+      sleep(0.2)
+      exposition = registry.exposition()
+    finally:
+      program.destroy()
+
+    self.assertRegex(exposition, r'fxbot_ticks_total\{instrument="XAU_USD"\} [1-9]')
+    self.assertIn('fxbot_stream_reconnects_total{stream="rates"} 0\n', exposition)
+    self.assertIn('fxbot_heartbeat_age_seconds{stream="events"}', exposition)
+    self.assertIn('fxbot_queue_depth{worker="0"}', exposition)
+    self.assertIn('fxbot_watchdog_polls_total', exposition)
+
+
 if __name__ == '__main__':
   # workaround for problem:
   # "ImportError: Failed to import _strptime because the import lockis held by another thread."
@@ -0,0 +1,80 @@
+# testResample.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+from resample import canResample, resample
+from datetime import timedelta
+from unittest import TestCase, main
+
+
+_S5 = timedelta(seconds=5)
+_S15 = timedelta(seconds=15)
+_M1 = timedelta(minutes=1)
+
+
+def _candle(time, price, volume=1, complete=True):
+  return {'complete': complete, 'openMid': price, 'highMid': price + 1, 'lowMid': price - 1,
+          'closeMid': price + 0.5, 'volume': volume, 'time': '2014-07-12T22:25:%02d.000000Z' % time}
+
+
+class TestResample(TestCase):
+  def testCanResample(self):
+    self.assertTrue(canResample(_S5, _S15))
+    self.assertTrue(canResample(_S5, timedelta(hours=1)))
+    self.assertTrue(canResample(timedelta(minutes=3), timedelta(minutes=15)))
+    self.assertFalse(canResample(_S15, _S15))
+    self.assertFalse(canResample(timedelta(minutes=2), timedelta(minutes=5)))
+    # neither aligned to the top of the hour
+    self.assertFalse(canResample(timedelta(hours=1), timedelta(hours=2)))
+    self.assertFalse(canResample(_S5, timedelta(days=1)))
+
+
+  def testResample(self):
+    """Verify that coarse candles combine the values of the finer ones."""
+    candles = [
+      # only part of the first period is covered
+      _candle(10, 1.0),
+      _candle(15, 2.0, 2), _candle(20, 4.0, 3), _candle(25, 3.0, 4),
+      # there was no tick between :30 and :35
+      _candle(35, 5.0),
+      _candle(45, 6.0, 5, False),
+    ]
+    result = resample(candles, _S5, _S15)
+
+    self.assertEqual(result, [
+      {'time': '2014-07-12T22:25:15.000000Z', 'openMid': 2.0, 'highMid': 5.0, 'lowMid': 1.0,
+       'closeMid': 3.5, 'volume': 9, 'complete': True},
+      {'time': '2014-07-12T22:25:30.000000Z', 'openMid': 5.0, 'highMid': 6.0, 'lowMid': 4.0,
+       'closeMid': 5.5, 'volume': 1, 'complete': True},
+      {'time': '2014-07-12T22:25:45.000000Z', 'openMid': 6.0, 'highMid': 7.0, 'lowMid': 5.0,
+       'closeMid': 6.5, 'volume': 5, 'complete': False},
+    ])
+
+
+  def testCompleteness(self):
+    """Verify that the last coarse candle is complete only if its period is over."""
+    result = resample([_candle(0, 1.0), _candle(5, 1.0)], _S5, _S15)
+    self.assertFalse(result[-1]['complete'])
+
+    result = resample([_candle(0, 1.0), _candle(10, 1.0)], _S5, _S15)
+    self.assertTrue(result[-1]['complete'])
+    self.assertEqual(resample([], _S5, _M1), [])
+
+
+if __name__ == '__main__':
+  main()
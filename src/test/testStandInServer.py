@@ -0,0 +1,170 @@
+# testStandInServer.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+from standInServer   import StandInServer, Market
+from asyncStreamer   import AsyncStreamer
+from workerPool      import WorkerPool
+from backoff         import Backoff
+from currency        import Currency
+from fixtures        import CountingStrategy
+from datetimeRfc3339 import parseDateMicros
+from urllib.request  import urlopen
+from urllib.error    import HTTPError
+from time            import monotonic
+from json            import loads
+from unittest        import TestCase, main
+
+
+class TestMarket(TestCase):
+  def testCandles(self):
+    """Verify that candles are aligned, deterministic, and only the last one is incomplete."""
+    market = Market(12)
+    self.assertEqual(len(market.names()), 12)
+    self.assertEqual(market.names()[-1], 'INST011_USD')
+
+    now = parseDateMicros('2014-07-11T12:00:07.500000Z')
+    candles = market.candles('EUR_USD', 'S5', 3, now=now)
+    self.assertEqual([c['time'] for c in candles], ['2014-07-11T11:59:55.000000Z',
+                                                    '2014-07-11T12:00:00.000000Z',
+                                                    '2014-07-11T12:00:05.000000Z'])
+    self.assertEqual([c['complete'] for c in candles], [True, True, False])
+    self.assertEqual(candles, market.candles('EUR_USD', 'S5', 3, now=now))
+
+    start = parseDateMicros('2014-07-11T11:59:55.000000Z')
+    self.assertEqual(market.candles('EUR_USD', 'S5', 5, start, now=now), candles)
+    self.assertEqual(market.candles('EUR_USD', 'S5', 1, start, False, now=now), candles[1:2])
+
+    for candle in candles:
+      self.assertLessEqual(candle['lowMid'], min(candle['openMid'], candle['closeMid']))
+      self.assertGreaterEqual(candle['highMid'], max(candle['openMid'], candle['closeMid']))
+
+
+class TestStandInServer(TestCase):
+  def tearDown(self):
+    self.__standIn.stop()
+
+
+  def __start(self, *args, **kwargs):
+    self.__standIn = StandInServer(*args, **kwargs)
+    self.__restUrl, self.__streamUrl = self.__standIn.start()
+
+
+  def __get(self, path):
+    with urlopen(self.__restUrl + path) as response:
+      return loads(response.read().decode())
+
+
+  def testRest(self):
+    """Verify that the REST endpoints used by Server are served."""
+    self.__start(3)
+
+    self.assertEqual(self.__get('/v1/accounts')['accounts'][0]['accountId'], 1815754)
+    self.assertEqual(self.__get('/v1/accounts/1815754/trades'), {'trades': []})
+
+    instruments = self.__get('/v1/instruments?accountId=1815754')['instruments']
+    self.assertEqual([i['instrument'] for i in instruments], ['EUR_USD', 'USD_JPY', 'GBP_USD'])
+
+    prices = self.__get('/v1/prices?instruments=USD_JPY%2CEUR_USD')['prices']
+    self.assertEqual([p['instrument'] for p in prices], ['USD_JPY', 'EUR_USD'])
+    self.assertLess(prices[0]['bid'], prices[0]['ask'])
+
+    candles = self.__get('/v1/candles?instrument=EUR_USD&granularity=M1&count=10'
+                         '&candleFormat=midpoint')['candles']
+    self.assertEqual(len(candles), 10)
+
+    candles = self.__get('/v1/candles?instrument=EUR_USD&granularity=M1&count=10'
+                         '&start=%s&includeFirst=false' % candles[5]['time'])['candles']
+    self.assertEqual(len(candles), 4)
+
+    with self.assertRaises(HTTPError) as context:
+      self.__get('/v1/foo')
+    self.assertEqual(context.exception.code, 404)
+
+
+  def testInjection(self):
+    """Verify that latency and errors are injected."""
+    self.__start(3, latency=0.05, errorRate=1.0)
+
+    start = monotonic()
+    with self.assertRaises(HTTPError) as context:
+      self.__get('/v1/accounts')
+
+    self.assertEqual(context.exception.code, 500)
+    self.assertGreaterEqual(monotonic() - start, 0.05)
+    self.assertEqual(self.__standIn.stats()['errors'], 1)
+
+
+  def testHeartbeats(self):
+    """Verify that a rate stream carries heartbeats, even if there are no ticks."""
+    self.__start(1, tickRate=0.0)
+
+    start = monotonic()
+    lines = next(self.__standIn.ticks(['EUR_USD']))
+    self.assertEqual(list(lines[0].keys()), ['heartbeat'])
+    self.assertEqual(len(lines), 1)
+    self.assertGreaterEqual(monotonic() - start, 0.9)
+    self.assertEqual(self.__standIn.stats()['ticks'], 0)
+
+
+  def testPipeline(self):
+    """Verify that ticks flow from the stand-in through the streamer to the strategies."""
+    self.__start(3, tickRate=300.0)
+
+    names = ['EUR_USD', 'USD_JPY', 'GBP_USD']
+    strategies = {name: CountingStrategy(20) for name in names}
+    pool = WorkerPool({name: {'currency': Currency(None, name), 'strategy': strategies[name]}
+                       for name in names}, 2)
+    streamer = AsyncStreamer('XXXXXXXXXX', pool.queue(), self.__streamUrl)
+
+    pool.start()
+    streamer.start(accountId='1815754', instruments=','.join(names))
+
+    for strategy in strategies.values():
+      self.assertTrue(strategy.done.wait(5))
+
+    streamer.disconnect(5)
+    pool.destroy()
+    pool.join(5)
+
+    self.assertGreaterEqual(self.__standIn.stats()['ticks'], 60)
+
+
+  def testDisconnects(self):
+    """Verify that dropped streams are reconnected."""
+    self.__start(1, tickRate=100.0, disconnectRate=0.2, seed=1)
+
+    strategy = CountingStrategy(30)
+    pool = WorkerPool({'EUR_USD': {'currency': Currency(None, 'EUR_USD'), 'strategy': strategy}})
+    streamer = AsyncStreamer('XXXXXXXXXX', pool.queue(), self.__streamUrl,
+                             backoffFactory=lambda: Backoff(0.01, 0.05))
+
+    pool.start()
+    streamer.start(accountId='1815754', instruments='EUR_USD')
+    self.assertTrue(strategy.done.wait(10))
+
+    streamer.disconnect(5)
+    pool.destroy()
+    pool.join(5)
+
+    self.assertGreater(self.__standIn.stats()['disconnects'], 0)
+    self.assertTrue([o for o in streamer.outages() if o['stream'] == 'rates'])
+
+
+if __name__ == '__main__':
+  main()
@@ -17,7 +17,7 @@
 # *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
 # ***************************************************************************/
 
-from statistics import calculateEMA
+from statistics import calculateEMA, calculateAvg, EMA, SMA, Avg
 from decimal    import Decimal
 from unittest   import TestCase, main
 
@@ -94,5 +94,73 @@ class TestStatistics(TestCase):
     self.assertEqual(self.values5[0]['ema5'], ema0)
 
 
+  def testEMASeed(self):
+    """Verify that a seeded EMA object yields the same value as calculateEMA."""
+    for count in range(1, 5):
+      ema = EMA(count)
+      value = ema.seed(self.values5, 'avg')
+
+      calculateEMA(self.values5, count, 'avg', 'ema')
+      self.assertEqual(value, self.values5[0]['ema'])
+      self.assertEqual(ema.value(), value)
+
+
+  def testEMAUpdate(self):
+    """Verify that updating a seeded EMA object continues the calculation of calculateEMA."""
+    ema = EMA(3)
+    seeded = ema.seed(self.values5[2:], 'avg')
+    c = Decimal(2) / Decimal(4)
+
+    # an estimate must not change the state of the object
+    estimate = ema.estimate(Decimal(0.3))
+    self.assertEqual(ema.value(), seeded)
+
+    ema1 = c * Decimal(0.3) + (1 - c) * seeded
+    self.assertEqual(ema.update(Decimal(0.3)), ema1)
+    self.assertEqual(estimate, ema1)
+
+    ema0 = c * Decimal(0.1) + (1 - c) * ema1
+    self.assertEqual(ema.update(Decimal(0.1)), ema0)
+
+
+  def testEMAUnseeded(self):
+    """Verify that an EMA object starts with the first value it is updated with."""
+    ema = EMA(2)
+    self.assertIsNone(ema.value())
+    self.assertIsNone(ema.estimate(Decimal(1)))
+
+    self.assertEqual(ema.update(Decimal(1)), Decimal(1))
+    c = Decimal(2) / Decimal(3)
+    self.assertEqual(ema.update(Decimal(4)), c * Decimal(4) + (1 - c) * Decimal(1))
+
+
+  def testSMA(self):
+    """Verify the incremental calculation of the Simple Moving Average."""
+    sma = SMA(3)
+    self.assertIsNone(sma.update(Decimal(1)))
+    self.assertIsNone(sma.estimate(Decimal(2)))
+    self.assertIsNone(sma.update(Decimal(2)))
+    self.assertEqual(sma.estimate(Decimal(6)), Decimal(3))
+    self.assertEqual(sma.update(Decimal(6)), Decimal(3))
+    self.assertEqual(sma.estimate(Decimal(10)), Decimal(6))
+    self.assertEqual(sma.update(Decimal(4)), Decimal(4))
+    self.assertEqual(sma.value(), Decimal(4))
+
+    sma = SMA(2)
+    self.assertEqual(sma.seed(self.values5, 'avg'), (Decimal(0.1) + Decimal(0.3)) / Decimal(2))
+
+
+  def testAvg(self):
+    """Verify that the average price equals the one of calculateAvg."""
+    values = [{'open': Decimal('1.5'), 'close': Decimal('2.25')}]
+    calculateAvg(values, 'open', 'close', 'avg')
+
+    avg = Avg()
+    self.assertIsNone(avg.value())
+    avg.start(Decimal('1.5'))
+    avg.update(Decimal('3'))
+    self.assertEqual(avg.update(Decimal('2.25')), values[0]['avg'])
+
+
 if __name__ == '__main__':
   main()
@@ -0,0 +1,177 @@
+# testTickJournal.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+from tickJournal    import TickJournal, JournalReader, RecordingQueue
+from backtestServer import loadRecording
+from price          import Price, priceScale
+from decimal        import Decimal
+from datetime       import datetime
+from tempfile       import TemporaryDirectory
+from queue          import Queue
+from os             import listdir
+from os.path        import join, getsize
+from unittest       import TestCase, main
+
+
+_SCALE = priceScale(Decimal('0.001'))
+_SCALES = {'EUR_USD': _SCALE, 'XAU_USD': _SCALE, 'GBP_USD': _SCALE}
+
+_TICKS = [
+  {'instrument': 'EUR_USD', 'time': '2014-07-10T23:59:59.500000Z', 'ask': 1.36803, 'bid': 1.368},
+  {'tick': {'instrument': 'XAU_USD', 'time': '2014-07-11T00:00:00.000000Z',
+            'ask': '1339.211', 'bid': '1336.661'}},
+  {'instrument': 'EUR_USD', 'time': datetime(2014, 7, 11, 12, 0, 0, 250000),
+   'ask': Price(Decimal('1.36811'), _SCALE), 'bid': Price(Decimal('1.36809'), _SCALE),
+   'parsed': True},
+  {'instrument': 'EUR_USD', 'time': '2014-07-11T12:00:01.000000Z', 'ask': 1.36812, 'bid': 1.3681},
+]
+
+
+class TestTickJournal(TestCase):
+  def setUp(self):
+    self.__directory = TemporaryDirectory()
+    self.__path = self.__directory.name
+
+
+  def tearDown(self):
+    self.__directory.cleanup()
+
+
+  def __record(self, ticks):
+    journal = TickJournal(self.__path)
+    for tick in ticks:
+      journal.record(tick)
+    journal.close()
+
+
+  def testRoundTrip(self):
+    """Verify that recorded ticks are read back parsed."""
+    self.__record(_TICKS)
+
+    self.assertEqual(sorted(listdir(self.__path)),
+                     ['2014-07-10.ticks', '2014-07-11.ticks', 'instruments'])
+
+    reader = JournalReader(self.__path)
+    self.assertEqual(reader.instruments(), ['EUR_USD', 'XAU_USD'])
+
+    # Price objects do not compare by value, so we compare their strings
+    ticks = [dict(t, ask=str(t['ask']), bid=str(t['bid'])) for t in reader.ticks(_SCALES)]
+    time = datetime(2014, 7, 10, 23, 59, 59, 500000)
+    self.assertEqual(ticks[0], {'instrument': 'EUR_USD', 'time': time,
+                                'ask': '1.3680', 'bid': '1.3680', 'parsed': True})
+    self.assertEqual(ticks[1], {'instrument': 'XAU_USD', 'time': datetime(2014, 7, 11),
+                                'ask': '1339.2110', 'bid': '1336.6610', 'parsed': True})
+    # Price objects only carry the digits of their scale
+    time = datetime(2014, 7, 11, 12, 0, 0, 250000)
+    self.assertEqual(ticks[2], {'instrument': 'EUR_USD', 'time': time,
+                                'ask': '1.3681', 'bid': '1.3681', 'parsed': True})
+    self.assertEqual(len(ticks), 4)
+
+    # instruments not of interest are skipped
+    ticks = list(reader.ticks({'XAU_USD': _SCALE}))
+    self.assertEqual([t['instrument'] for t in ticks], ['XAU_USD'])
+
+    records = list(reader.records())
+    self.assertEqual(records[0], ('EUR_USD', 1405036799500000, 1368000, 1368030))
+
+
+  def testAppend(self):
+    """Verify that a journal can be continued and instrument IDs remain stable."""
+    self.__record(_TICKS[:2])
+    self.__record([{'instrument': 'GBP_USD', 'time': '2014-07-11T01:00:00.000000Z',
+                    'ask': 1.7, 'bid': 1.6}] + _TICKS[2:])
+
+    reader = JournalReader(self.__path)
+    self.assertEqual(reader.instruments(), ['EUR_USD', 'XAU_USD', 'GBP_USD'])
+    self.assertEqual([t['instrument'] for t in reader.ticks(_SCALES)],
+                     ['EUR_USD', 'XAU_USD', 'GBP_USD', 'EUR_USD', 'EUR_USD'])
+
+    # an incomplete record is ignored
+    with open(join(self.__path, '2014-07-11.ticks'), 'ab') as file:
+      file.write(b'\x00\x01\x02')
+
+    self.assertEqual(len(list(JournalReader(self.__path).ticks(_SCALES))), 5)
+
+
+  def testRange(self):
+    """Verify that the ticks of a period of time are found by bisection."""
+    ticks = [{'instrument': 'EUR_USD', 'time': datetime(2014, 7, 11, 12, i // 60, i % 60),
+              'ask': 1.3 + i / 100000, 'bid': 1.3, 'parsed': True} for i in range(3600)]
+    self.__record(_TICKS[:1] + ticks)
+
+    reader = JournalReader(self.__path)
+    result = list(reader.ticks(_SCALES, datetime(2014, 7, 11, 12, 30),
+                               datetime(2014, 7, 11, 12, 31)))
+    self.assertEqual([t['time'] for t in result], [t['time'] for t in ticks[1800:1860]])
+
+    self.assertEqual(len(list(reader.ticks(_SCALES, start=datetime(2014, 7, 11)))), 3600)
+    self.assertEqual(len(list(reader.ticks(_SCALES, end=datetime(2014, 7, 11)))), 1)
+    self.assertEqual(list(reader.ticks(_SCALES, start=datetime(2014, 7, 12))), [])
+
+
+  def testFlush(self):
+    """Verify that records are written to the file once a tick of a new second is recorded."""
+    journal = TickJournal(self.__path)
+    path = join(self.__path, '2014-07-11.ticks')
+
+    journal.record(_TICKS[1])
+    size = getsize(path)
+    journal.record(_TICKS[2])
+    self.assertGreater(getsize(path), size)
+
+    # ticks of the same second are buffered
+    size = getsize(path)
+    journal.record(dict(_TICKS[2], time=datetime(2014, 7, 11, 12, 0, 0, 500000)))
+    self.assertEqual(getsize(path), size)
+
+    journal.record(_TICKS[3])
+    self.assertGreater(getsize(path), size)
+    journal.close()
+
+
+  def testRecordingQueue(self):
+    """Verify that a RecordingQueue records ticks only and passes on all messages."""
+    journal = TickJournal(self.__path)
+    queue = Queue()
+    recording = RecordingQueue(queue, journal)
+
+    heartbeat = {'heartbeat': {'time': '2014-07-09T00:00:00.000000Z'}}
+    recording.put(heartbeat)
+    recording.put(_TICKS[0])
+    # a tick that cannot be recorded is still passed on
+    recording.put({'instrument': 'EUR_USD', 'time': 'invalid', 'ask': 1.0, 'bid': 1.0})
+    journal.close()
+
+    self.assertEqual(queue.qsize(), 3)
+    ticks = list(JournalReader(self.__path).ticks(_SCALES))
+    self.assertEqual([(t['instrument'], t['time']) for t in ticks],
+                     [('EUR_USD', datetime(2014, 7, 10, 23, 59, 59, 500000))])
+
+
+  def testBacktest(self):
+    """Verify that a journal can be replayed in a backtest."""
+    self.__record(_TICKS)
+
+    server = loadRecording(self.__path)
+    self.assertEqual(server.currencies(), ['EUR_USD', 'XAU_USD'])
+    self.assertEqual(len(list(server.ticks({'EUR_USD': _SCALE}))), 3)
+
+
+if __name__ == '__main__':
+  main()
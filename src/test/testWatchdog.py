@@ -18,9 +18,26 @@
 # ***************************************************************************/
 
 from watchdog import Watchdog
+from currency import Currency
+from queue    import Queue
+from time     import monotonic
 from unittest import TestCase, main
 
 
+class MockServer:
+  def __init__(self, missing=()):
+    # list of all currencies for which prices were requested, one entry per request
+    self.requests = []
+    # currencies for which no prices are returned
+    self.__missing = missing
+
+
+  def currentPrices(self, currency):
+    self.requests.append(currency)
+    return [{'instrument': c, 'time': '2014-07-11T20:59:58.718193Z', 'ask': 1.5, 'bid': 1.4}
+            for c in currency if c not in self.__missing]
+
+
 class TestWatchdog(TestCase):
   def testDestroyWithoutStart(self):
     """Verify that we can safely destroy a watchdog object without having it start()ed."""
@@ -28,5 +45,90 @@ class TestWatchdog(TestCase):
     watchdog.destroy()
 
 
+  def testBatchedPrices(self):
+    """Verify that the prices of all currencies are retrieved using a single request."""
+    server = MockServer()
+    currencies = {c: {'currency': Currency(server, c), 'strategy': None}
+                  for c in ('XAU_USD', 'EUR_USD', 'GBP_USD')}
+    queue = Queue()
+
+    watchdog = Watchdog(currencies, queue, 10)
+    watchdog.start()
+
+    ticks = [queue.get(timeout=5) for _ in range(3)]
+    watchdog.destroy()
+    watchdog.join()
+
+    self.assertEqual(sorted(tick['instrument'] for tick in ticks), sorted(currencies.keys()))
+    self.assertTrue(all(tick['parsed'] for tick in ticks))
+    self.assertEqual(sorted(server.requests[0]), sorted(currencies.keys()))
+    self.assertEqual(watchdog.stats(), {'polls': len(server.requests),
+                                        'currencies': sum(map(len, server.requests))})
+
+
+  def testMissingPrices(self):
+    """Verify that currencies for which the server returned no prices do not stop the watchdog."""
+    server = MockServer(missing=('EUR_USD',))
+    currencies = {c: {'currency': Currency(server, c), 'strategy': None}
+                  for c in ('XAU_USD', 'EUR_USD', 'GBP_USD')}
+    queue = Queue()
+
+    watchdog = Watchdog(currencies, queue, 0.1)
+    watchdog.start()
+
+    ticks = [queue.get(timeout=5) for _ in range(4)]
+    watchdog.destroy()
+    watchdog.join()
+
+    # prices keep being queried for all currencies
+    self.assertGreaterEqual(len(server.requests), 2)
+    self.assertTrue(all(sorted(r) == sorted(currencies.keys()) for r in server.requests))
+    self.assertEqual(sorted(set(tick['instrument'] for tick in ticks)), ['GBP_USD', 'XAU_USD'])
+
+
+  def testZeroTimeout(self):
+    """Verify that a watchdog querying prices all the time can still be destroyed."""
+    server = MockServer()
+    currencies = {'XAU_USD': {'currency': Currency(server, 'XAU_USD'), 'strategy': None}}
+    queue = Queue()
+
+    watchdog = Watchdog(currencies, queue, 0)
+    watchdog.start()
+
+    self.assertEqual(queue.get(timeout=5)['instrument'], 'XAU_USD')
+    watchdog.destroy()
+    watchdog.join(5)
+    self.assertFalse(watchdog.is_alive())
+
+
+  def testStaleness(self):
+    """Verify that only prices of currencies without recent ticks are queried."""
+    server = MockServer()
+    currencies = {c: {'currency': Currency(server, c), 'strategy': None}
+                  for c in ('XAU_USD', 'EUR_USD', 'GBP_USD')}
+    queue = Queue()
+
+    def lastTick(currency):
+      # XAU_USD ticks all the time, GBP_USD never did
+      if currency == 'XAU_USD':
+        return monotonic()
+      if currency == 'EUR_USD':
+        return monotonic() - 60.0
+      return None
+
+    watchdog = Watchdog(currencies, queue, {'XAU_USD': 10, 'EUR_USD': 10, 'GBP_USD': 20}, lastTick)
+    watchdog.start()
+
+    ticks = [queue.get(timeout=5) for _ in range(6)]
+    watchdog.destroy()
+    watchdog.join()
+
+    names = [tick['instrument'] for tick in ticks]
+    self.assertNotIn('XAU_USD', names)
+    self.assertIn('EUR_USD', names)
+    self.assertIn('GBP_USD', names)
+    self.assertTrue(all('XAU_USD' not in request for request in server.requests))
+
+
 if __name__ == '__main__':
   main()
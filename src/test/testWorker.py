@@ -1,4 +1,4 @@
-# rateStreamer.py
+# testWorker.py
 
 #/***************************************************************************
 # *   Copyright (C) 2014 Daniel Mueller                                     *
@@ -17,19 +17,28 @@
 # *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
 # ***************************************************************************/
 
-from threadedStreamer import ThreadedStreamer
+from worker   import Worker
+from currency import Currency
+from fixtures import CountingStrategy
+from time     import monotonic
+from unittest import TestCase, main
 
 
-class RateStreamer(ThreadedStreamer):
-  def __init__(self, token, queue, *args, **kwargs):
-    super().__init__(queue, access_token=token, *args, **kwargs)
+class TestWorker(TestCase):
+  def testLastTick(self):
+    """Verify that the time of the last tick handled is tracked per currency."""
+    strategy = CountingStrategy()
+    worker = Worker({'XAU_USD': {'currency': Currency(None, 'XAU_USD'), 'strategy': strategy}})
+    self.assertIsNone(worker.lastTick('XAU_USD'))
 
+    before = monotonic()
+    worker.handleTick({'instrument': 'XAU_USD', 'time': '2014-07-11T20:59:58.718193Z',
+                       'ask': 1339.211, 'bid': 1336.661})
 
-  def on_success(self, data):
-    """Handle received 'tick' data.
+    self.assertEqual(strategy.ticks, 1)
+    self.assertGreaterEqual(worker.lastTick('XAU_USD'), before)
+    self.assertIsNone(worker.lastTick('EUR_USD'))
 
-      Parameters:
-        data  Data received from the server. Represented as dict object containing 'instrument'
-              string describing the currency, a 'time' string, an 'ask' price, and a 'bid' price.
-    """
-    self.queue.put(data)
+
+if __name__ == '__main__':
+  main()
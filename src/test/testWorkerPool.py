@@ -0,0 +1,122 @@
+# testWorkerPool.py
+
+#/***************************************************************************
+# *   Copyright (C) 2014 Daniel Mueller                                     *
+# *                                                                         *
+# *   This program is free software: you can redistribute it and/or modify  *
+# *   it under the terms of the GNU General Public License as published by  *
+# *   the Free Software Foundation, either version 3 of the License, or     *
+# *   (at your option) any later version.                                   *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU General Public License for more details.                          *
+# *                                                                         *
+# *   You should have received a copy of the GNU General Public License     *
+# *   along with this program.  If not, see <http://www.gnu.org/licenses/>. *
+# ***************************************************************************/
+
+from workerPool import WorkerPool, _shard
+from worker     import Worker
+from currency   import Currency
+from fixtures   import RecordingStrategy, tick
+from threading  import Event
+from mock       import patch
+from unittest   import TestCase, main
+
+
+_NAMES = ['XAU_USD', 'EUR_USD', 'GBP_USD', 'USD_JPY', 'AUD_USD', 'USD_CHF']
+
+
+class TestWorkerPool(TestCase):
+  def setUp(self):
+    self.__strategies = {name: RecordingStrategy(100) for name in _NAMES}
+    self.__currencies = {name: {'currency': Currency(None, name), 'strategy': strategy}
+                         for name, strategy in self.__strategies.items()}
+
+
+  def testOrdering(self):
+    """Verify that the ticks of every currency are handled in order."""
+    pool = WorkerPool(self.__currencies, 3)
+    pool.start()
+
+    queue = pool.queue()
+    for i in range(100):
+      for j, name in enumerate(_NAMES):
+        queue.put(tick(name, i) if j % 2 else {'tick': tick(name, i)})
+
+    for strategy in self.__strategies.values():
+      self.assertTrue(strategy.done.wait(5))
+
+    pool.destroy()
+    pool.join()
+
+    for name, strategy in self.__strategies.items():
+      self.assertEqual([bid for _, _, bid in strategy.records],
+                       [str(i) + '.0000' for i in range(100)], name)
+      self.assertIsNotNone(pool.lastTick(name))
+
+    self.assertEqual(pool.ticks(), {name: 100 for name in _NAMES})
+
+
+  def testIsolation(self):
+    """Verify that a blocked strategy only delays the currencies sharing its worker."""
+    blocker = Event()
+    blocked = _NAMES[0]
+    self.__strategies[blocked] = RecordingStrategy(100, blocker)
+    self.__currencies[blocked]['strategy'] = self.__strategies[blocked]
+
+    pool = WorkerPool(self.__currencies, 4)
+    pool.start()
+
+    queue = pool.queue()
+    for i in range(100):
+      for name in _NAMES:
+        queue.put(tick(name, i))
+
+    for name, strategy in self.__strategies.items():
+      if _shard(name, 4) != _shard(blocked, 4):
+        self.assertTrue(strategy.done.wait(5), name)
+
+    blocker.set()
+    self.assertTrue(self.__strategies[blocked].done.wait(5))
+
+    pool.destroy()
+    pool.join()
+
+
+  def testShutdown(self):
+    """Verify that messages are delivered and all worker threads terminate on destruction."""
+    heartbeat = Event()
+    transaction = Event()
+    event = {'instrument': 'GBP_USD', 'time': '2014-07-17T18:57:05.000000Z', 'type': 'ORDER_FILLED'}
+
+    with patch('worker.info', side_effect=lambda message: heartbeat.set()) as info, \
+         patch.object(Worker, 'handleEvent', autospec=True,
+                      side_effect=lambda worker, event: transaction.set()) as handleEvent:
+      pool = WorkerPool(self.__currencies, 4)
+      pool.start()
+
+      # heartbeats and transactions are handled as well
+      queue = pool.queue()
+      queue.put({'heartbeat': {'time': '2014-07-09T00:00:00.000000Z'}})
+      queue.put({'transaction': event})
+
+      self.assertTrue(heartbeat.wait(5))
+      self.assertTrue(transaction.wait(5))
+
+      pool.destroy()
+      pool.join(5)
+
+    workers = pool._WorkerPool__workers
+    for worker in workers:
+      self.assertFalse(worker.is_alive())
+
+    # both exactly once, the transaction by the worker responsible for its currency
+    info.assert_called_once_with('2014-07-09T00:00:00.000000Z: heartbeat')
+    handleEvent.assert_called_once_with(workers[_shard('GBP_USD', 4)], event)
+
+
+if __name__ == '__main__':
+  main()